@@ -0,0 +1,59 @@
+"""Benchmark of opening several vaults one after another versus concurrently through src.async_database.
+
+    python benchmarks/async_open.py --vaults 4 [--processes]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.vault_generator import DEFAULT_PASSWORD, VaultSpec, generate_vault  # noqa: E402
+from src import database  # noqa: E402
+from src.async_database import open_database_async  # noqa: E402
+
+
+def open_sequentially(filenames):
+    for filename in filenames:
+        database.open_database(filename, password=DEFAULT_PASSWORD)
+
+
+async def open_concurrently(filenames, executor=None):
+    await asyncio.gather(*(open_database_async(filename, DEFAULT_PASSWORD, executor=executor)
+                           for filename in filenames))
+
+
+def timed(operation) -> float:
+    started = time.perf_counter()
+    operation()
+    return time.perf_counter() - started
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="open N vaults sequentially and concurrently")
+    parser.add_argument("--vaults", type=int, default=4)
+    parser.add_argument("--processes", action="store_true", help="also run the KDFs in a process pool")
+    options = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = [os.path.join(directory, "vault{}.kdbx".format(i)) for i in range(options.vaults)]
+        for i, filename in enumerate(filenames):
+            generate_vault(filename, VaultSpec(seed=i))
+        results = {"sequential": timed(lambda: open_sequentially(filenames)),
+                   "threads": timed(lambda: asyncio.run(open_concurrently(filenames)))}
+        if options.processes:
+            with ProcessPoolExecutor() as executor:
+                results["processes"] = timed(lambda: asyncio.run(open_concurrently(filenames, executor)))
+    for name, seconds in results.items():
+        print("{:<12} {:8.2f} s  {:5.2f}x".format(name, seconds, results["sequential"] / seconds))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Benchmark of save latency against file size for each payload compression level.
+
+Vaults hold either text attachments or random (already compressed) ones; the KDF salt is kept so the
+timings cover compression, encryption and writing only.
+
+    python benchmarks/compression.py --attachments 20 --attachment-size 1M
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.vault_generator import DEFAULT_PASSWORD, VaultSpec, generate_vault  # noqa: E402
+from src import compression, database  # noqa: E402
+from src.app_launcher import parse_size  # noqa: E402
+
+LEVELS = (0, 1, 6, 9)
+
+
+def attachment_contents(kind: str, size: int, rng: random.Random) -> bytes:
+    if kind == "random":
+        return rng.randbytes(size)
+    words = [rng.choice(("user", "host", "token", "secret", "value", "key")) for _ in range(size // 6 + 1)]
+    return " ".join(words).encode("ascii")[:size]
+
+
+def run_kind(directory: str, kind: str, attachments: int, attachment_size: int, repeat: int):
+    filename = os.path.join(directory, "{}.kdbx".format(kind))
+    generate_vault(filename, VaultSpec(depth=1, fan_out=4, entries_per_group=50))
+    db = database.open_database(filename, password=DEFAULT_PASSWORD, keep_kdf_salt=True)
+    rng = random.Random(0)
+    folder = db.mk_dir("attachments")
+    for i in range(attachments):
+        contents = attachment_contents(kind, attachment_size, rng)
+        folder.put_buffer("a{}".format(i), bytearray(b"\0" + contents))
+    for level in LEVELS:
+        db.set_compression_level(level)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            db.save(force=True)
+        seconds = (time.perf_counter() - started) / repeat
+        stats = db.save_stats
+        used = "stored" if level and not stats["level"] else compression.describe(stats["level"])
+        yield {"kind": kind, "requested": compression.describe(level), "used": used,
+               "save_ms": seconds * 1000, "compress_ms": stats["seconds"] * 1000,
+               "file_bytes": os.path.getsize(filename)}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="save latency and file size per compression level")
+    parser.add_argument("--attachments", type=int, default=20)
+    parser.add_argument("--attachment-size", type=parse_size, default=1 << 20)
+    parser.add_argument("--repeat", type=int, default=3)
+    options = parser.parse_args(args)
+
+    print("{:<8} {:<10} {:<10} {:>10} {:>12} {:>14}".format("kind", "requested", "used", "save ms", "compress ms",
+                                                          "file bytes"))
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in ("text", "random"):
+            for row in run_kind(directory, kind, options.attachments, options.attachment_size, options.repeat):
+                print("{kind:<8} {requested:<10} {used:<10} {save_ms:10.1f} {compress_ms:12.1f} "
+                      "{file_bytes:14d}".format(**row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Memory and allocation benchmark of entry handles over one large folder.
+
+Iterates Folder.entries() twice and reads every name, reporting time, peak traced memory and the number of
+allocations left behind; the second pass reuses the cached handles.
+
+    python benchmarks/handles.py --entries 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.vault_generator import DEFAULT_PASSWORD  # noqa: E402
+from src import database  # noqa: E402
+
+
+def traced(operation):
+    """Returns (seconds, peak traced bytes, allocated blocks still alive after the call) of operation."""
+    tracemalloc.start()
+    try:
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+        started = time.perf_counter()
+        operation()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename")) - blocks
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak, blocks
+
+
+def fill_folder(db, path: str, number_of_entries: int):
+    """Adds number_of_entries KeyValues to a folder, returning a Database opened again over the same tree so
+    that no handle is cached yet."""
+    folder = db.mk_dir(path)
+    for i in range(number_of_entries):
+        folder.set_value("e{}".format(i), "value-{}".format(i))
+    return database.Database(db._kdb)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="time and memory of iterating a large folder")
+    parser.add_argument("--entries", type=int, default=100000)
+    options = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = database.create_database(os.path.join(directory, "handles.kdbx"), password=DEFAULT_PASSWORD)
+        folder = fill_folder(db, "big", options.entries).cd_dir("big")
+
+        handles = []
+        results = {
+            "first pass": traced(lambda: handles.extend(folder.entries())),
+            "second pass": traced(lambda: list(folder.entries())),
+            "names": traced(lambda: [entry.name for entry in handles]),
+            "names again": traced(lambda: [entry.name for entry in handles]),
+        }
+    print("{:<12} {:>10} {:>12} {:>12}".format("", "ms", "peak KiB", "blocks"))
+    for name, (seconds, peak, blocks) in results.items():
+        print("{:<12} {:10.1f} {:12.0f} {:12d}".format(name, seconds * 1000, peak / 1024, blocks))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
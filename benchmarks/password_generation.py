@@ -0,0 +1,47 @@
+"""Throughput benchmark of password generation: one password per call versus whole batches.
+
+    python benchmarks/password_generation.py --count 100000 --length 32
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src import password_generator  # noqa: E402
+
+
+def timed(operation) -> float:
+    started = time.perf_counter()
+    operation()
+    return time.perf_counter() - started
+
+
+def pooled(count: int, length: int, alphabet: str) -> list:
+    pool = password_generator.PasswordPool(length, alphabet)
+    return [pool.next() for _ in range(count)]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="passwords generated per second")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--length", type=int, default=32)
+    options = parser.parse_args(args)
+
+    count, length = options.count, options.length
+    for alphabet in password_generator.ALPHABETS:
+        results = {
+            "single": timed(lambda: [password_generator.generate(length, alphabet) for _ in range(count)]),
+            "pooled": timed(lambda: pooled(count, length, alphabet)),
+            "batch": timed(lambda: password_generator.generate_many(count, length, alphabet)),
+        }
+        for name, seconds in results.items():
+            print("{:<14} {:<8} {:12.0f} passwords/s".format(alphabet, name, count / seconds))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""Throughput benchmark of template rendering: resolving each distinct path once versus once per placeholder.
+
+    python benchmarks/render.py --template-size 4M --references 5000
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.vault_generator import SIZE_PRESETS, generate_vault  # noqa: E402
+from src import render  # noqa: E402
+from src.app_launcher import parse_size  # noqa: E402
+
+
+def make_template(entry_paths: list, size: int, references: int, rng: random.Random) -> str:
+    filler = "key: some configuration text\n" * (size // references // 30 + 1)
+    return "".join("{}secret_{}: {{{{ /{} }}}}\n".format(filler, i, rng.choice(entry_paths))
+                   for i in range(references))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="render time of a large template with many placeholders")
+    parser.add_argument("--template-size", type=parse_size, default=4 << 20)
+    parser.add_argument("--references", type=int, default=5000)
+    parser.add_argument("--size", type=int, choices=sorted(SIZE_PRESETS), default=1000)
+    options = parser.parse_args(args)
+
+    spec = SIZE_PRESETS[options.size]
+    with tempfile.TemporaryDirectory() as directory:
+        db = generate_vault(os.path.join(directory, "render.kdbx"), spec)
+        template = make_template(list(spec.entry_paths()), options.template_size, options.references,
+                                 random.Random(0))
+        lookups = []
+
+        def resolve(paths):
+            lookups.extend(paths)
+            return {path: db.get_entry(path).value for path in paths}
+
+        def per_placeholder(match):
+            lookups.append(match.group(1))
+            return db.get_entry(match.group(1)).value
+
+        results = {}
+        for name, operation in (
+                ("batched", lambda: render.render(render.iter_chunks(io.StringIO(template)), resolve, io.StringIO())),
+                ("per placeholder", lambda: io.StringIO().write(render.PLACEHOLDER.sub(per_placeholder, template)))):
+            lookups.clear()
+            started = time.perf_counter()
+            operation()
+            results[name] = (time.perf_counter() - started, len(lookups))
+    megabytes = len(template) / (1 << 20)
+    print("{:.1f} MiB template, {} placeholders".format(megabytes, options.references))
+    for name, (seconds, number_of_lookups) in results.items():
+        print("{:<16} {:10.1f} ms {:8.1f} MiB/s {:8d} lookups".format(name, seconds * 1000, megabytes / seconds,
+                                                                      number_of_lookups))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Database benchmark suite over synthetic vaults.
+
+Times the main Database operations on vaults of increasing size, recording wall time and peak traced
+memory, writes the results as JSON and compares them against a stored baseline.
+
+    python benchmarks/run.py --sizes 100,1000,10000 --output results.json
+    python benchmarks/run.py --sizes 100,1000 --baseline baseline.json --save-baseline
+    python benchmarks/run.py --sizes 100,1000 --baseline baseline.json --tolerance 1.25
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.vault_generator import SIZE_PRESETS, DEFAULT_PASSWORD, VaultSpec, generate_vault  # noqa: E402
+from src import app_launcher, database, transfer  # noqa: E402
+from src.app import App  # noqa: E402
+from src.cache import Cache  # noqa: E402
+
+SAMPLES = 100
+
+
+def measure(operation, repeat: int = 1):
+    """Returns (seconds per call, peak traced bytes) of operation, timed without tracing overhead."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        operation()
+    elapsed = (time.perf_counter() - started) / repeat
+    tracemalloc.start()
+    try:
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def run_size(directory: str, spec: VaultSpec) -> dict:
+    filename = os.path.join(directory, "vault_{}.kdbx".format(spec.number_of_entries))
+    generate_vault(filename, spec)
+    rng = random.Random(spec.seed)
+    entry_paths = list(spec.entry_paths())
+    group_paths = spec.group_paths()
+    sample_entries = [rng.choice(entry_paths) for _ in range(SAMPLES)]
+    sample_groups = [rng.choice(group_paths) for _ in range(SAMPLES)]
+    counter = iter(range(10 ** 9))
+    payload = rng.randbytes(spec.attachment_size)
+    results = {}
+
+    def record(name, operation, repeat=1):
+        seconds, peak = measure(operation, repeat)
+        results[name] = {"seconds": seconds, "peak_bytes": peak}
+
+    db = None
+
+    def open_db():
+        nonlocal db
+        db = database.open_database(filename, password=DEFAULT_PASSWORD)
+
+    record("open_database", open_db)
+    record("get_entry", lambda: [db.get_entry(path) for path in sample_entries])
+    record("cd_dir", lambda: [db.cd_dir(path) for path in sample_groups])
+    exported = list(transfer.export_records(db))
+    target = database.create_database(os.path.join(directory, "import.kdbx"), password=DEFAULT_PASSWORD)
+    # measure() runs the operation twice: each run imports the whole vault below its own directory
+    imports = iter([[json.dumps(dict(item, path="import{}/{}".format(run, item["path"]))) for item in exported]
+                    for run in range(2)])
+
+    def import_all():
+        transfer.import_records(target, next(imports))
+
+    record("import_records", import_all)
+    record("mk_dir", lambda: [db.mk_dir("new/d{}".format(next(counter))) for _ in range(SAMPLES)])
+    folder = db.mk_dir(group_paths[-1])
+    record("set_value", lambda: [folder.set_value("new{}".format(next(counter)), "value") for _ in range(SAMPLES)])
+    record("put_file", lambda: [folder.put_stream("new{}.bin".format(next(counter)), io.BytesIO(payload))
+                                for _ in range(SAMPLES)])
+    ls_args = app_launcher.parse_args(["-f", filename, "-p", DEFAULT_PASSWORD, "ls", group_paths[-1]])
+    with open(os.devnull, "w") as devnull:
+        app = App(ls_args, Cache(os.path.join(directory, "cache.json")), devnull, database=db)
+        record("ls_entries", app.ls_entries)
+    record("save", lambda: db.save(force=True))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Yields (size, operation, metric, ratio) for every measurement worse than baseline * tolerance."""
+    for size, operations in results["sizes"].items():
+        for operation, metrics in operations["operations"].items():
+            base = baseline.get("sizes", {}).get(size, {}).get("operations", {}).get(operation)
+            if not base:
+                continue
+            for metric in ("seconds", "peak_bytes"):
+                if base[metric] and metrics[metric] / base[metric] > tolerance:
+                    yield size, operation, metric, metrics[metric] / base[metric]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="benchmark Database operations on synthetic vaults")
+    parser.add_argument("--sizes", default="100,1000,10000",
+                        help="comma separated vault sizes from {}".format(sorted(SIZE_PRESETS)))
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="baseline JSON file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed ratio over the baseline")
+    options = parser.parse_args(args)
+
+    results = {"python": platform.python_version(), "machine": platform.machine(), "sizes": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (int(value) for value in options.sizes.split(",")):
+            spec = SIZE_PRESETS[size]
+            operations = run_size(directory, spec)
+            results["sizes"][str(size)] = {"spec": spec.to_dict(), "operations": operations}
+            for operation, metrics in operations.items():
+                print("{:>7} {:<14} {:10.2f} ms {:10.1f} KiB".format(
+                    size, operation, metrics["seconds"] * 1000, metrics["peak_bytes"] / 1024))
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if options.baseline and options.save_baseline:
+        with open(options.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+    elif options.baseline and os.path.exists(options.baseline):
+        with open(options.baseline, "r") as f:
+            regressions = list(compare(results, json.load(f), options.tolerance))
+        for size, operation, metric, ratio in regressions:
+            print("REGRESSION {} {} {}: {:.2f}x baseline".format(size, operation, metric, ratio))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Cold-start benchmark for the CLI based on ``python -X importtime``.
+
+Fails when the import time of a scenario exceeds the threshold, or when a scenario that does not need the
+database loads the pykeepass stack. The "forwarded get" scenario runs against an agent started on a temporary
+vault, which is the path every command takes while an agent is running.
+
+    python benchmarks/startup.py [--threshold-ms 150] [--runs 5]
+"""
+import argparse
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pykeepass", "lxml", "construct")
+SCENARIOS = {
+    "help": ["--help"],
+    "argument error": ["no-such-command"],
+}
+
+
+@contextlib.contextmanager
+def forwarded_scenario():
+    """Starts an agent on a temporary vault and yields the argv and environment of a get forwarded to it."""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from src import agent, database
+    from src.cache import Cache
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, XDG_RUNTIME_DIR=directory)
+        old_env = os.environ.get("XDG_RUNTIME_DIR")
+        os.environ["XDG_RUNTIME_DIR"] = directory
+        database_path = os.path.join(directory, "startup.kdbx")
+        db = database.create_database(database_path, password="startup")
+        db.mk_dir("the_dir").set_value("entry", "value")
+        db.save()
+        server = agent.Agent(database_path, db, Cache(os.path.join(directory, "cache.json")))
+        server.listen()
+        thread = threading.Thread(target=server.serve)
+        thread.start()
+        try:
+            yield ["-f", database_path, "get", "the_dir/entry"], env
+        finally:
+            agent.send_action(database_path, "stop")
+            thread.join()
+            if old_env is None:
+                del os.environ["XDG_RUNTIME_DIR"]
+            else:
+                os.environ["XDG_RUNTIME_DIR"] = old_env
+
+
+def measure(argv, env=None):
+    """Returns the total import time in microseconds, the set of imported top-level packages and the exit code."""
+    result = subprocess.run([sys.executable, "-X", "importtime", os.path.join(ROOT, "launcher.py")] + argv,
+                            cwd=ROOT, capture_output=True, text=True, env=env)
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, module = line[len("import time:"):].split("|")
+        total += int(self_time)
+        modules.add(module.strip().split(".")[0])
+    return total, modules, result.returncode
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threshold-ms", type=float, default=150.0)
+    parser.add_argument("--runs", type=int, default=5)
+    options = parser.parse_args(args)
+
+    failed = False
+    for name, argv in SCENARIOS.items():
+        failed = report(name, [measure(argv) for _ in range(options.runs)], options.threshold_ms) or failed
+    with forwarded_scenario() as (argv, env):
+        measurements = [measure(argv, env) for _ in range(options.runs)]
+    failed = report("forwarded get", measurements, options.threshold_ms, expect_success=True) or failed
+    return 1 if failed else 0
+
+
+def report(name, measurements, threshold_ms, expect_success=False) -> bool:
+    """Prints the best run of a scenario and returns whether it failed."""
+    best = min(total for total, _, _ in measurements) / 1000
+    heavy = sorted(set(HEAVY_MODULES) & set.union(*(modules for _, modules, _ in measurements)))
+    status = "ok"
+    if expect_success and any(code for _, _, code in measurements):
+        status = "FAIL: command failed"
+    elif best > threshold_ms:
+        status = "FAIL: over {:.0f} ms".format(threshold_ms)
+    elif heavy:
+        status = "FAIL: imports {}".format(", ".join(heavy))
+    print("{:<16} {:8.1f} ms  {}".format(name, best, status))
+    return status != "ok"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
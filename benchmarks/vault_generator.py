@@ -0,0 +1,93 @@
+"""Synthetic vault generator for the benchmarks.
+
+    python benchmarks/vault_generator.py out.kdbx --depth 2 --fan-out 10 --entries-per-group 90
+"""
+import argparse
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src import database  # noqa: E402
+
+DEFAULT_PASSWORD = "benchmark"
+
+
+class VaultSpec:
+    def __init__(self, depth: int = 1, fan_out: int = 4, entries_per_group: int = 20, attachments: int = 0,
+                 attachment_size: int = 1024, seed: int = 0):
+        self.depth = depth
+        self.fan_out = fan_out
+        self.entries_per_group = entries_per_group
+        self.attachments = attachments
+        self.attachment_size = attachment_size
+        self.seed = seed
+
+    def group_paths(self):
+        """Paths of every group in the vault, root ("") first, breadth first."""
+        paths = [""]
+        level = [""]
+        for _ in range(self.depth):
+            level = ["{}/g{}".format(parent, i) if parent else "g{}".format(i)
+                     for parent in level for i in range(self.fan_out)]
+            paths.extend(level)
+        return paths
+
+    def entry_paths(self):
+        for group_path in self.group_paths():
+            for i in range(self.entries_per_group):
+                yield "{}/e{}".format(group_path, i) if group_path else "e{}".format(i)
+
+    @property
+    def number_of_entries(self) -> int:
+        return len(self.group_paths()) * self.entries_per_group
+
+    def to_dict(self) -> dict:
+        return dict(vars(self), number_of_entries=self.number_of_entries)
+
+
+SIZE_PRESETS = {
+    100: VaultSpec(depth=1, fan_out=4, entries_per_group=20, attachments=10),
+    1000: VaultSpec(depth=2, fan_out=4, entries_per_group=48, attachments=50),
+    10000: VaultSpec(depth=2, fan_out=10, entries_per_group=90, attachments=100),
+    100000: VaultSpec(depth=3, fan_out=10, entries_per_group=90, attachments=200),
+}
+
+
+def generate_vault(filename: str, spec: VaultSpec, password: str = DEFAULT_PASSWORD):
+    """Creates filename with the groups, entries and attachments described by spec and returns the Database."""
+    rng = random.Random(spec.seed)
+    db = database.create_database(filename, password=password)
+    group_paths = spec.group_paths()
+    folders = {path: db.mk_dir(path) if path else db.root_directory for path in group_paths}
+    for path, folder in folders.items():
+        for i in range(spec.entries_per_group):
+            folder.set_value("e{}".format(i), "value-{}-{}".format(path, rng.getrandbits(64)))
+    for i in range(spec.attachments):
+        folder = folders[group_paths[i % len(group_paths)]]
+        folder.put_file("a{}.bin".format(i), rng.randbytes(spec.attachment_size))
+    db.save()
+    return db
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="generate a synthetic kdbx vault")
+    parser.add_argument("filename")
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--fan-out", type=int, default=4)
+    parser.add_argument("--entries-per-group", type=int, default=20)
+    parser.add_argument("--attachments", type=int, default=0)
+    parser.add_argument("--attachment-size", type=int, default=1024)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    options = parser.parse_args(args)
+    spec = VaultSpec(options.depth, options.fan_out, options.entries_per_group, options.attachments,
+                     options.attachment_size)
+    generate_vault(options.filename, spec, options.password)
+    print("Generated {} with {} entries".format(options.filename, spec.number_of_entries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import argparse
+import codecs
+import contextlib
+import hashlib
+import io
+import json
+import os
+import socket
+import struct
+import sys
+import time
+
+from src import config
+from src.cache import get_runtime_dir
+from src.locking import DatabaseLock, file_stamp
+
+FORWARDED_COMMANDS = {"ls", "get", "get-file", "set", "put-file", "del", "gc", "put-dir", "get-dir", "export"}
+MUTATING_COMMANDS = {"set", "put-file", "del", "gc", "put-dir"}
+FRAME_HEADER = ">I"
+OUTPUT_BUFFER_SIZE = 1 << 16
+
+
+def get_socket_path(database_path: str):
+    runtime_dir = get_runtime_dir()
+    if not runtime_dir:
+        return None
+    digest = hashlib.sha256(database_path.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(runtime_dir, config.CONFIG["agent_socket_name"].format(digest))
+
+
+class Agent:
+    """Keeps one unlocked Database in memory and serves App commands over a Unix socket."""
+
+    def __init__(self, database_path: str, db, cache, idle_timeout: int = None):
+        self.database_path = database_path
+        self.socket_path = get_socket_path(database_path)
+        self.idle_timeout = idle_timeout or config.CONFIG["agent_idle_timeout"]
+        self._db = db
+        self._stamp = file_stamp(database_path)
+        self._cache = cache
+        self._socket = None
+        self._running = False
+        self._last_activity = time.monotonic()
+
+    def listen(self):
+        if not self.socket_path:
+            raise Exception("No runtime directory available for the agent socket")
+        if os.path.exists(self.socket_path):
+            if send_action(self.database_path, "status") is not None:
+                raise Exception("Agent already running for database: {}".format(self.database_path))
+            os.remove(self.socket_path)
+        old_umask = os.umask(0o177)
+        try:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        self._socket.listen()
+
+    def serve(self):
+        if not self._socket:
+            self.listen()
+        self._running = True
+        self._last_activity = time.monotonic()
+        try:
+            while self._running:
+                remaining = self._last_activity + self.idle_timeout - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._socket.settimeout(remaining)
+                try:
+                    conn, _ = self._socket.accept()
+                except socket.timeout:
+                    continue
+                with conn:
+                    try:
+                        self._handle(conn)
+                    except (OSError, ValueError, KeyError, TypeError, AttributeError) as ex:
+                        _send_error(conn, ex)
+        finally:
+            self._db = None
+            self._socket.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def _handle(self, conn: socket.socket):
+        conn.settimeout(30)
+        if not _is_same_user(conn):
+            return
+        request = json.loads(_receive(conn))
+        if not isinstance(request, dict):
+            raise ValueError("request is not a JSON object")
+        self._last_activity = time.monotonic()
+        if request.get("action") == "run" and self._db is not None:
+            self._run(conn, argparse.Namespace(**request["args"]))
+            return
+        _send(conn, self._dispatch(request))
+
+    def _dispatch(self, request: dict) -> dict:
+        action = request.get("action")
+        if action == "status":
+            return {"status": "ok", "database": self.database_path, "locked": self._db is None,
+                    "idle_timeout": self.idle_timeout}
+        if action == "lock":
+            self._db = None
+            return {"status": "ok", "database": self.database_path, "locked": True}
+        if action == "stop":
+            self._running = False
+            return {"status": "ok", "database": self.database_path, "stopped": True}
+        if action == "run":
+            return {"status": "locked"}
+        return {"status": "error", "err": "unknown action: {}\n".format(action)}
+
+    def _run(self, conn: socket.socket, args: argparse.Namespace):
+        """Streams the command output to conn as length-prefixed frames, so large attachments are never buffered
+        whole. The frames come between a JSON header line and a JSON trailer with the exit code and stderr."""
+        from src import app_launcher
+        from src.app import App
+
+        _send(conn, {"status": "ok"})
+        out = io.TextIOWrapper(io.BufferedWriter(_FrameWriter(conn), OUTPUT_BUFFER_SIZE), encoding="utf-8",
+                               write_through=True)
+        err = io.StringIO()
+        with contextlib.redirect_stderr(err):
+            try:
+                self._check_credentials(args)
+                with DatabaseLock(self.database_path, exclusive=args.command in MUTATING_COMMANDS):
+                    self._refresh()
+                    # other processes may have changed the cache file since the last request
+                    self._cache.reload()
+                    code = app_launcher.execute(App(args, self._cache, out, database=self._db), args.command)
+                    self._stamp = file_stamp(self.database_path)
+            except Exception as ex:
+                err.write("ERROR: {}\n".format(ex))
+                code = 1
+        out.flush()
+        conn.sendall(struct.pack(FRAME_HEADER, 0))
+        _send(conn, {"code": code, "err": err.getvalue()})
+
+    def _check_credentials(self, args: argparse.Namespace):
+        """Rejects a command whose -p or -k do not make the composite key the agent unlocked the database with."""
+        if not (args.password or args.keyfile):
+            return
+        keyfile = os.path.join(args.curdir, args.keyfile) if args.keyfile and args.curdir else args.keyfile
+        if not self._db.has_credentials(args.password, keyfile):
+            raise Exception("invalid credentials for database: {}".format(self.database_path))
+
+    def _refresh(self):
+        """Reloads the database if another process saved it since it was opened, so no write is based on a stale
+        copy. Must be called with the database lock held."""
+        stamp = file_stamp(self.database_path)
+        if stamp != self._stamp:
+            self._db = self._db.reload()
+            self._stamp = stamp
+
+
+def can_forward(args: argparse.Namespace) -> bool:
+    return args.command in FORWARDED_COMMANDS and not (args.command == "put-file" and args.source == "-")
+
+
+def forward(args: argparse.Namespace, database_path: str, out=sys.stdout):
+    """Run the command on the agent for database_path. Returns the exit code, or None if no agent answered."""
+    request_args = dict(vars(args))
+    request_args["curdir"] = args.curdir or os.getcwd()
+    conn = _connect(database_path)
+    if conn is None:
+        return None
+    with conn:
+        try:
+            _send(conn, {"action": "run", "args": request_args})
+            conn.shutdown(socket.SHUT_WR)
+            stream = conn.makefile("rb")
+            header = json.loads(stream.readline())
+        except (OSError, ValueError):
+            return None
+        if header.get("status") != "ok":
+            return None
+        try:
+            _copy_frames(stream, out)
+            trailer = json.loads(stream.read())
+        except (OSError, ValueError) as ex:
+            sys.stderr.write("ERROR: agent connection failed: {}\n".format(ex))
+            return 1
+    sys.stderr.write(trailer["err"])
+    return trailer["code"]
+
+
+def _copy_frames(stream, out):
+    output = getattr(out, "buffer", None)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    if output is not None:
+        out.flush()
+    while True:
+        header = stream.read(struct.calcsize(FRAME_HEADER))
+        if len(header) != struct.calcsize(FRAME_HEADER):
+            raise ValueError("truncated agent response")
+        size, = struct.unpack(FRAME_HEADER, header)
+        if not size:
+            break
+        while size:
+            chunk = stream.read(min(size, OUTPUT_BUFFER_SIZE))
+            if not chunk:
+                raise ValueError("truncated agent response")
+            size -= len(chunk)
+            if output is None:
+                out.write(decoder.decode(chunk))
+            else:
+                output.write(chunk)
+    if output is None:
+        out.write(decoder.decode(b"", final=True))
+    else:
+        output.flush()
+
+
+def send_action(database_path: str, action: str):
+    return _request(database_path, {"action": action})
+
+
+def _connect(database_path: str):
+    socket_path = get_socket_path(database_path)
+    if not socket_path or not os.path.exists(socket_path):
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+    except OSError:
+        conn.close()
+        return None
+    return conn
+
+
+def _request(database_path: str, request: dict):
+    conn = _connect(database_path)
+    if conn is None:
+        return None
+    with conn:
+        try:
+            _send(conn, request)
+            conn.shutdown(socket.SHUT_WR)
+            return json.loads(_receive(conn))
+        except (OSError, ValueError):
+            return None
+
+
+def _send(conn: socket.socket, message: dict):
+    conn.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def _send_error(conn: socket.socket, ex: Exception):
+    try:
+        _send(conn, {"status": "error", "err": "ERROR: {}\n".format(ex)})
+    except OSError:
+        pass
+
+
+class _FrameWriter(io.RawIOBase):
+    """Raw stream that sends every write to the socket as one length-prefixed frame."""
+
+    def __init__(self, conn: socket.socket):
+        self._conn = conn
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        size = len(data)
+        if size:
+            self._conn.sendall(struct.pack(FRAME_HEADER, size))
+            self._conn.sendall(data)
+        return size
+
+
+def _receive(conn: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _is_same_user(conn: socket.socket) -> bool:
+    if not hasattr(socket, "SO_PEERCRED"):
+        return True
+    credentials = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", credentials)
+    return uid == os.getuid()
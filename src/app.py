@@ -1,45 +1,118 @@
+import json
 import os
+import stat
 import sys
+import tempfile
 
-from src import password_generator, config, database
-from src.database import KeyValue, File
+from src import password_generator, config, database, agent, batch, kdf, paths, render, search, shell, sidecar, \
+    sync, timings, transfer
+from src.locking import DatabaseLock, file_stamp
+from src.key_cache import KeyCache
+from src.database import KeyValue, File, Folder
+
+
+GENERATE_CHUNK_SIZE = 4096
 
 
 class App:
-    def __init__(self, args, cache, out=sys.stdout, stdin=sys.stdin):
+    def __init__(self, args, cache, out=sys.stdout, stdin=sys.stdin, database=None, autosave=True):
         self.args = args
         self.cache = cache
         self.out = out
         self.stdin = stdin
+        self.database = database
+        self.autosave = autosave
+        self._sidecar_missed = False
 
     def create(self):
         database_path = self._resolve_database_path()
-        password = self.args.password or password_generator.generate(config.CONFIG["generate_password_size"])
+        password = self.args.password or password_generator.generate(config.CONFIG["generate_password_size"],
+                                                                     config.CONFIG["generate_password_alphabet"])
         keyfile = self.args.keyfile
 
         if not os.path.exists(database_path):
             db = database.create_database(database_path, password=password, keyfile=keyfile)
+            db.set_kdf_parameters(self._kdf_parameters(db.kdf_parameters, kdf.default_parallelism()))
+            self._apply_compression(db)
             db.save()
+            self._write_sidecar(db)
             self.out.write("Database created: {}\n".format(database_path))
         else:
             sys.stderr.write("Database already exists: {}\n".format(database_path))
             return False
 
-        self.cache.data.setdefault("databases", {}).setdefault(database_path, {})["password"] = password
-        self.cache.data["last_database"] = database_path
+        self.cache.set_database_entry(database_path, "password", password)
+        self.cache.set("last_database", database_path)
         self.cache.save()
         return True
 
+    def rekdf(self):
+        """Re-encrypts the database with new KDF parameters, under the write lock."""
+        database_path = self._resolve_database_path()
+        credentials = self._resolve_credentials(database_path)
+        with self._write_lock():
+            db = self._open_database(lock=False, credentials=credentials)
+            parameters = self._kdf_parameters(db.kdf_parameters)
+            db.set_kdf_parameters(parameters)
+            self._apply_compression(db)
+            db.save()
+            self._write_sidecar(db)
+        KeyCache(database_path, 0).clear()
+        self.out.write("KDF changed: {}\n".format(kdf.describe(parameters)))
+        self._update_cache()
+        return True
+
+    def calibrate(self):
+        parameters = kdf.calibrate(self.args.target_ms, self.args.kdf or "argon2id", self.args.kdf_memory,
+                                   self.args.kdf_parallelism)
+        self.out.write("{}: {:.1f} ms\n".format(kdf.describe(parameters), kdf.measure(parameters) * 1000))
+        return True
+
+    def _kdf_parameters(self, current: dict, default_parallelism: int = None) -> dict:
+        """KDF parameters from the command line: calibrated with --target-ms, else current with the given values."""
+        if self.args.target_ms:
+            kdf_type = self.args.kdf or (current["kdf"] if current["kdf"] != "aes" else "argon2id")
+            return kdf.calibrate(self.args.target_ms, kdf_type, self.args.kdf_memory,
+                                 self.args.kdf_parallelism or default_parallelism)
+        return kdf.resolve_parameters(current, self.args.kdf, self.args.kdf_memory, self.args.kdf_iterations,
+                                      self.args.kdf_parallelism or default_parallelism)
+
     def set_entry(self):
-        db = self._open_database()
-        directory = db.mk_dir(os.path.dirname(self.args.entry_path))
-        directory.set_value(os.path.basename(self.args.entry_path), self.args.entry_value)
-        db.save()
+        value = self.args.entry_value
+        if self.args.generate:
+            value = password_generator.generate(self.args.length or config.CONFIG["generate_password_size"],
+                                                self.args.alphabet)
+        elif value is None:
+            sys.stderr.write("ERROR: no value informed, give one or use --generate\n")
+            return False
+
+        def operation(db):
+            directory = db.mk_dir(os.path.dirname(self.args.entry_path))
+            directory.set_value(os.path.basename(self.args.entry_path), value)
+
+        self._modify_database(operation)
         self._update_cache()
+        return True
+
+    def generate(self):
+        """Prints count passwords, one per line, generated in chunks of random characters."""
+        length = self.args.length or config.CONFIG["generate_password_size"]
+        remaining = self.args.count
+        while remaining > 0:
+            count = min(remaining, GENERATE_CHUNK_SIZE)
+            self.out.write("\n".join(password_generator.generate_many(count, length, self.args.alphabet)) + "\n")
+            remaining -= count
+        return True
 
     def get_entry(self):
-        db = self._open_database()
         entry_path = self.args.entry_path
+        index = self._read_sidecar()
+        value = index.get_value(entry_path) if index else None
+        if value is not None:
+            self.out.write("{}\n".format(value))
+            self._update_cache()
+            return True
+        db = self._open_database()
         entry = db.get_entry(entry_path)
         if entry and isinstance(entry, KeyValue):
             self.out.write("{}\n".format(entry.value))
@@ -48,6 +121,89 @@ class App:
         sys.stderr.write("ERROR: key value not found: {}\n".format(entry_path))
         return None
 
+    def exec_command(self):
+        """Replaces this process by the command, with the values of KeyValues added to its environment.
+
+        The --env NAME=path mappings and those of --env-file are all resolved against one open database, or the
+        sidecar index, before the exec, so the values are never written anywhere but the child's environment."""
+        command_line = self.args.exec_args[1:] if self.args.exec_args[:1] == ["--"] else self.args.exec_args
+        if not command_line:
+            sys.stderr.write("ERROR: no command informed to exec\n")
+            return False
+        mappings = [parse_env_mapping(mapping) for mapping in self.args.env or []]
+        for env_file in self.args.env_file or []:
+            with open(self._resolve_path(env_file), "r") as f:
+                mappings.extend(read_env_mappings(f))
+        values = self._value_resolver()(path for _, path in mappings)
+        if values is None:
+            return False
+        environment = dict(os.environ)
+        environment.update((name, values[path]) for name, path in mappings)
+        self._update_cache()
+        self.out.flush()
+        sys.stderr.flush()
+        try:
+            os.execvpe(command_line[0], command_line, environment)
+        except OSError as ex:
+            sys.stderr.write("ERROR: cannot run {}: {}\n".format(command_line[0], ex))
+            return False
+
+    def render(self):
+        """Writes the template with its {{ path }} placeholders replaced by the values of KeyValues, or the contents
+        of Files as text, to stdout as it is read, or to the output file, replaced only once complete."""
+        resolve = self._value_resolver(files=True)
+        if self.args.source == "-":
+            rendered = self._render_to(self.stdin, resolve)
+        else:
+            with open(self._resolve_path(self.args.source), "r", encoding="utf-8") as template:
+                rendered = self._render_to(template, resolve)
+        if rendered:
+            self._update_cache()
+        return rendered
+
+    def _render_to(self, template, resolve) -> bool:
+        if not self.args.output_file:
+            return render.render(render.iter_chunks(template), resolve, self.out)
+        output_file = os.path.abspath(self._resolve_path(self.args.output_file))
+        fd, temp_filename = tempfile.mkstemp(prefix=".{}.".format(os.path.basename(output_file)), suffix=".tmp",
+                                             dir=os.path.dirname(output_file))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                rendered = render.render(render.iter_chunks(template), resolve, f)
+            if rendered:
+                if os.path.exists(output_file):
+                    os.chmod(temp_filename, stat.S_IMODE(os.stat(output_file).st_mode))
+                os.replace(temp_filename, output_file)
+        finally:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+        return rendered
+
+    def _value_resolver(self, files: bool = False):
+        """Returns resolve(entry_paths), which gives the values of the KeyValues at entry_paths, and with files the
+        contents of Files as text, as a dict by path; or None, after an error message, if any of them is missing.
+
+        Values come from the sidecar index when possible, else from the database, opened once on the first miss."""
+        index = self._read_sidecar()
+        opened = []
+
+        def resolve(entry_paths):
+            values = {}
+            for entry_path in dict.fromkeys(entry_paths):
+                value = index.get_value(entry_path) if index else None
+                if value is None:
+                    if not opened:
+                        opened.append(self._open_database())
+                    value = _entry_text(opened[0].get_entry(entry_path), files)
+                    if value is None:
+                        sys.stderr.write("ERROR: {} not found: {}\n".format(
+                            "key value or text file" if files else "key value", entry_path))
+                        return None
+                values[entry_path] = value
+            return values
+
+        return resolve
+
     def get_file(self):
         db = self._open_database()
         source = self.args.source
@@ -55,45 +211,315 @@ class App:
         if entry and isinstance(entry, File):
             if self.args.output_file:
                 with open(self._resolve_path(self.args.output_file), "bw") as f:
-                    f.write(entry.contents)
+                    entry.write_to(f)
             else:
-                self.out.write("{}".format(entry.contents.decode("utf-8")))
+                self._write_binary(entry)
             self._update_cache()
             return entry
         sys.stderr.write("ERROR: file not found: {}\n".format(source))
         return None
 
     def put_file(self):
-        with open(self._resolve_path(self.args.source), "br") as f:
+        if self.args.source == "-":
+            target_path, filename = os.path.split(self.args.destination)
+            buffer = database.read_binary(self.stdin.buffer, self.args.max_size)
+        else:
+            target_path, filename = self.args.destination, os.path.basename(self.args.source)
+            with open(self._resolve_path(self.args.source), "br") as f:
+                buffer = database.read_binary(f, self.args.max_size)
+
+        def operation(db):
+            target_dir = db.mk_dir(target_path) if target_path else db.root_directory
+            target_dir.put_buffer(filename, buffer)
+            return db.deduplicated_bytes
+
+        deduplicated_bytes = self._modify_database(operation)
+        if deduplicated_bytes:
+            self.out.write("Reused identical attachment: {} bytes saved\n".format(deduplicated_bytes))
+        self._update_cache()
+
+    def put_dir(self):
+        local_dir = self._resolve_path(self.args.source)
+        if not os.path.isdir(local_dir):
+            sys.stderr.write("ERROR: directory not found: {}\n".format(self.args.source))
+            return False
+        if self.args.dry_run:
+            steps = sync.plan_put(self._open_database(), local_dir, self.args.destination)
+        else:
+            steps = self._modify_database(lambda db: list(sync.apply_put(
+                db, sync.plan_put(db, local_dir, self.args.destination), self.args.max_size)))
+        self._report_sync((action, entry_path) for action, _, entry_path in steps)
+        self._update_cache()
+        return True
+
+    def get_dir(self):
+        db = self._open_database()
+        if db.cd_dir(self.args.source) is None:
+            sys.stderr.write("ERROR: directory not found: {}\n".format(self.args.source))
+            return False
+        try:
+            # the whole plan is checked before the first file is written
+            steps = list(sync.plan_get(db, self.args.source, self._resolve_path(self.args.destination)))
+        except Exception as ex:
+            sys.stderr.write("ERROR: {}\n".format(ex))
+            return False
+        if not self.args.dry_run:
+            steps = sync.apply_get(steps, self.args.jobs)
+        self._report_sync((action, local_path) for action, _, local_path in steps)
+        self._update_cache()
+        return True
+
+    def _report_sync(self, steps):
+        counts = {sync.ADDED: 0, sync.UPDATED: 0, sync.UNCHANGED: 0}
+        for action, path in steps:
+            counts[action] += 1
+            if action != sync.UNCHANGED:
+                self.out.write("{} {}\n".format(action, path))
+        self.out.write("{} added, {} updated, {} unchanged{}\n".format(
+            counts[sync.ADDED], counts[sync.UPDATED], counts[sync.UNCHANGED], " (dry run)" if self.args.dry_run else ""))
+
+    def export_entries(self):
+        db = self._open_database()
+        if db.cd_dir(self.args.source) is None:
+            sys.stderr.write("ERROR: directory not found: {}\n".format(self.args.source))
+            return False
+        if self.args.output_file:
+            with open(self._resolve_path(self.args.output_file), "w") as f:
+                self._write_records(transfer.export_records(db, self.args.source), f)
+        else:
+            self._write_records(transfer.export_records(db, self.args.source), self.out)
+        self._update_cache()
+        return True
+
+    @staticmethod
+    def _write_records(records, out):
+        for record in timings.timed_iter("entries", records):
+            out.write(json.dumps(record))
+            out.write("\n")
+
+    def import_entries(self):
+        credentials = self._resolve_credentials(self._resolve_database_path())
+        with self._write_lock():
+            db = self._open_database(lock=False, credentials=credentials)
+            if self.args.source == "-":
+                counts = transfer.import_records(db, self.stdin)
+            else:
+                with open(self._resolve_path(self.args.source), "r") as f:
+                    counts = transfer.import_records(db, f)
+            self._save_database(db)
+        self.out.write("Imported {} directories, {} values and {} files\n".format(
+            counts["directory"], counts["value"], counts["file"]))
+        self._update_cache()
+        return True
+
+    def gc(self):
+        removed, saved_bytes = self._modify_database(lambda db: db.gc())
+        self.out.write("Removed {} unreferenced binaries: {} bytes saved\n".format(removed, saved_bytes))
+        self._update_cache()
+        return True
+
+    def batch(self):
+        credentials = self._resolve_credentials(self._resolve_database_path())
+        with self._write_lock():
+            db = self._open_database(lock=False, credentials=credentials)
+            self._apply_compression(db)
+            runner = batch.BatchRunner(db, self.cache, self.args, self.out, self.args.checkpoint,
+                                       after_save=self._write_sidecar)
+            if self.args.source == "-":
+                result = runner.run(self.stdin)
+            else:
+                with open(self._resolve_path(self.args.source), "r") as f:
+                    result = runner.run(f)
+        self._update_cache()
+        return result
+
+    def shell(self):
+        """Unlocks the database once and runs an interactive shell on it, saving on `save` and on exit."""
+        database_path = self._resolve_database_path()
+        credentials = self._resolve_credentials(database_path)
+        with DatabaseLock(database_path):
+            stamp = file_stamp(database_path)
+            db = self._open_database(lock=False, credentials=credentials)
+        self._apply_compression(db)
+        self._update_cache()
+        shell.Shell(database_path, db, stamp, self.cache, self.args, self.out, self.stdin,
+                    after_save=self._write_sidecar).run()
+        return True
+
+    def agent(self):
+        database_path = self._resolve_database_path()
+        action = self.args.agent_action
+        if action == "start":
             db = self._open_database()
-            data = f.read()
-            target_dir = db.mk_dir(self.args.destination) if self.args.destination else db.root_directory
-            target_dir.put_file(os.path.basename(self.args.source), data)
-            db.save()
             self._update_cache()
+            server = agent.Agent(database_path, db, self.cache, self.args.idle_timeout)
+            server.listen()
+            self.out.write("Agent listening on {}\n".format(server.socket_path))
+            if self.args.detach:
+                self.out.flush()
+                if os.fork():
+                    return True
+                os.setsid()
+                with open(os.devnull, "r+") as devnull:
+                    for stream in (sys.stdin, sys.stdout, sys.stderr):
+                        os.dup2(devnull.fileno(), stream.fileno())
+                server.serve()
+                os._exit(0)
+            server.serve()
+            return True
+        response = agent.send_action(database_path, action)
+        if response is None:
+            sys.stderr.write("ERROR: no agent running for database: {}\n".format(database_path))
+            return False
+        if action == "status":
+            state = "locked" if response["locked"] else "unlocked"
+            self.out.write("Agent running for {} ({})\n".format(database_path, state))
+        elif action == "lock":
+            self.out.write("Agent locked: {}\n".format(database_path))
+        else:
+            self.out.write("Agent stopped: {}\n".format(database_path))
+        return True
+
+    def _open_database(self, lock: bool = True, keep_kdf_salt: bool = False, credentials: tuple = None):
+        """Opens the database under a shared lock, unless lock is False because the caller already holds one.
 
-    def _open_database(self):
+        credentials is the (password, keyfile) pair of _resolve_credentials. Resolving them may prompt for the
+        password, so a caller holding the lock resolves them before taking it."""
+        if self.database:
+            return self.database
         database_path = self._resolve_database_path()
-        password = self._resolve_password(database_path)
-        keyfile = self.args.keyfile or self._cache_get_database_entry(database_path, "keyfile")
-        return database.open_database(filename=database_path, password=password, keyfile=keyfile)
+        if credentials is None:
+            credentials = self._resolve_credentials(database_path)
+        if lock:
+            with DatabaseLock(database_path):
+                return self._open_database(lock=False, keep_kdf_salt=keep_kdf_salt, credentials=credentials)
+        password, keyfile = credentials
+        key_cache_ttl = self._key_cache_ttl(database_path)
+        if not key_cache_ttl:
+            if key_cache_ttl == 0:
+                KeyCache(database_path, 0).clear()
+            return database.open_database(filename=database_path, password=password, keyfile=keyfile,
+                                          keep_kdf_salt=keep_kdf_salt)
+        key_cache = KeyCache(database_path, key_cache_ttl)
+        transformed_key = key_cache.load(password, keyfile)
+        db = database.open_database(filename=database_path, password=password, keyfile=keyfile,
+                                    transformed_key=transformed_key, keep_kdf_salt=True)
+        if db.transformed_key != transformed_key:
+            key_cache.store(db.transformed_key, password, keyfile)
+        if self._sidecar_missed:
+            sidecar.write(database_path, db, db.transformed_key)
+            self._sidecar_missed = False
+        return db
+
+    def _key_cache_ttl(self, database_path: str):
+        key_cache_ttl = self.args.key_cache_ttl
+        if key_cache_ttl is None:
+            key_cache_ttl = self._cache_get_database_entry(database_path, "key_cache_ttl")
+        return key_cache_ttl
+
+    def _read_sidecar(self):
+        """Returns the sidecar index of the database when the key cache holds its transformed key and the sidecar
+        matches the current file, so read-only commands can skip decrypting and parsing it. On a miss, the next
+        _open_database writes a fresh sidecar while it still holds the shared lock."""
+        if self.database:
+            return None
+        database_path = self._resolve_database_path()
+        key_cache_ttl = self._key_cache_ttl(database_path)
+        if not key_cache_ttl:
+            return None
+        password, keyfile = self._resolve_credentials(database_path)
+        with DatabaseLock(database_path):
+            transformed_key = KeyCache(database_path, key_cache_ttl).load(password, keyfile)
+            index = sidecar.read(database_path, transformed_key)
+        self._sidecar_missed = index is None
+        return index
+
+    def _modify_database(self, operation):
+        """Runs operation(db) and saves, so that concurrent writers do not lose each other's changes.
+
+        By default the exclusive lock is held from the open, KDF included, to the save. With --optimistic the
+        database is opened under a shared lock only, and if another process saved it in the meantime the
+        operation is applied again on a fresh copy, opened with the already derived key, before saving. Optimistic
+        writers keep the KDF salt on save, as the key cache does, so that the derived key stays reusable.
+
+        An injected database belongs to a caller (batch, agent) that already holds the lock."""
+        if self.database:
+            result = operation(self.database)
+            self._save_database(self.database)
+            return result
+        database_path = self._resolve_database_path()
+        credentials = self._resolve_credentials(database_path)
+        if not self.args.optimistic:
+            with self._write_lock():
+                db = self._open_database(lock=False, credentials=credentials)
+                result = operation(db)
+                self._save_database(db)
+            return result
+        with DatabaseLock(database_path):
+            stamp = file_stamp(database_path)
+            db = self._open_database(lock=False, keep_kdf_salt=True, credentials=credentials)
+        result = operation(db)
+        if not db.is_dirty:
+            return result
+        with self._write_lock():
+            if file_stamp(database_path) != stamp:
+                db = db.reload()
+                result = operation(db)
+            self._save_database(db)
+        return result
+
+    def _write_lock(self):
+        return DatabaseLock(self._resolve_database_path(), exclusive=True)
 
     def _resolve_database_path(self):
-        database_path = self.args.database_path or self.cache.data.get("last_database")
-        if not database_path:
-            raise Exception("Database filename not informed")
-        return os.path.abspath(self._resolve_path(database_path))
+        return paths.resolve_database_path(self.args, self.cache)
 
     def _cache_get_database_entry(self, database_path: str, entry_name: str):
-        return self.cache.data.get("databases", {}).get(database_path, {}).get(entry_name)
+        return self.cache.get_database_entry(database_path, entry_name)
 
     def ls_entries(self):
-        db = self._open_database()
         source = self.args.source
+        plain = not self.args.recursive and not self.args.json and not _has_wildcards(source)
+        index = self._read_sidecar() if plain else None
+        lines = index.list_directory(source) if index else None
+        if lines is not None:
+            for line in lines:
+                self.out.write("{}\n".format(line))
+            self.out.write("{} entries\n".format(len(lines)))
+            self._update_cache()
+            return True
+        db = self._open_database()
+        if plain:
+            return self._ls_directory(db, source)
+        if _has_wildcards(source):
+            entries = db.glob(source)
+            if self.args.recursive:
+                entries = _expand_folders(entries)
+        elif db.cd_dir(source) is not None:
+            entries = db.walk(source) if self.args.recursive else db.cd_dir(source).entries()
+        else:
+            sys.stderr.write("ERROR: directory not found: {}\n".format(source))
+            return False
+        number_of_entries = 0
+        for entry in timings.timed_iter("entries", entries):
+            if self.args.json:
+                self.out.write(json.dumps(_entry_record(entry)) + "\n")
+            else:
+                self.out.write("{}{}\n".format(entry.path, "/" if isinstance(entry, Folder) else ""))
+            number_of_entries += 1
+        if not self.args.json:
+            self.out.write("{} entries\n".format(number_of_entries))
+        if not number_of_entries and _has_wildcards(source):
+            sys.stderr.write("ERROR: no entries match: {}\n".format(source))
+            return False
+        self._update_cache()
+        return True
+
+    def _ls_directory(self, db, source: str):
         directory = db.cd_dir(source)
         if directory:
             number_of_entries = 0
-            for entry in directory.entries():
+            for entry in timings.timed_iter("entries", directory.entries()):
                 self.out.write("{}\n".format(entry))
                 number_of_entries += 1
             self.out.write("{} entries\n".format(number_of_entries))
@@ -102,32 +528,101 @@ class App:
             sys.stderr.write("ERROR: directory not found: {}\n".format(source))
         return directory
 
+    def find(self):
+        """Searches every database known to the cache, or the ones given with -d, printing database:path lines as
+        each database finishes."""
+        if self.args.databases:
+            selected = [os.path.abspath(self._resolve_path(path)) for path in self.args.databases]
+        else:
+            selected = list(self.cache.get("databases", {}))
+        databases = {}
+        for database_path in selected:
+            password = self.args.password or self._cache_get_database_entry(database_path, "password")
+            if not password:
+                sys.stderr.write("WARN: no password known for database: {}\n".format(database_path))
+                continue
+            keyfile = self.args.keyfile or self._cache_get_database_entry(database_path, "keyfile")
+            databases[database_path] = (password, keyfile)
+        success = True
+        for database_path, found, seconds, error in search.search_databases(databases, self.args.pattern,
+                                                                            self.args.match, self.args.jobs):
+            for path in found:
+                self.out.write("{}:{}\n".format(database_path, path))
+            self.out.flush()
+            if error:
+                sys.stderr.write("ERROR: {}: {}\n".format(database_path, error))
+                success = False
+            elif self.args.timings:
+                sys.stderr.write("{}: {} matches in {:.3f}s\n".format(database_path, len(found), seconds))
+        return success
+
     def del_entry(self):
-        db = self._open_database()
         entry_path = self.args.entry_path
-        entry = db.get_entry(entry_path)
+
+        def operation(db):
+            entry = db.get_entry(entry_path)
+            if entry:
+                entry.delete()
+            return entry
+
+        entry = self._modify_database(operation)
         if entry:
             self.out.write("Removing entry: {}\n".format(entry))
-            entry.delete()
-            db.save()
             self._update_cache()
             return entry
         sys.stderr.write("ERROR: entry not found: {}\n".format(entry_path))
         return None
 
+    def _write_binary(self, entry: File):
+        stream = getattr(self.out, "buffer", None)
+        if stream is None:
+            self.out.write(entry.contents.decode("utf-8", errors="replace"))
+            return
+        self.out.flush()
+        entry.write_to(stream)
+        stream.flush()
+
+    def _save_database(self, db):
+        if self.autosave:
+            self._apply_compression(db)
+            if db.save():
+                self._write_sidecar(db)
+
+    def _write_sidecar(self, db):
+        """Writes the sidecar index of the database file just saved from db when the key cache keeps the derived
+        key it is encrypted under, else removes the sidecar, which describes an older version."""
+        database_path = self._resolve_database_path()
+        if self._key_cache_ttl(database_path) and db.keeps_kdf_salt:
+            sidecar.write(database_path, db, db.transformed_key)
+        else:
+            sidecar.remove(database_path)
+
+    def _apply_compression(self, db):
+        if self.args.compression is not None:
+            db.set_compression_level(self.args.compression)
+
     def _update_cache(self):
+        """Stores the last database and its credentials. A database given to the App was opened by the agent or
+        the shell, which already stored the credentials it was unlocked with, so these are left alone."""
         database_path = self._resolve_database_path()
-        password = self.args.password or self._cache_get_database_entry(database_path, "password")
-        keyfile = self.args.keyfile or self._cache_get_database_entry(database_path, "keyfile")
-        self.cache.data["last_database"] = database_path
-        self.cache.data.setdefault("databases", {}).setdefault(database_path, {})["password"] = password
-        self.cache.data.setdefault("databases", {}).setdefault(database_path, {})["keyfile"] = keyfile
+        self.cache.set("last_database", database_path)
+        if not self.database:
+            password = self.args.password or self._cache_get_database_entry(database_path, "password")
+            keyfile = self.args.keyfile or self._cache_get_database_entry(database_path, "keyfile")
+            self.cache.set_database_entry(database_path, "password", password)
+            self.cache.set_database_entry(database_path, "keyfile", keyfile)
+        if self.args.key_cache_ttl is not None:
+            self.cache.set_database_entry(database_path, "key_cache_ttl", self.args.key_cache_ttl)
         self.cache.save()
 
     def _resolve_path(self, input_path):
-        if self.args.curdir:
-            return os.path.abspath(os.path.join(self.args.curdir, input_path))
-        return input_path
+        return paths.resolve_path(self.args, input_path)
+
+    def _resolve_credentials(self, database_path: str) -> tuple:
+        """(password, keyfile) of the database, prompting for the password when neither -p nor the cache has
+        one. Must be called before taking the database lock."""
+        password = self._resolve_password(database_path)
+        return password, self.args.keyfile or self._cache_get_database_entry(database_path, "keyfile")
 
     def _resolve_password(self, database_path: str):
         password = self.args.password or self._cache_get_database_entry(database_path, "password")
@@ -139,3 +634,50 @@ class App:
             self.args.password = typed_password
             return typed_password
         return password
+
+
+def _entry_text(entry, files: bool):
+    """The value of a KeyValue, or with files the contents of a File decoded as UTF-8; None for anything else."""
+    if isinstance(entry, KeyValue):
+        return entry.value or ""
+    if files and isinstance(entry, File):
+        try:
+            return entry.contents.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+    return None
+
+
+def parse_env_mapping(mapping: str):
+    """(NAME, path) of a NAME=path environment mapping."""
+    name, separator, entry_path = mapping.strip().partition("=")
+    if not separator or not name or not entry_path:
+        raise Exception("Invalid environment mapping, expected NAME=path: {}".format(mapping.strip()))
+    return name, entry_path
+
+
+def read_env_mappings(lines):
+    """Mappings of an env file: one NAME=path per line, blank lines and lines starting with # ignored."""
+    return [parse_env_mapping(line) for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+
+def _has_wildcards(path: str) -> bool:
+    return any(char in path for char in "*?[")
+
+
+def _expand_folders(entries):
+    for entry in entries:
+        yield entry
+        if isinstance(entry, Folder):
+            yield from entry.walk()
+
+
+def _entry_record(entry) -> dict:
+    if isinstance(entry, Folder):
+        entry_type, size = "directory", None
+    elif isinstance(entry, File):
+        entry_type, size = "file", entry.size
+    else:
+        entry_type, size = "value", None
+    mtime = entry.mtime
+    return {"path": entry.path, "type": entry_type, "size": size, "mtime": mtime.isoformat() if mtime else None}
@@ -1,33 +1,153 @@
 import argparse
 import sys
 
-from src.app import App
+from src import agent, paths, timings
 from src.cache import Cache
 
 
+SIZE_SUFFIXES = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(value: str) -> int:
+    suffix = value[-1:].upper()
+    if suffix in SIZE_SUFFIXES:
+        return int(value[:-1]) * SIZE_SUFFIXES[suffix]
+    return int(value)
+
+
+def parse_compression(value: str) -> int:
+    """none, gzip (level 6) or gzip-1 to gzip-9, as a gzip level where 0 means no compression."""
+    if value == "none":
+        return 0
+    if value == "gzip":
+        return 6
+    if value.startswith("gzip-") and value[5:] in [str(level) for level in range(1, 10)]:
+        return int(value[5:])
+    raise argparse.ArgumentTypeError("expected none, gzip or gzip-1 to gzip-9: {}".format(value))
+
+
+def add_kdf_arguments(command, iterations: bool = True):
+    command.add_argument("--kdf", choices=["argon2id", "argon2d", "aes"], help="key derivation function")
+    command.add_argument("--kdf-memory", type=parse_size, metavar="size", dest="kdf_memory",
+                         help="argon2 memory (suffixes K, M and G accepted)")
+    if iterations:
+        command.add_argument("--kdf-iterations", type=int, metavar="count", dest="kdf_iterations",
+                             help="argon2 iterations or AES rounds")
+    command.add_argument("--kdf-parallelism", type=int, metavar="lanes", dest="kdf_parallelism",
+                         help="argon2 lanes (default on create: number of CPUs)")
+
+
+def add_generate_arguments(command):
+    command.add_argument("-l", "--length", type=int, metavar="chars", dest="length",
+                         help="password length (default: 64)")
+    command.add_argument("-a", "--alphabet", default="printable", metavar="alphabet",
+                         help="printable, alphanumeric, hex, digits, or the characters to use (default: printable)")
+
+
 def create_arg_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument("-p", type=str, metavar="password", help="password for kdbx file", dest="password")
     parser.add_argument("-f", type=str, metavar="database", help="kdbx filename", dest="database_path")
     parser.add_argument("-k", type=str, metavar="keyfile", help="kdbx secret keyfile", dest="keyfile")
     parser.add_argument("--curdir", type=str)
+    parser.add_argument("--key-cache-ttl", type=int, metavar="seconds", dest="key_cache_ttl",
+                        help="cache the derived key in the runtime directory for seconds (0 disables)")
+    parser.add_argument("--timings", action="store_true",
+                        help="report the time spent in each phase (KDF, decryption, save, ...) on stderr")
+    parser.add_argument("--timings-format", choices=["text", "json"], default="text", dest="timings_format",
+                        help="format of the --timings report")
+    parser.add_argument("--profile", metavar="file", help="run under cProfile and write the stats to file")
+    parser.add_argument("--optimistic", action="store_true",
+                        help="do not hold the write lock while unlocking; reapply changes if another process saved "
+                             "(keeps the KDF salt on save, like --key-cache-ttl)")
+    parser.add_argument("--compression", type=parse_compression, metavar="none|gzip|gzip-N",
+                        help="payload compression when creating or saving the database (gzip is level 6); "
+                             "payloads made mostly of already compressed attachments are stored uncompressed")
     command_parser = parser.add_subparsers(dest="command", title="commands", required=True)
     create_command = command_parser.add_parser("create", help="create database")
+    add_kdf_arguments(create_command)
+    create_command.add_argument("--target-ms", type=float, metavar="ms", dest="target_ms",
+                                help="calibrate the KDF iterations to unlock in about ms on this machine")
+    rekdf_command = command_parser.add_parser("rekdf", help="re-encrypt database with new KDF parameters")
+    add_kdf_arguments(rekdf_command)
+    rekdf_command.add_argument("--target-ms", type=float, metavar="ms", dest="target_ms",
+                               help="calibrate the KDF iterations to unlock in about ms on this machine")
+    calibrate_command = command_parser.add_parser("calibrate", help="pick KDF parameters for an unlock latency")
+    calibrate_command.add_argument("--target-ms", type=float, metavar="ms", dest="target_ms", required=True,
+                                   help="unlock time to aim for on this machine")
+    add_kdf_arguments(calibrate_command, iterations=False)
     ls_command = command_parser.add_parser("ls", help="list entries")
-    ls_command.add_argument("source", help="source path")
+    ls_command.add_argument("source", nargs="?", default="/", help="source path, may contain * ? [] wildcards")
+    ls_command.add_argument("-R", action="store_true", dest="recursive", help="list subdirectories recursively")
+    ls_command.add_argument("--json", action="store_true", help="one JSON object per line: path, type, size, mtime")
     put_file_command = command_parser.add_parser("put-file", help="copy file into database")
-    put_file_command.add_argument("source", help="source file")
-    put_file_command.add_argument("destination", help="destination path")
+    put_file_command.add_argument("source", help="source file, or - to read from stdin")
+    put_file_command.add_argument("destination", help="destination path (file path when reading from stdin)")
+    put_file_command.add_argument("--max-size", type=parse_size, metavar="size", dest="max_size",
+                                  help="refuse files larger than size (suffixes K, M and G accepted)")
     get_file_command = command_parser.add_parser("get-file", help="copy file from database")
     get_file_command.add_argument("source", help="path to file")
     get_file_command.add_argument("-o", metavar="output_file", dest="output_file")
+    put_dir_command = command_parser.add_parser("put-dir", help="copy a local directory tree into database")
+    put_dir_command.add_argument("source", help="local directory")
+    put_dir_command.add_argument("destination", help="destination directory path")
+    put_dir_command.add_argument("-n", "--dry-run", action="store_true", dest="dry_run",
+                                 help="only show which files would be added or updated")
+    put_dir_command.add_argument("--max-size", type=parse_size, metavar="size", dest="max_size",
+                                 help="refuse files larger than size (suffixes K, M and G accepted)")
+    get_dir_command = command_parser.add_parser("get-dir", help="copy a database directory tree to a local directory")
+    get_dir_command.add_argument("source", help="source directory path")
+    get_dir_command.add_argument("destination", help="local directory")
+    get_dir_command.add_argument("-n", "--dry-run", action="store_true", dest="dry_run",
+                                 help="only show which files would be added or updated")
+    get_dir_command.add_argument("-j", type=int, metavar="jobs", dest="jobs", help="number of writer threads")
     set_command = command_parser.add_parser("set", help="set value to KeyValue")
     set_command.add_argument("entry_path", help="path to KeyValue")
-    set_command.add_argument("entry_value", help="new value for KeyValue")
+    set_command.add_argument("entry_value", nargs="?", help="new value for KeyValue")
+    set_command.add_argument("-g", "--generate", action="store_true", help="set a generated password as the value")
+    add_generate_arguments(set_command)
+    generate_command = command_parser.add_parser("generate", help="print random passwords")
+    generate_command.add_argument("-n", "--count", type=int, default=1, metavar="count", dest="count",
+                                  help="number of passwords (default: 1)")
+    add_generate_arguments(generate_command)
     get_command = command_parser.add_parser("get", help="get value from KeyValue")
     get_command.add_argument("entry_path", help="path to KeyValue")
+    exec_command = command_parser.add_parser("exec", help="run a command with KeyValues in its environment")
+    exec_command.add_argument("-e", "--env", action="append", metavar="NAME=path", dest="env",
+                              help="set variable NAME to the value of the KeyValue at path (repeatable)")
+    exec_command.add_argument("--env-file", action="append", metavar="file", dest="env_file",
+                              help="file with one NAME=path mapping per line (repeatable)")
+    exec_command.add_argument("exec_args", nargs=argparse.REMAINDER, metavar="-- command [args]",
+                              help="command to run in place of this process")
+    render_command = command_parser.add_parser("render", help="replace {{ path }} placeholders in a template")
+    render_command.add_argument("source", nargs="?", default="-", help="template file (default: stdin)")
+    render_command.add_argument("-o", metavar="output_file", dest="output_file",
+                                help="write to output_file, replaced only once fully rendered (default: stdout)")
     del_command = command_parser.add_parser("del", help="delete entry")
     del_command.add_argument("entry_path", help="entry path to delete")
+    command_parser.add_parser("gc", help="merge duplicated attachments and remove unreferenced binaries")
+    export_command = command_parser.add_parser("export", help="write entries as NDJSON, attachments in base64")
+    export_command.add_argument("source", nargs="?", default="/", help="directory to export (default: all)")
+    export_command.add_argument("-o", metavar="output_file", dest="output_file")
+    import_command = command_parser.add_parser("import", help="add or update entries from export NDJSON")
+    import_command.add_argument("source", nargs="?", default="-", help="NDJSON file (default: stdin)")
+    find_command = command_parser.add_parser("find", help="search entries in every known database")
+    find_command.add_argument("pattern", help="glob on the entry name (see -m)")
+    find_command.add_argument("-m", choices=["name", "path", "regex"], default="name", dest="match",
+                              help="match the pattern as a glob on the name or the full path, or as a regex")
+    find_command.add_argument("-d", action="append", metavar="database", dest="databases",
+                              help="search this database only (repeatable, default: all databases in the cache)")
+    find_command.add_argument("-j", type=int, metavar="jobs", dest="jobs", help="number of worker processes")
+    batch_command = command_parser.add_parser("batch", help="run many commands with a single unlock and save")
+    batch_command.add_argument("source", nargs="?", default="-", help="file with one command per line (default: stdin)")
+    batch_command.add_argument("-c", type=int, metavar="count", dest="checkpoint", default=0,
+                               help="save after every count changes (default: only at the end)")
+    command_parser.add_parser("shell", help="interactive shell on the database, unlocked once")
+    agent_command = command_parser.add_parser("agent", help="keep database unlocked in a background agent")
+    agent_command.add_argument("agent_action", choices=["start", "status", "lock", "stop"], help="agent action")
+    agent_command.add_argument("-t", type=int, metavar="seconds", dest="idle_timeout",
+                               help="stop agent after seconds without requests")
+    agent_command.add_argument("-d", action="store_true", dest="detach", help="run agent in background")
     return parser
 
 
@@ -38,26 +158,103 @@ def parse_args(args=None):
 
 def run(args=None):
     args = parse_args(args)
-    app = App(args, Cache(), sys.stdout)
-    if args.command == "create":
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(_run_timed, args)
+        finally:
+            profiler.dump_stats(args.profile)
+    return _run_timed(args)
+
+
+def _run_timed(args):
+    if not args.timings:
+        return _run(args)
+    with timings.Timings() as recorded:
+        code = _run(args)
+    sys.stdout.flush()
+    sys.stderr.write(recorded.format(args.timings_format))
+    return code
+
+
+def _run(args):
+    cache = Cache()
+    if agent.can_forward(args):
+        with timings.phase("agent"):
+            result = agent.forward(args, paths.resolve_database_path(args, cache), sys.stdout)
+        if result is not None:
+            return result
+    # loading the database modules imports pykeepass, lxml and construct: only pay for it when needed
+    from src.app import App
+
+    return execute(App(args, cache, sys.stdout), args.command)
+
+
+def execute(app, command: str):
+    if command == "create":
         if not app.create():
             return 1
-    elif args.command == "ls":
+    elif command == "rekdf":
+        if not app.rekdf():
+            return 1
+    elif command == "calibrate":
+        if not app.calibrate():
+            return 1
+    elif command == "ls":
         if not app.ls_entries():
             return 1
-    elif args.command == "put-file":
+    elif command == "put-file":
         app.put_file()
-    elif args.command == "get-file":
+    elif command == "get-file":
         if not app.get_file():
             return 1
-    elif args.command == "set":
-        app.set_entry()
-    elif args.command == "get":
+    elif command == "put-dir":
+        if not app.put_dir():
+            return 1
+    elif command == "get-dir":
+        if not app.get_dir():
+            return 1
+    elif command == "set":
+        if not app.set_entry():
+            return 1
+    elif command == "generate":
+        if not app.generate():
+            return 1
+    elif command == "get":
         if not app.get_entry():
             return 1
-    elif args.command == "del":
+    elif command == "exec":
+        if not app.exec_command():
+            return 1
+    elif command == "render":
+        if not app.render():
+            return 1
+    elif command == "del":
         if not app.del_entry():
             return 1
+    elif command == "gc":
+        if not app.gc():
+            return 1
+    elif command == "export":
+        if not app.export_entries():
+            return 1
+    elif command == "import":
+        if not app.import_entries():
+            return 1
+    elif command == "find":
+        if not app.find():
+            return 1
+    elif command == "batch":
+        if not app.batch():
+            return 1
+    elif command == "shell":
+        if not app.shell():
+            return 1
+    elif command == "agent":
+        if not app.agent():
+            return 1
     else:
         sys.stderr.write("ERROR: no command informed\n")
     return 0
@@ -0,0 +1,96 @@
+"""asyncio facade over src.database.
+
+The KDF, decryption and encryption run in an executor so they do not block the event loop, and independent
+databases open concurrently:
+
+    dbs = await asyncio.gather(*(open_database_async(name, password) for name in names))
+    folder = dbs[0].mk_dir("the_dir")
+    folder.set_value("name", "value")
+    await dbs[0].save_async()
+
+By default the loop's thread pool is used; argon2 and AES release the GIL, so KDFs run in parallel. With a
+ProcessPoolExecutor only the KDF runs in the pool, since a Database cannot move between processes: the derived
+key comes back and the file is decrypted in a thread. Index lookups (get_entry, cd_dir, mk_dir, ...) are cheap and
+stay synchronous; do not change a database while save_async runs.
+"""
+import asyncio
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from src import database
+
+ENTRIES_PER_YIELD = 100
+
+_executor: Executor = None
+
+
+def set_executor(executor: Executor):
+    """Sets the default executor of the facade; None uses the loop's default thread pool."""
+    global _executor
+    _executor = executor
+
+
+def get_executor() -> Executor:
+    return _executor
+
+
+def _run(executor: Executor, function, *args, **kwargs):
+    return asyncio.get_running_loop().run_in_executor(executor, functools.partial(function, *args, **kwargs))
+
+
+def _thread_executor(executor: Executor):
+    return None if isinstance(executor, ProcessPoolExecutor) else executor
+
+
+async def open_database_async(filename: str, password: str = None, keyfile: str = None, transformed_key: bytes = None,
+                              keep_kdf_salt: bool = False, executor: Executor = None) -> "AsyncDatabase":
+    executor = executor or _executor
+    if transformed_key is None and isinstance(executor, ProcessPoolExecutor):
+        transformed_key = await _run(executor, database.derive_key, filename, password, keyfile)
+    db = await _run(_thread_executor(executor), database.open_database, filename, password=password, keyfile=keyfile,
+                    transformed_key=transformed_key, keep_kdf_salt=keep_kdf_salt)
+    return AsyncDatabase(db, executor)
+
+
+class AsyncDatabase:
+    """Wraps an open Database, adding coroutine versions of its blocking operations."""
+
+    def __init__(self, db: database.Database, executor: Executor = None):
+        self.database = db
+        self._executor = _thread_executor(executor)
+        self._save_lock = asyncio.Lock()
+
+    @property
+    def is_dirty(self) -> bool:
+        return self.database.is_dirty
+
+    @property
+    def root_directory(self):
+        return self.database.root_directory
+
+    def mk_dir(self, target_path: str):
+        return self.database.mk_dir(target_path)
+
+    def cd_dir(self, target_path: str):
+        return self.database.cd_dir(target_path)
+
+    def get_entry(self, entry_path: str):
+        return self.database.get_entry(entry_path)
+
+    async def save_async(self, force: bool = False) -> bool:
+        async with self._save_lock:
+            return await _run(self._executor, self.database.save, force)
+
+    async def gc_async(self):
+        return await _run(self._executor, self.database.gc)
+
+    async def entries(self, folder):
+        """Iterates folder.entries(), yielding to the event loop every ENTRIES_PER_YIELD entries."""
+        if isinstance(folder, str):
+            folder = self.database.cd_dir(folder)
+        if folder is None:
+            return
+        for number, entry in enumerate(folder.entries(), start=1):
+            yield entry
+            if number % ENTRIES_PER_YIELD == 0:
+                await asyncio.sleep(0)
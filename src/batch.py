@@ -0,0 +1,89 @@
+import contextlib
+import io
+import json
+import shlex
+
+BATCH_COMMANDS = {"ls", "get", "get-file", "set", "put-file", "del", "gc", "put-dir", "get-dir"}
+MUTATING_COMMANDS = {"set", "put-file", "del", "gc", "put-dir"}
+GLOBAL_ARGS = ("password", "database_path", "keyfile", "curdir")
+DATABASE_OPTIONS = {"database_path": "-f", "password": "-p", "keyfile": "-k"}
+
+
+def parse_line(line: str):
+    """Returns the command line arguments of a batch line, either shell-like words or a JSON array/object."""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("[") or line.startswith("{"):
+        value = json.loads(line)
+        argv = value.get("args") if isinstance(value, dict) else value
+        if not isinstance(argv, list):
+            raise Exception("JSON batch line must be an array or an object with 'args'")
+        return [str(arg) for arg in argv]
+    return shlex.split(line)
+
+
+class BatchRunner:
+    """Runs App commands against one open Database, saving at checkpoints and at the end."""
+
+    def __init__(self, db, cache, base_args, out, checkpoint: int = 0, after_save=None):
+        self.db = db
+        self.cache = cache
+        self.base_args = base_args
+        self.out = out
+        self.checkpoint = checkpoint or 0
+        self.pending_changes = 0
+        self.after_save = after_save
+
+    def run(self, lines) -> bool:
+        success = True
+        for line_number, line in enumerate(lines, start=1):
+            result = self.run_line(line_number, line)
+            if result is None:
+                continue
+            success = success and result["code"] == 0
+            self.out.write(json.dumps(result) + "\n")
+            self.out.flush()
+        self.save()
+        return success
+
+    def run_line(self, line_number: int, line: str):
+        from src import app_launcher
+        from src.app import App
+
+        out = io.StringIO()
+        err = io.StringIO()
+        command = None
+        with contextlib.redirect_stderr(err):
+            try:
+                argv = parse_line(line)
+                if argv is None:
+                    return None
+                args = app_launcher.parse_args(argv)
+                command = args.command
+                if command not in BATCH_COMMANDS:
+                    raise Exception("command not allowed in batch: {}".format(command))
+                if command == "put-file" and args.source == "-":
+                    raise Exception("put-file from stdin not allowed in batch")
+                for name, option in DATABASE_OPTIONS.items():
+                    if getattr(args, name) is not None:
+                        raise Exception("option not allowed in batch line: {}".format(option))
+                for name in GLOBAL_ARGS:
+                    if getattr(args, name) is None:
+                        setattr(args, name, getattr(self.base_args, name))
+                code = app_launcher.execute(App(args, self.cache, out, database=self.db, autosave=False), command)
+            except SystemExit as ex:
+                code = ex.code if isinstance(ex.code, int) else 2
+            except Exception as ex:
+                err.write("ERROR: {}\n".format(ex))
+                code = 1
+        if code == 0 and command in MUTATING_COMMANDS:
+            self.pending_changes += 1
+            if self.checkpoint and self.pending_changes >= self.checkpoint:
+                self.save()
+        return {"line": line_number, "command": command, "code": code, "out": out.getvalue(), "err": err.getvalue()}
+
+    def save(self):
+        if self.db.save() and self.after_save:
+            self.after_save(self.db)
+        self.pending_changes = 0
@@ -1,25 +1,34 @@
 import json
 import os
 import sys
+import tempfile
 
-from src import config
+from src import config, timings
+
+
+def get_runtime_dir():
+    if os.environ.__contains__("XDG_RUNTIME_DIR"):
+        return os.environ["XDG_RUNTIME_DIR"]
+    if os.getuid():
+        directory = "/run/user/{}".format(os.getuid())
+        if os.path.exists(directory):
+            return directory
+    return None
 
 
 class Cache:
-    def __init__(self):
+    """Small JSON state file, loaded on first access and written back only when a setter changed it."""
+
+    def __init__(self, file_name: str = None):
         self._data: dict = None
-        self._file_name = self._get_cache_file_name()
-        self._data_hash = None
-        self._mark_not_changed()
+        self._file_name = file_name or self._get_cache_file_name()
+        self._dirty = False
 
     @staticmethod
     def _get_cache_file_name():
-        if os.environ.__contains__("XDG_RUNTIME_DIR"):
-            return "{}/{}".format(os.environ["XDG_RUNTIME_DIR"], config.CONFIG["cache_file_name"])
-        if os.getuid():
-            directory = "/run/user/{}".format(os.getuid())
-            if os.path.exists(directory):
-                return directory
+        directory = get_runtime_dir()
+        if directory:
+            return os.path.join(directory, config.CONFIG["cache_file_name"])
         return None
 
     def _load(self):
@@ -27,33 +36,60 @@ class Cache:
             try:
                 with open(self._file_name, "r") as f:
                     self._data = json.load(f)
-                    self._mark_not_changed()
             except Exception as ex:
                 sys.stderr.write("WARN: failed to load state file [{}]: {}\n".format(self._file_name, ex.__str__()))
 
     def save(self):
-        if self._file_name and self._is_changed():
-            with open(self._file_name, "w") as f:
-                try:
-                    json.dump(self._data, f)
-                    self._mark_not_changed()
-                except Exception as ex:
-                    sys.stderr.write("WARN: failed to save state file [{}]: {}\n".format(self._file_name, ex.__str__()))
+        if not self._file_name or not self._dirty:
+            return
+        with timings.phase("cache save"):
+            self._write()
+
+    def _write(self):
+        directory = os.path.dirname(self._file_name) or "."
+        try:
+            fd, temp_name = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self._data, f, separators=(",", ":"))
+                os.replace(temp_name, self._file_name)
+            except BaseException:
+                os.unlink(temp_name)
+                raise
+            self._dirty = False
+        except Exception as ex:
+            sys.stderr.write("WARN: failed to save state file [{}]: {}\n".format(self._file_name, ex.__str__()))
 
     @property
     def data(self) -> dict:
         if self._data is None:
             self._data = {}
-            self._load()
+            with timings.phase("cache load"):
+                self._load()
         return self._data
 
-    def _calculate_hash_of_data(self):
-        if self._data:
-            return json.dumps(self._data).__hash__()
-        return "".__hash__()
+    @property
+    def is_dirty(self) -> bool:
+        return self._dirty
+
+    def reload(self):
+        """Drops the loaded data, unsaved changes included, so the next access reads the file again."""
+        self._data = None
+        self._dirty = False
+
+    def get(self, key: str, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key: str, value):
+        if key not in self.data or self.data[key] != value:
+            self.data[key] = value
+            self._dirty = True
 
-    def _is_changed(self):
-        return self._data_hash != self._calculate_hash_of_data()
+    def get_database_entry(self, database_path: str, entry_name: str, default=None):
+        return self.data.get("databases", {}).get(database_path, {}).get(entry_name, default)
 
-    def _mark_not_changed(self):
-        self._data_hash = self._calculate_hash_of_data()
+    def set_database_entry(self, database_path: str, entry_name: str, value):
+        entries = self.data.setdefault("databases", {}).setdefault(database_path, {})
+        if entry_name not in entries or entries[entry_name] != value:
+            entries[entry_name] = value
+            self._dirty = True
@@ -0,0 +1,86 @@
+"""Payload compression of saved databases.
+
+KDBX gzips the whole payload, attachments included, at a level pykeepass fixes to 6. While a Database.save is
+in progress, the encoder of pykeepass is replaced by one that takes the level of the save, stores the payload
+without compressing it (deflate level 0) when it is made mostly of attachments that do not compress, and counts
+the bytes and time spent; the original encoder is restored when the last save ends. KDBX 3 databases compress
+every binary on its own, so incompressible ones are just stored uncompressed.
+"""
+import contextlib
+import threading
+import time
+import zlib
+
+from pykeepass.kdbx_parsing.common import Decompressed
+
+from src import timings
+
+DEFAULT_LEVEL = 6
+SAMPLE_SIZE = 1 << 16
+INCOMPRESSIBLE_RATIO = 0.95
+STORE_THRESHOLD = 0.9
+
+_state = threading.local()
+_original_encode = Decompressed._encode
+_lock = threading.Lock()
+_saves = 0
+
+
+def describe(level: int) -> str:
+    return "gzip-{}".format(level) if level else "none"
+
+
+def is_incompressible(view) -> bool:
+    """Whether the contents look already compressed (archives, images, ...), judged from a sample."""
+    sample = bytes(view[:SAMPLE_SIZE])
+    if len(sample) < 512:
+        return False
+    return len(zlib.compress(sample, 1)) >= len(sample) * INCOMPRESSIBLE_RATIO
+
+
+@contextlib.contextmanager
+def saving(level: int, incompressible_bytes: int = 0):
+    """Applies level to the payload compressed in the block, yielding a dict filled with the compression
+    input_bytes, output_bytes, seconds and the level used. The pykeepass encoder is patched only while a block
+    is running, in any thread."""
+    global _saves
+    stats = {"level": level, "input_bytes": 0, "output_bytes": 0, "seconds": 0.0}
+    previous = dict(vars(_state))
+    _state.level = level
+    _state.incompressible_bytes = incompressible_bytes
+    _state.stats = stats
+    with _lock:
+        if not _saves:
+            Decompressed._encode = _encode
+        _saves += 1
+    try:
+        yield stats
+    finally:
+        with _lock:
+            _saves -= 1
+            if not _saves:
+                Decompressed._encode = _original_encode
+        vars(_state).clear()
+        vars(_state).update(previous)
+
+
+def _encode(self, data, con, path):
+    if not hasattr(_state, "level"):
+        # another thread is saving: this PyKeePass did not ask for a level
+        return _original_encode(self, data, con, path)
+    level = _state.level
+    if data and _state.incompressible_bytes >= len(data) * STORE_THRESHOLD:
+        level = 0
+    started = time.perf_counter()
+    with timings.phase("compress"):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + 15, zlib.DEF_MEM_LEVEL, 0)
+        result = compressor.compress(data) + compressor.flush()
+    stats = _state.stats
+    if stats is not None:
+        stats["level"] = level
+        stats["input_bytes"] += len(data)
+        stats["output_bytes"] += len(result)
+        stats["seconds"] += time.perf_counter() - started
+    timings.count("compress in bytes", len(data))
+    timings.count("compress out bytes", len(result))
+    return result
@@ -1,6 +1,13 @@
 _APP_NAME = "py_kdbx"
 CONFIG = {
     "generate_password_size": 64,
+    "generate_password_alphabet": "printable",
     "cache_file_name": f"cache_{_APP_NAME}.json",
-    "curdir": None
+    "curdir": None,
+    "agent_socket_name": f"{_APP_NAME}_agent_{{}}.sock",
+    "agent_idle_timeout": 900,
+    "key_cache_file_name": f"{_APP_NAME}_key_{{}}.json",
+    "kdf_argon2_memory": 64 << 20,
+    "kdf_argon2_iterations": 10,
+    "kdf_aes_rounds": 600000
 }
@@ -1,27 +1,401 @@
+import fnmatch
+import hashlib
+import io
 import os.path
+import stat
 import sys
+import tempfile
 
 import pykeepass
+from construct import Container
 from pykeepass import PyKeePass
 from pykeepass.attachment import Attachment
+from pykeepass.exceptions import CredentialsError
 from pykeepass.entry import Entry
 from pykeepass.group import Group
+from pykeepass.kdbx_parsing import KDBX, kdbx3, kdbx4
+from pykeepass.kdbx_parsing.common import compute_key_composite
+
+from src import compression, kdf, timings
+
+
+BINARY_CHUNK_SIZE = 1 << 20
+
+
+def read_binary(stream, max_size: int = None) -> bytearray:
+    """Reads a binary stream into a single buffer with readinto, without intermediate copies.
+
+    The first byte of the returned buffer is reserved for the KDBX4 binary flag."""
+    try:
+        file_stat = os.fstat(stream.fileno())
+        size = file_stat.st_size if stat.S_ISREG(file_stat.st_mode) else 0
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        size = 0
+    if max_size is not None and size > max_size:
+        raise Exception("File exceeds the maximum size of {} bytes: {} bytes".format(max_size, size))
+    buffer = bytearray(1 + (size or BINARY_CHUNK_SIZE))
+    length = 1
+    while True:
+        if length == len(buffer):
+            buffer.extend(bytes(BINARY_CHUNK_SIZE if size else len(buffer)))
+        read = stream.readinto(memoryview(buffer)[length:])
+        if not read:
+            break
+        length += read
+        if max_size is not None and length - 1 > max_size:
+            raise Exception("File exceeds the maximum size of {} bytes".format(max_size))
+    del buffer[length:]
+    return buffer
+
+
+def _binary_view(kdb: PyKeePass, binary_id: int) -> memoryview:
+    if kdb.version >= (4, 0):
+        return memoryview(kdb.payload.inner_header.binary[binary_id].data)[1:]
+    return memoryview(kdb.binaries[binary_id])
+
+
+def _add_binary(kdb: PyKeePass, buffer: bytearray) -> int:
+    """Adds a binary read by read_binary, storing the buffer itself for KDBX4 databases."""
+    if kdb.version >= (4, 0):
+        buffer[0] = 1
+        kdb.payload.inner_header.binary.append(Container(type="binary", data=buffer))
+        return len(kdb.payload.inner_header.binary) - 1
+    contents = bytes(memoryview(buffer)[1:])
+    return kdb.add_binary(contents, compressed=not compression.is_incompressible(contents))
+
+
+def to_binary_buffer(contents) -> bytearray:
+    """Copies contents into a buffer laid out like the ones read_binary returns."""
+    buffer = bytearray(1 + len(contents))
+    buffer[1:] = contents
+    return buffer
+
+
+def _binary_views(kdb: PyKeePass):
+    if kdb.version >= (4, 0):
+        return [memoryview(binary.data)[1:] for binary in kdb.payload.inner_header.binary]
+    return [memoryview(binary) for binary in kdb.binaries]
+
+
+def _fsync_directory(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _join_path(directory: str, name: str) -> str:
+    return "{}/{}".format(directory, name) if directory else name
+
+
+def _fold_path(path: str) -> str:
+    directory, _, name = path.rpartition("/")
+    return _join_path(directory, name.lower())
+
+
+def _key_value_name(entry: Entry) -> str:
+    if entry.username:
+        return "{}({})".format(entry.title, entry.username)
+    return entry.title
+
+
+def _is_key_value(entry: Entry, attachments) -> bool:
+    return bool(entry.username or entry.password or not attachments)
+
+
+def _entry_fields(element) -> dict:
+    """The String fields of an entry element by key, read in one pass instead of one XPath query per field."""
+    fields = {}
+    for string in element.iterchildren("String"):
+        key = value = None
+        for child in string:
+            if child.tag == "Key":
+                key = child.text
+            elif child.tag == "Value":
+                value = child.text
+        fields[key] = value
+    return fields
+
+
+def _fields_name(fields: dict) -> str:
+    """The KeyValue name of an entry from its fields, as _key_value_name does from the Entry."""
+    title, username = fields.get("Title"), fields.get("UserName")
+    return "{}({})".format(title, username) if username else title
+
+
+def _fields_are_key_value(fields: dict, binaries) -> bool:
+    return bool(fields.get("UserName") or fields.get("Password") or not binaries)
+
+
+class PathIndex:
+    """Maps normalized paths to the groups, KeyValue entries and File attachments of a database.
+
+    Groups are indexed when the database is opened, the entries of a group on the first lookup in it, so opening
+    a large database to read one value does not index every entry."""
+
+    def __init__(self, kdb: PyKeePass):
+        self.groups = {}
+        self.values = {}
+        self.files = {}
+        self._folded = {}
+        self._unindexed = {}
+        self._kdb = kdb
+        self._add_group_tree("", kdb.root_group)
+
+    def find(self, path: str):
+        """Returns a (kind, item) tuple for the path, matching the last path part case-insensitively."""
+        self._index_entries(path.rpartition("/")[0])
+        for exact_path in (path, self._folded.get(_fold_path(path))):
+            if exact_path is None:
+                continue
+            if exact_path in self.groups:
+                return "group", self.groups[exact_path]
+            if exact_path in self.values:
+                return "value", self.values[exact_path]
+            if exact_path in self.files:
+                return "file", self.files[exact_path]
+        return None, None
+
+    def add_group(self, path: str, group: Group):
+        self.groups.setdefault(path, group)
+        self._folded.setdefault(_fold_path(path), path)
+
+    def get_value(self, path: str):
+        self._index_entries(path.rpartition("/")[0])
+        return self.values.get(path)
+
+    def get_file(self, path: str):
+        self._index_entries(path.rpartition("/")[0])
+        return self.files.get(path)
+
+    def value_items(self):
+        """(path, entry) of every KeyValue, indexing the entries of all groups first."""
+        for path in list(self._unindexed):
+            self._index_entries(path)
+        return self.values.items()
+
+    def add_value(self, path: str, entry: Entry):
+        self._index_entries(path.rpartition("/")[0])
+        self.values.setdefault(path, entry)
+        self._folded.setdefault(_fold_path(path), path)
+
+    def add_file(self, path: str, entry: Entry, attachment: Attachment):
+        self._index_entries(path.rpartition("/")[0])
+        self.files.setdefault(path, (entry, attachment))
+        self._folded.setdefault(_fold_path(path), path)
+
+    def remove_value(self, path: str):
+        self._index_entries(path.rpartition("/")[0])
+        self.values.pop(path, None)
+        self._unfold(path)
+
+    def remove_entry(self, directory: str, entry: Entry):
+        """Removes the KeyValue and every File indexed for a deleted entry."""
+        self._index_entries(directory)
+        value_path = _join_path(directory, _key_value_name(entry))
+        if value_path in self.values and self.values[value_path]._element is entry._element:
+            self.remove_value(value_path)
+        for element in entry._element.findall("Binary"):
+            file_path = _join_path(directory, element.find("Key").text)
+            if file_path in self.files and self.files[file_path][0]._element is entry._element:
+                self.remove_file(file_path)
+
+    def remove_file(self, path: str):
+        self._index_entries(path.rpartition("/")[0])
+        self.files.pop(path, None)
+        self._unfold(path)
+
+    def remove_group(self, path: str):
+        prefix = path + "/"
+        for items in (self.groups, self.values, self.files):
+            for item_path in [p for p in items if p.startswith(prefix)]:
+                del items[item_path]
+        for folded_path in [p for p, exact in self._folded.items() if exact.startswith(prefix)]:
+            del self._folded[folded_path]
+        for group_path in [p for p in self._unindexed if p.startswith(prefix)]:
+            del self._unindexed[group_path]
+        self._unindexed.pop(path, None)
+        self.groups.pop(path, None)
+        self._unfold(path)
+
+    def _unfold(self, path: str):
+        if path in self.groups or path in self.values or path in self.files:
+            return
+        folded_path = _fold_path(path)
+        if self._folded.get(folded_path) == path:
+            del self._folded[folded_path]
+
+    def _add_group_tree(self, path: str, group: Group):
+        """Indexes group and the groups below it, leaving their entries for _index_entries. Reads the lxml
+        elements directly: the pykeepass properties (subgroups, entries, title, ...) run an XPath query on every
+        access."""
+        self.add_group(path, group)
+        self._unindexed.setdefault(path, []).append(group)
+        for child in group._element.iterchildren("Group"):
+            self._add_group_tree(_join_path(path, child.findtext("Name")), Group(element=child, kp=self._kdb))
+
+    def _index_entries(self, path: str):
+        """Indexes the KeyValues and Files of the groups at path, if not done yet."""
+        for group in self._unindexed.pop(path, ()):
+            for child in group._element.iterchildren("Entry"):
+                entry = Entry(element=child, kp=self._kdb)
+                fields = _entry_fields(child)
+                binaries = child.findall("Binary")
+                if _fields_are_key_value(fields, binaries):
+                    self.add_value(_join_path(path, _fields_name(fields)), entry)
+                for binary in binaries:
+                    self.add_file(_join_path(path, binary.findtext("Key")), entry,
+                                  Attachment(element=binary, kp=self._kdb))
+
+
+def _shift_id(binary_id: int, deleted_id: int) -> int:
+    return binary_id - 1 if binary_id > deleted_id else binary_id
+
+
+class BinaryStore:
+    """Content-addressed view of the database binaries: identical contents share one reference-counted binary."""
+
+    def __init__(self, kdb: PyKeePass):
+        self._kdb = kdb
+        self._ids = None
+        self._hashes = None
+        self._references = None
+        self._incompressible = {}
+        self.deduplicated_bytes = 0
+
+    def acquire(self, buffer: bytearray) -> int:
+        """Returns the id of a binary with the contents of a read_binary buffer, adding it only when new."""
+        self.load()
+        digest = hashlib.sha256(memoryview(buffer)[1:]).digest()
+        binary_id = self._ids.get(digest)
+        if binary_id is None:
+            binary_id = _add_binary(self._kdb, buffer)
+            self._incompressible.pop(binary_id, None)
+            self._ids[digest] = binary_id
+            self._hashes[binary_id] = digest
+            self._references[binary_id] = 0
+        else:
+            self.deduplicated_bytes += len(buffer) - 1
+        self._references[binary_id] += 1
+        return binary_id
+
+    def digest(self, binary_id: int) -> bytes:
+        """sha256 digest of the contents of a binary."""
+        self.load()
+        return self._hashes[binary_id]
+
+    def incompressible_bytes(self) -> int:
+        """Size of the KDBX4 binaries whose contents do not compress. Each binary is sampled once and the result
+        kept by binary id, so saving again does not hash or sample the unchanged ones."""
+        if self._kdb.version < (4, 0):
+            return 0
+        total = 0
+        for binary_id, view in enumerate(_binary_views(self._kdb)):
+            incompressible = self._incompressible.get(binary_id)
+            if incompressible is None:
+                incompressible = self._incompressible[binary_id] = compression.is_incompressible(view)
+            if incompressible:
+                total += len(view)
+        return total
+
+    def release(self, binary_id: int):
+        self.load()
+        self._references[binary_id] -= 1
+        if self._references[binary_id] <= 0:
+            self._delete(binary_id)
+
+    def release_all(self, element):
+        """Releases the binaries referenced by the entries of an element about to be deleted, history included."""
+        self.load()
+        references = [int(value.get("Ref")) for value in element.iterfind(".//Binary/Value")]
+        for binary_id in sorted(references, reverse=True):
+            self.release(binary_id)
+
+    def gc(self):
+        """Points attachments of duplicated binaries to a single copy and deletes unreferenced binaries.
+
+        Returns the number of binaries removed and their size in bytes."""
+        self.load()
+        for value in self._kdb.tree.iterfind(".//Entry/Binary/Value"):
+            binary_id = int(value.get("Ref"))
+            canonical_id = self._ids.get(self._hashes.get(binary_id), binary_id)
+            if canonical_id != binary_id:
+                value.set("Ref", str(canonical_id))
+                self._references[binary_id] -= 1
+                self._references[canonical_id] += 1
+        views = _binary_views(self._kdb)
+        unreferenced = sorted((i for i, count in self._references.items() if count <= 0), reverse=True)
+        removed_bytes = sum(len(views[i]) for i in unreferenced)
+        del views
+        for binary_id in unreferenced:
+            self._delete(binary_id)
+        return len(unreferenced), removed_bytes
+
+    def load(self):
+        if self._references is not None:
+            return
+        views = _binary_views(self._kdb)
+        self._references = {binary_id: 0 for binary_id in range(len(views))}
+        for value in self._kdb.tree.iterfind(".//Entry/Binary/Value"):
+            binary_id = int(value.get("Ref"))
+            self._references[binary_id] = self._references.get(binary_id, 0) + 1
+        self._hashes = {binary_id: hashlib.sha256(view).digest() for binary_id, view in enumerate(views)}
+        self._ids = {}
+        for binary_id, digest in self._hashes.items():
+            self._ids.setdefault(digest, binary_id)
+
+    def _delete(self, binary_id: int):
+        self._kdb.delete_binary(binary_id)
+        digest = self._hashes.pop(binary_id)
+        del self._references[binary_id]
+        if self._ids.get(digest) == binary_id:
+            del self._ids[digest]
+        self._references = {_shift_id(i, binary_id): count for i, count in self._references.items()}
+        self._incompressible = {_shift_id(i, binary_id): value for i, value in self._incompressible.items()
+                                if i != binary_id}
+        self._hashes = {_shift_id(i, binary_id): digest for i, digest in self._hashes.items()}
+        self._ids = {digest: _shift_id(i, binary_id) for digest, i in self._ids.items()}
+        for i, digest in self._hashes.items():
+            self._ids.setdefault(digest, i)
 
 
 class DatabaseEntry:
+    __slots__ = ("_path",)
+
     @property
     def name(self) -> str:
         pass
 
+    @property
+    def path(self) -> str:
+        """Path of the entry from the database root, without a leading slash."""
+        return self._path
+
+    @property
+    def mtime(self):
+        pass
+
     def delete(self):
         pass
 
 
 class KeyValue(DatabaseEntry):
-    def __init__(self, kdb: PyKeePass, entry: Entry, use_full_name: bool = True):
+    __slots__ = ("_kdb", "_entry", "_use_full_name", "_database", "_name")
+
+    def __init__(self, kdb: PyKeePass, entry: Entry, database: "Database", use_full_name: bool = True,
+                 path: str = None):
         self._kdb = kdb
         self._entry = entry
         self._use_full_name = use_full_name
+        self._database = database
+        self._path = path
+        self._name = None
 
     def __str__(self):
         return "KeyValue(name={})".format(self.name)
@@ -31,10 +405,26 @@ class KeyValue(DatabaseEntry):
 
     @property
     def name(self) -> str:
-        if self._use_full_name and self._entry.username:
-            return "{}({})".format(self._entry.title, self._entry.username)
-        else:
-            return self._entry.title
+        if self._name is None:
+            self._name = _key_value_name(self._entry) if self._use_full_name else self._entry.title
+        return self._name
+
+    @property
+    def mtime(self):
+        return self._entry.mtime
+
+    @mtime.setter
+    def mtime(self, value):
+        self._entry.mtime = value
+        self._database._mark_dirty()
+
+    @property
+    def title(self) -> str:
+        return self._entry.title
+
+    @property
+    def username(self) -> str:
+        return self._entry.username
 
     @property
     def value(self):
@@ -42,17 +432,33 @@ class KeyValue(DatabaseEntry):
 
     @value.setter
     def value(self, input_value):
-        self._entry.password = input_value
+        old_value = self._entry.password
+        if old_value != input_value:
+            self._entry.password = input_value
+            if bool(old_value) != bool(input_value):
+                self._database._forget(self._entry._element)
+            self._database._mark_dirty()
 
     def delete(self):
+        if self._path is not None:
+            self._database._index.remove_entry(self._path.rpartition("/")[0], self._entry)
+        self._database._binaries.release_all(self._entry._element)
+        self._database._forget(self._entry._element)
         self._entry.delete()
+        self._database._mark_dirty()
 
 
 class File(DatabaseEntry):
-    def __init__(self, kdb: PyKeePass, entry: Entry, attachment: Attachment):
+    __slots__ = ("_kdb", "_entry", "_attachment", "_database", "_filename")
+
+    def __init__(self, kdb: PyKeePass, entry: Entry, attachment: Attachment, database: "Database",
+                 path: str = None):
         self._kdb = kdb
         self._entry = entry
         self._attachment = attachment
+        self._database = database
+        self._path = path
+        self._filename = None
 
     @property
     def name(self):
@@ -60,140 +466,442 @@ class File(DatabaseEntry):
 
     @property
     def filename(self) -> str:
-        return self._attachment.filename
+        if self._filename is None:
+            self._filename = self._attachment.filename
+        return self._filename
+
+    @property
+    def mtime(self):
+        return self._entry.mtime
+
+    @mtime.setter
+    def mtime(self, value):
+        self._entry.mtime = value
+        self._database._mark_dirty()
 
     @property
     def contents(self):
-        return self._attachment.binary
+        return bytes(self.contents_view)
 
     @contents.setter
     def contents(self, value):
-        self._kdb.delete_binary(self._attachment.id)
-        self._attachment.id = self._kdb.add_binary(value)
+        self.set_contents_buffer(to_binary_buffer(value))
+
+    @property
+    def contents_view(self) -> memoryview:
+        """Zero-copy view of the attachment contents."""
+        return _binary_view(self._kdb, self._attachment.id)
+
+    @property
+    def size(self) -> int:
+        return len(self.contents_view)
+
+    @property
+    def digest(self) -> bytes:
+        """sha256 digest of the contents, computed once per binary."""
+        return self._database._binaries.digest(self._attachment.id)
+
+    def set_contents_buffer(self, buffer: bytearray):
+        binaries = self._database._binaries
+        old_id = self._attachment.id
+        new_id = binaries.acquire(buffer)
+        if new_id != old_id:
+            self._attachment.id = new_id
+            self._database._mark_dirty()
+        binaries.release(old_id)
+
+    def write_to(self, stream):
+        view = self.contents_view
+        for offset in range(0, len(view), BINARY_CHUNK_SIZE):
+            stream.write(view[offset:offset + BINARY_CHUNK_SIZE])
 
     def delete(self):
+        binaries = self._database._binaries
+        binaries.load()
         bin_id = self._attachment.id
+        self._database._forget(self._entry._element)
         self._attachment.delete()
-        self._kdb.delete_binary(bin_id)
+        binaries.release(bin_id)
+        if self._path is not None:
+            self._database._index.remove_file(self._path)
         if not (self._entry.attachments or self._entry.password):
+            if self._path is not None:
+                self._database._index.remove_entry(self._path.rpartition("/")[0], self._entry)
+            binaries.release_all(self._entry._element)
             self._entry.delete()
+        self._database._mark_dirty()
 
     def __str__(self):
-        return "File(filename={})".format(self._attachment.filename)
+        return "File(filename={})".format(self.filename)
 
     def __repr__(self):
         return self.__str__()
 
 
 class Folder(DatabaseEntry):
-    def __init__(self, kdb: PyKeePass, kdb_group: Group):
+    __slots__ = ("_kdb", "_kdb_group", "_database", "_index", "_name")
+
+    def __init__(self, kdb: PyKeePass, kdb_group: Group, database: "Database", path: str = None):
         self._kdb = kdb
         self._kdb_group = kdb_group
+        self._database = database
+        self._index = self._database._index
+        self._path = path if path is not None else "/".join(kdb_group.path)
+        self._name = None
 
     @property
     def name(self) -> str:
-        return "/" if self._kdb_group.is_root_group else self._kdb_group.name
+        if self._name is None:
+            self._name = "/" if self._kdb_group.is_root_group else self._kdb_group.name
+        return self._name
 
-    def set_value(self, name: str, value: str):
+    @property
+    def mtime(self):
+        return self._kdb_group.mtime
+
+    @mtime.setter
+    def mtime(self, value):
+        self._kdb_group.mtime = value
+        self._database._mark_dirty()
+
+    def set_value(self, name: str, value: str, username: str = ""):
+        """Sets the value of the KeyValue name, or of name(username) when a username is given."""
         if not name:
             raise Exception("Invalid name for entry")
-        for item in self.entries():
-            if isinstance(item, KeyValue) and item.name == name:
-                item.value = value
-                return
-        entry = self._kdb.add_entry(self._kdb_group, title=name, username="", password=value)
-        return KeyValue(self._kdb, entry)
+        item = self.get_value("{}({})".format(name, username) if username else name)
+        if item:
+            item.value = value
+            return item
+        entry = self._add_entry(name, username, value)
+        self._index.add_value(_join_path(self._path, _key_value_name(entry)), entry)
+        self._database._mark_dirty()
+        return self._database._key_value(entry, self._path)
 
     def get_value(self, name: str):
-        for item in self.entries():
-            if isinstance(item, KeyValue) and item.name == name:
-                return item
+        entry = self._index.get_value(_join_path(self._path, name))
+        if entry is not None:
+            return self._database._key_value(entry, self._path)
         return None
 
     def entries(self):
-        for item in self._kdb_group.subgroups:
-            yield Folder(self._kdb, item)
-        for item in self._kdb_group.entries:
-            if item.username or item.password or not item.attachments:
-                yield KeyValue(self._kdb, item)
-            if item.attachments:
-                for attachment in item.attachments:
-                    yield File(self._kdb, item, attachment)
+        """Yields the subfolders, then the KeyValue and File handles of every entry. Handles are cached per
+        element by the Database, so iterating again reuses them."""
+        database = self._database
+        element = self._kdb_group._element
+        for group_element in element.iterchildren("Group"):
+            yield database._folder(group_element, self._path)
+        for entry_element in element.iterchildren("Entry"):
+            yield from database._entry_handles(entry_element, self._path)
+
+    def walk(self):
+        """Yields every entry below this folder, depth first, each folder before its contents."""
+        for entry in self.entries():
+            yield entry
+            if isinstance(entry, Folder):
+                yield from entry.walk()
+
+    def glob(self, parts):
+        """Yields the entries below this folder whose path parts match the shell patterns in parts."""
+        part, rest = parts[0], parts[1:]
+        for entry in self.entries():
+            if fnmatch.fnmatchcase(entry.name, part):
+                if not rest:
+                    yield entry
+                elif isinstance(entry, Folder):
+                    yield from entry.glob(rest)
 
     def put_file(self, filename: str, contents: bytes):
+        return self.put_buffer(filename, to_binary_buffer(contents))
+
+    def put_stream(self, filename: str, stream, max_size: int = None):
+        return self.put_buffer(filename, read_binary(stream, max_size))
+
+    def put_buffer(self, filename: str, buffer: bytearray):
+        """Stores a buffer returned by read_binary as the contents of filename."""
         if not filename:
             raise Exception("Invalid filename")
-        for entry in self.entries():
-            if isinstance(entry, File) and entry.filename == filename:
-                entry.contents = contents
-                return
-        entry = self._kdb.add_entry(self._kdb_group, title=filename, username="", password="")
-        bin_id = self._kdb.add_binary(contents)
-        entry.add_attachment(bin_id, filename=filename)
+        item = self.get_file(filename)
+        if item:
+            item.set_contents_buffer(buffer)
+            return item
+        entry = self._add_entry(filename, "", "")
+        bin_id = self._database._binaries.acquire(buffer)
+        attachment = entry.add_attachment(bin_id, filename=filename)
+        self._index.add_file(_join_path(self._path, filename), entry, attachment)
+        self._database._mark_dirty()
+        return self._database._file(entry, attachment, self._path)
 
     def get_file(self, filename: str):
-        for entry in self.entries():
-            if isinstance(entry, File) and entry.filename == filename:
-                return entry
+        item = self._index.get_file(_join_path(self._path, filename))
+        if item is not None:
+            return self._database._file(item[0], item[1], self._path)
         return None
 
+    def _add_entry(self, title: str, username: str, password: str) -> Entry:
+        """Appends a new entry to the group. The callers already looked the path up in the index; pykeepass
+        add_entry would search the group with XPath again, even with force_creation."""
+        entry = Entry(title=title, username=username, password=password, kp=self._kdb)
+        self._kdb_group.append(entry)
+        return entry
+
     def delete(self):
+        self._database._binaries.release_all(self._kdb_group._element)
+        for element in self._kdb_group._element.iter("Group", "Entry"):
+            self._database._forget(element)
         self._kdb_group.delete()
+        self._index.remove_group(self._path)
+        self._database._mark_dirty()
 
     def __str__(self):
-        name = "/" if self._kdb_group.is_root_group else self._kdb_group.name
-        return "Directory(name={})".format(name)
+        return "Directory(name={})".format(self.name)
 
     def __repr__(self):
         return self.__str__()
 
 
 class Database:
-    def __init__(self, kdb):
+    def __init__(self, kdb, keep_kdf_salt: bool = False):
         self._kdb = kdb
+        with timings.phase("index"):
+            self._index = PathIndex(kdb)
+        self._binaries = BinaryStore(kdb)
+        self._keep_kdf_salt = keep_kdf_salt
+        self._compression_level = compression.DEFAULT_LEVEL
+        self._dirty = False
+        self._handles = {}
+        self.save_stats = None
+
+    @property
+    def is_dirty(self) -> bool:
+        """Whether the database has changes that were not saved yet."""
+        return self._dirty
+
+    def _mark_dirty(self):
+        self._dirty = True
+
+    def _folder(self, element, parent_path: str = None, group: Group = None, path: str = None) -> Folder:
+        """Cached Folder handle of a group element, at path or under parent_path."""
+        handle = self._handles.get(element)
+        if handle is None:
+            group = group if group is not None else Group(element=element, kp=self._kdb)
+            if path is None:
+                path = _join_path(parent_path, group.name) if parent_path is not None else "/".join(group.path)
+            handle = self._handles[element] = Folder(self._kdb, group, self, path)
+        return handle
+
+    def _entry_handles(self, element, directory_path: str, entry: Entry = None) -> tuple:
+        """Cached handles of an entry element: its KeyValue, if it is one, then a File per attachment."""
+        handles = self._handles.get(element)
+        if handles is None:
+            entry = entry if entry is not None else Entry(element=element, kp=self._kdb)
+            fields = _entry_fields(element)
+            binaries = element.findall("Binary")
+            handles = []
+            if _fields_are_key_value(fields, binaries):
+                name = _fields_name(fields)
+                handle = KeyValue(self._kdb, entry, database=self, path=_join_path(directory_path, name))
+                handle._name = name
+                handles.append(handle)
+            for binary in binaries:
+                filename = binary.findtext("Key")
+                handle = File(self._kdb, entry, Attachment(element=binary, kp=self._kdb), self,
+                              _join_path(directory_path, filename))
+                handle._filename = filename
+                handles.append(handle)
+            handles = self._handles[element] = tuple(handles)
+        return handles
+
+    def _key_value(self, entry: Entry, directory_path: str) -> KeyValue:
+        for handle in self._entry_handles(entry._element, directory_path, entry):
+            if isinstance(handle, KeyValue):
+                return handle
+        return KeyValue(self._kdb, entry, database=self, path=_join_path(directory_path, _key_value_name(entry)))
+
+    def _file(self, entry: Entry, attachment: Attachment, directory_path: str) -> File:
+        for handle in self._entry_handles(entry._element, directory_path, entry):
+            if isinstance(handle, File) and handle._attachment._element is attachment._element:
+                return handle
+        return File(self._kdb, entry, attachment, self, _join_path(directory_path, attachment.filename))
+
+    def _forget(self, element):
+        """Drops the cached handles of an element whose entries or attachments changed."""
+        self._handles.pop(element, None)
+
+    @property
+    def transformed_key(self) -> bytes:
+        return self._kdb.transformed_key
+
+    def has_credentials(self, password: str = None, keyfile: str = None) -> bool:
+        """Whether password and keyfile make the composite key the database was opened with; a None one is taken
+        as the one the database was opened with."""
+        password = self._kdb.password if password is None else password
+        keyfile = self._kdb.keyfile if keyfile is None else keyfile
+        return compute_key_composite(password, keyfile) == compute_key_composite(self._kdb.password,
+                                                                                 self._kdb.keyfile)
+
+    @property
+    def keeps_kdf_salt(self) -> bool:
+        """Whether saving keeps the KDF salt, so that transformed_key stays valid for the saved file."""
+        return self._keep_kdf_salt
+
+    @property
+    def kdf_parameters(self) -> dict:
+        return kdf.get_parameters(self._kdb)
+
+    def set_kdf_parameters(self, parameters: dict):
+        """Changes the KDF of the database; the next save derives a new key, so the KDF salt is no longer kept."""
+        kdf.set_parameters(self._kdb, parameters)
+        self._keep_kdf_salt = False
+        self._mark_dirty()
+
+    @property
+    def compression_level(self) -> int:
+        """gzip level of the payload on save, 0 when it is not compressed."""
+        if not self._kdb.kdbx.header.value.dynamic_header.compression_flags.data.compression:
+            return 0
+        return self._compression_level
+
+    def set_compression_level(self, level: int):
+        """Sets the payload compression: 0 for none, or a gzip level from 1 to 9."""
+        if not 0 <= level <= 9:
+            raise Exception("Invalid compression level: {}".format(level))
+        flags = self._kdb.kdbx.header.value.dynamic_header.compression_flags.data
+        if flags.compression != bool(level):
+            flags.compression = bool(level)
+            self._mark_dirty()
+        if level:
+            self._compression_level = level
+
+    def reload(self) -> "Database":
+        """Opens the current file contents again with the same credentials, reusing the derived key."""
+        db = open_database(self._kdb.filename, password=self._kdb.password, keyfile=self._kdb.keyfile,
+                           transformed_key=self.transformed_key, keep_kdf_salt=self._keep_kdf_salt)
+        db._compression_level = self._compression_level
+        return db
 
     @property
     def root_directory(self):
-        return Folder(self._kdb, kdb_group=self._kdb.root_group)
+        group = self._index.groups[""]
+        return self._folder(group._element, group=group, path="")
+
+    def save(self, force: bool = False) -> bool:
+        """Writes the database if it has unsaved changes, or always with force. Returns whether it was written.
+
+        The file is written to a temporary file in the same directory, synced and renamed over the
+        database, so an interrupted save leaves the previous version intact.
+
+        save_stats then holds the compression level used and its input_bytes, output_bytes and seconds."""
+        if not (self._dirty or force):
+            return False
+        filename = os.path.abspath(self._kdb.filename)
+        directory = os.path.dirname(filename)
+        fd, temp_filename = tempfile.mkstemp(prefix=".{}.".format(os.path.basename(filename)), suffix=".tmp",
+                                             dir=directory)
+        level = self.compression_level
+        incompressible_bytes = self._binaries.incompressible_bytes() if level else 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                with timings.phase("kdf and encrypt"), compression.saving(level, incompressible_bytes) as stats:
+                    if self._keep_kdf_salt:
+                        self._kdb.save(f, transformed_key=self._kdb.transformed_key)
+                    else:
+                        self._kdb.save(f)
+                with timings.phase("write"):
+                    f.flush()
+                    os.fsync(f.fileno())
+            with timings.phase("write"):
+                if os.path.exists(filename):
+                    os.chmod(temp_filename, stat.S_IMODE(os.stat(filename).st_mode))
+                os.replace(temp_filename, filename)
+        except BaseException:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            raise
+        with timings.phase("write"):
+            _fsync_directory(directory)
+        self._dirty = False
+        self.save_stats = stats
+        return True
+
+    def iter_values(self):
+        """Yields (path, value) for every KeyValue reachable by get_entry, indexing the entries of all groups."""
+        for path, entry in self._index.value_items():
+            if path not in self._index.groups:
+                yield path, entry.password
+
+    def directory_paths(self):
+        """Normalized paths of every directory, the root included as an empty path."""
+        return list(self._index.groups)
+
+    @property
+    def deduplicated_bytes(self) -> int:
+        """Bytes of attachment contents stored by reusing an identical binary since the database was opened."""
+        return self._binaries.deduplicated_bytes
 
-    def save(self):
-        self._kdb.save()
+    def gc(self):
+        """Merges duplicated binaries and deletes unreferenced ones. Returns (removed binaries, bytes saved)."""
+        removed, removed_bytes = self._binaries.gc()
+        if removed:
+            self._mark_dirty()
+        return removed, removed_bytes
 
     def mk_dir(self, target_path: str):
-        path_parts = self._normalize_path(target_path).split("/")
-        current_group = self._kdb.root_group
+        path_parts = self.normalize_path(target_path).split("/")
+        current_path = ""
+        current_group = self._index.groups[""]
         if path_parts and path_parts[0]:
             for path_name in path_parts:
                 if not path_name:
                     raise Exception("Invalid path part: {}".format(target_path))
-                groups = {sg.name for sg in current_group.subgroups}
-                if path_name not in groups:
-                    current_group = self._kdb.add_group(current_group, path_name)
-                else:
-                    current_group = self._kdb.find_groups(path=current_group.path + [path_name])
-        return Folder(self._kdb, current_group)
+                current_path = _join_path(current_path, path_name)
+                group = self._index.groups.get(current_path)
+                if group is None:
+                    group = self._kdb.add_group(current_group, path_name)
+                    self._index.add_group(current_path, group)
+                    self._mark_dirty()
+                current_group = group
+        return self._folder(current_group._element, group=current_group, path=current_path)
 
     def cd_dir(self, target_path: str):
-        target_path = self._normalize_path(target_path)
-        result = self._kdb.find_groups(path=target_path.split("/"))
-        if result:
-            return Folder(self._kdb, result)
+        target_path = self.normalize_path(target_path)
+        result = self._index.groups.get(target_path)
+        if result is not None:
+            return self._folder(result._element, group=result, path=target_path)
         return None
 
+    def walk(self, target_path: str = ""):
+        """Yields every entry below target_path, depth first; nothing when the directory does not exist."""
+        directory = self.cd_dir(target_path)
+        if directory is not None:
+            yield from directory.walk()
+
+    def glob(self, pattern: str):
+        """Yields the entries matching a path with shell wildcards in any part, such as /prod/*/db-*."""
+        parts = [part for part in self.normalize_path(pattern).split("/") if part]
+        if parts:
+            yield from self.root_directory.glob(parts)
+
     def get_entry(self, entry_path: str):
         directory_name = os.path.dirname(entry_path)
-        directory = self.cd_dir(directory_name)
-        if directory:
-            for entry in directory.entries():
-                if entry.name.lower() == os.path.basename(entry_path).lower():
-                    return entry
+        directory_path = self.normalize_path(directory_name)
+        if directory_path in self._index.groups:
+            name = os.path.basename(entry_path)
+            kind, item = self._index.find(_join_path(directory_path, name)) if name else (None, None)
+            if kind == "group":
+                return self._folder(item._element, group=item)
+            if kind == "value":
+                return self._key_value(item, directory_path)
+            if kind == "file":
+                entry, attachment = item
+                return self._file(entry, attachment, directory_path)
             sys.stderr.write("WARN: entry not found: {}\n".format(entry_path))
         else:
             sys.stderr.write("WARN: directory not found: {}\n".format(directory_name))
         return None
 
     @staticmethod
-    def _normalize_path(input_path) -> str:
+    def normalize_path(input_path) -> str:
+        """Strips the leading and trailing slash of a database path."""
         if input_path.startswith("/"):
             input_path = input_path[1:]
         if input_path.endswith("/"):
@@ -201,11 +909,46 @@ class Database:
         return input_path
 
 
-def open_database(filename: str, password: str = None, keyfile: str = None):
-    kdb = PyKeePass(filename=filename, password=password, keyfile=keyfile)
-    return Database(kdb)
-
-
-def create_database(filename: str, password=None, keyfile=None):
+def open_database(filename: str, password: str = None, keyfile: str = None, transformed_key: bytes = None,
+                  keep_kdf_salt: bool = False):
+    """Opens the database, skipping the KDF when transformed_key is given and still valid.
+
+    With keep_kdf_salt the KDF salt is not rotated on save, so a cached transformed key stays valid.
+    While timings are recorded the KDF runs on its own first, to tell it apart from decryption and parsing."""
+    if not transformed_key and timings.is_active():
+        with timings.phase("kdf"):
+            transformed_key = derive_key(filename, password, keyfile)
+    if transformed_key:
+        try:
+            with timings.phase("decrypt and parse"):
+                kdb = PyKeePass(filename=filename, password=password, keyfile=keyfile,
+                                transformed_key=transformed_key)
+            return Database(kdb, keep_kdf_salt)
+        except CredentialsError:
+            pass
+    with timings.phase("kdf, decrypt and parse"):
+        kdb = PyKeePass(filename=filename, password=password, keyfile=keyfile)
+    return Database(kdb, keep_kdf_salt)
+
+
+def derive_key(filename: str, password: str = None, keyfile: str = None) -> bytes:
+    """Runs only the KDF of the database, the CPU-heavy part of opening it, from the header alone.
+
+    The result is the transformed_key accepted by open_database; being plain bytes it can come from another process."""
+    with open(filename, "rb") as f:
+        header = KDBX.header.parse_stream(f)
+    version = kdbx4 if header.value.major_version >= 4 else kdbx3
+    context = Container(_=Container(header=header, _=Container(password=password, keyfile=keyfile,
+                                                               transformed_key=None)))
+    return version.compute_transformed(context)
+
+
+def create_database(filename: str, password=None, keyfile=None, kdf_parameters: dict = None,
+                    compression_level: int = None):
     kdb = pykeepass.create_database(filename, password=password, keyfile=keyfile)
-    return Database(kdb)
+    db = Database(kdb)
+    if kdf_parameters:
+        db.set_kdf_parameters(kdf_parameters)
+    if compression_level is not None:
+        db.set_compression_level(compression_level)
+    return db
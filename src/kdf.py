@@ -0,0 +1,123 @@
+"""KDF parameters of KDBX 4 databases: reading, changing and calibrating them to an unlock latency.
+
+Parameters are plain dicts: {"kdf": "argon2id" | "argon2d", "memory": bytes, "iterations": n, "parallelism": lanes}
+for argon2, {"kdf": "aes", "iterations": rounds} for AES-KDF.
+"""
+import os
+import time
+
+import argon2
+from construct import Container
+from pykeepass.kdbx_parsing.common import aes_kdf
+from pykeepass.kdbx_parsing.kdbx4 import kdf_uuids
+
+from src import config
+
+KDF_TYPES = ("argon2id", "argon2d", "aes")
+MIN_MEMORY = 1 << 20
+SALT_SIZE = 32
+
+_UUID_TYPES = {kdf_uuids["argon2id"]: "argon2id", kdf_uuids["argon2"]: "argon2d", kdf_uuids["aeskdf"]: "aes"}
+_TYPE_UUIDS = {kdf: uuid for uuid, kdf in _UUID_TYPES.items()}
+_UINT32 = 0x04
+_UINT64 = 0x05
+_BYTES = 0x42
+
+
+def default_parallelism() -> int:
+    return os.cpu_count() or 1
+
+
+def get_parameters(kdb) -> dict:
+    header = kdb.kdbx.header.value
+    if header.major_version < 4:
+        return {"kdf": "aes", "iterations": header.dynamic_header.transform_rounds.data}
+    items = header.dynamic_header.kdf_parameters.data.dict
+    kdf = _UUID_TYPES.get(items["$UUID"].value)
+    if kdf is None:
+        raise Exception("Unsupported key derivation method")
+    if kdf == "aes":
+        return {"kdf": kdf, "iterations": items["R"].value}
+    return {"kdf": kdf, "memory": items["M"].value, "iterations": items["I"].value, "parallelism": items["P"].value}
+
+
+def resolve_parameters(current: dict, kdf: str = None, memory: int = None, iterations: int = None,
+                       parallelism: int = None) -> dict:
+    """Returns current with the given values replaced; switching KDF type starts from the configured defaults."""
+    kdf = kdf or current["kdf"]
+    if kdf not in KDF_TYPES:
+        raise Exception("Invalid KDF: {}".format(kdf))
+    if kdf == "aes":
+        rounds = current["iterations"] if current["kdf"] == "aes" else config.CONFIG["kdf_aes_rounds"]
+        return {"kdf": kdf, "iterations": iterations or rounds}
+    if current["kdf"] == "aes":
+        current = {"memory": config.CONFIG["kdf_argon2_memory"], "iterations": config.CONFIG["kdf_argon2_iterations"],
+                   "parallelism": default_parallelism()}
+    parameters = {"kdf": kdf, "memory": memory or current["memory"], "iterations": iterations or current["iterations"],
+                  "parallelism": parallelism or current["parallelism"]}
+    if parameters["memory"] < 8 * 1024 * parameters["parallelism"]:
+        raise Exception("KDF memory must be at least 8K per lane")
+    return parameters
+
+
+def set_parameters(kdb, parameters: dict):
+    """Replaces the KDF parameters in the header of a KDBX 4 database with a fresh salt; the next save derives
+    the key again with them."""
+    header = kdb.kdbx.header.value
+    if header.major_version < 4:
+        raise Exception("KDF parameters can only be changed in KDBX 4 databases")
+    if parameters["kdf"] == "aes":
+        items = [("$UUID", _BYTES, _TYPE_UUIDS["aes"]), ("R", _UINT64, parameters["iterations"]),
+                 ("S", _BYTES, os.urandom(SALT_SIZE))]
+    else:
+        items = [("$UUID", _BYTES, _TYPE_UUIDS[parameters["kdf"]]), ("I", _UINT64, parameters["iterations"]),
+                 ("M", _UINT64, parameters["memory"]), ("P", _UINT32, parameters["parallelism"]),
+                 ("S", _BYTES, os.urandom(SALT_SIZE)), ("V", _UINT32, argon2.low_level.ARGON2_VERSION)]
+    kdf_parameters = header.dynamic_header.kdf_parameters.data
+    kdf_parameters.dict = Container(
+        (key, Container(type=item_type, key=key, value=value, next_byte=items[n + 1][1] if n + 1 < len(items) else 0))
+        for n, (key, item_type, value) in enumerate(items))
+
+
+def measure(parameters: dict) -> float:
+    """Seconds this machine takes to derive a key with the parameters."""
+    started = time.perf_counter()
+    if parameters["kdf"] == "aes":
+        aes_kdf(os.urandom(SALT_SIZE), parameters["iterations"], os.urandom(32))
+    else:
+        argon2.low_level.hash_secret_raw(
+            secret=os.urandom(32), salt=os.urandom(SALT_SIZE), hash_len=32,
+            type=argon2.low_level.Type.ID if parameters["kdf"] == "argon2id" else argon2.low_level.Type.D,
+            time_cost=parameters["iterations"], memory_cost=parameters["memory"] // 1024,
+            parallelism=parameters["parallelism"])
+    return time.perf_counter() - started
+
+
+def calibrate(target_ms: float, kdf: str = "argon2id", memory: int = None, parallelism: int = None) -> dict:
+    """Picks the iterations (and for argon2, lowers the memory if even one pass is too slow) that make a key
+    derivation on this machine take about target_ms."""
+    target = target_ms / 1000
+    if kdf == "aes":
+        sample_rounds = 100000
+        rounds = int(sample_rounds * target / max(measure({"kdf": kdf, "iterations": sample_rounds}), 1e-6))
+        return {"kdf": kdf, "iterations": max(rounds, 1)}
+    if kdf not in KDF_TYPES:
+        raise Exception("Invalid KDF: {}".format(kdf))
+    parameters = {"kdf": kdf, "memory": memory or config.CONFIG["kdf_argon2_memory"], "iterations": 1,
+                  "parallelism": parallelism or default_parallelism()}
+    while True:
+        one_pass = measure(parameters)
+        if one_pass <= target or parameters["memory"] // 2 < max(MIN_MEMORY, 8 * 1024 * parameters["parallelism"]):
+            break
+        parameters["memory"] //= 2
+    two_passes = measure(dict(parameters, iterations=2))
+    per_pass = max(two_passes - one_pass, one_pass / 2, 1e-6)
+    parameters["iterations"] = max(1, round((target - one_pass) / per_pass) + 1)
+    return parameters
+
+
+def describe(parameters: dict) -> str:
+    if parameters["kdf"] == "aes":
+        return "aes rounds={}".format(parameters["iterations"])
+    return "{} memory={}K iterations={} parallelism={}".format(parameters["kdf"], parameters["memory"] // 1024,
+                                                             parameters["iterations"], parameters["parallelism"])
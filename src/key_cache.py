@@ -0,0 +1,78 @@
+import base64
+import hashlib
+import json
+import os
+import sys
+import time
+
+from pykeepass.kdbx_parsing import KDBX
+from pykeepass.kdbx_parsing.common import compute_key_composite
+
+from src import config
+from src.cache import get_runtime_dir
+
+
+def kdf_fingerprint(filename: str, password: str = None, keyfile: str = None) -> str:
+    """Hash of the KDF header fields and the composite key: any change to them invalidates a cached key."""
+    with open(filename, "rb") as f:
+        header = KDBX.header.parse_stream(f).value
+    digest = hashlib.sha256()
+    digest.update("{}.{}".format(header.major_version, header.minor_version).encode("utf-8"))
+    if header.major_version >= 4:
+        kdf_parameters = header.dynamic_header.kdf_parameters.data.dict
+        for name in sorted(kdf_parameters):
+            digest.update("{}={!r};".format(name, kdf_parameters[name].value).encode("utf-8"))
+    else:
+        digest.update(header.dynamic_header.transform_seed.data)
+        digest.update(repr(header.dynamic_header.transform_rounds.data).encode("utf-8"))
+    digest.update(compute_key_composite(password=password, keyfile=keyfile))
+    return digest.hexdigest()
+
+
+class KeyCache:
+    """Stores the transformed (post-KDF) key of one database in a 0600 file in the runtime directory."""
+
+    def __init__(self, database_path: str, ttl: int):
+        self.database_path = database_path
+        self.ttl = ttl
+        self._file_name = self._get_key_file_name(database_path)
+
+    @staticmethod
+    def _get_key_file_name(database_path: str):
+        runtime_dir = get_runtime_dir()
+        if not runtime_dir:
+            return None
+        digest = hashlib.sha256(database_path.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(runtime_dir, config.CONFIG["key_cache_file_name"].format(digest))
+
+    def load(self, password: str = None, keyfile: str = None):
+        if not self._file_name or not os.path.exists(self._file_name):
+            return None
+        try:
+            with open(self._file_name, "r") as f:
+                data = json.load(f)
+            if data["expires"] > time.time() and \
+                    data["fingerprint"] == kdf_fingerprint(self.database_path, password, keyfile):
+                return base64.b64decode(data["key"])
+        except Exception as ex:
+            sys.stderr.write("WARN: failed to load key cache [{}]: {}\n".format(self._file_name, ex.__str__()))
+        self.clear()
+        return None
+
+    def store(self, transformed_key: bytes, password: str = None, keyfile: str = None):
+        if not self._file_name:
+            return
+        data = {
+            "fingerprint": kdf_fingerprint(self.database_path, password, keyfile),
+            "expires": time.time() + self.ttl,
+            "key": base64.b64encode(transformed_key).decode("ascii"),
+        }
+        temp_file_name = "{}.{}.tmp".format(self._file_name, os.getpid())
+        fd = os.open(temp_file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_file_name, self._file_name)
+
+    def clear(self):
+        if self._file_name and os.path.exists(self._file_name):
+            os.remove(self._file_name)
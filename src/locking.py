@@ -0,0 +1,48 @@
+import fcntl
+import os
+
+
+def get_lock_file_name(database_path: str) -> str:
+    """The lock lives next to the database: saving replaces the kdbx file, so its own inode cannot be locked."""
+    directory, name = os.path.split(os.path.abspath(database_path))
+    return os.path.join(directory, ".{}.lock".format(name))
+
+
+def file_stamp(filename: str):
+    """Identifies one version of a file: any save through a temporary file changes the inode."""
+    try:
+        status = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return status.st_ino, status.st_size, status.st_mtime_ns
+
+
+class DatabaseLock:
+    """Advisory flock on the database lock file: shared for readers, exclusive for writers."""
+
+    def __init__(self, database_path: str, exclusive: bool = False):
+        self.lock_file_name = get_lock_file_name(database_path)
+        self.exclusive = exclusive
+        self._fd = None
+
+    def acquire(self):
+        try:
+            self._fd = os.open(self.lock_file_name, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError:
+            if self.exclusive:
+                raise
+            # read-only directory: nobody can save there, so readers do not need the lock
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
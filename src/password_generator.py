@@ -1,13 +1,67 @@
-import random
-
-
-def generate(number_of_chars: int):
-    random_bytes = random.Random().randbytes(number_of_chars)
-    sb = []
-    rest = 0
-    for i in range(0, number_of_chars):
-        value = random_bytes[i] + rest
-        char_value = value % (126 - 33)
-        rest = value - char_value
-        sb.append(chr(33 + char_value))
-    return "".join(sb)
+import functools
+import secrets
+import string
+
+ALPHABETS = {
+    "printable": string.ascii_letters + string.digits + string.punctuation,
+    "alphanumeric": string.ascii_letters + string.digits,
+    "hex": string.digits + "abcdef",
+    "digits": string.digits,
+}
+DEFAULT_ALPHABET = "printable"
+POOL_SIZE = 256
+
+
+def resolve_alphabet(alphabet: str = DEFAULT_ALPHABET) -> str:
+    """Returns the characters of a named alphabet, or alphabet itself as the list of characters to use."""
+    chars = ALPHABETS.get(alphabet, alphabet)
+    if len(chars) < 2 or len(set(chars)) != len(chars) or not chars.isascii():
+        raise Exception("Invalid alphabet, expected a name ({}) or at least 2 distinct ASCII characters: {}".format(
+            ", ".join(ALPHABETS), alphabet))
+    return chars
+
+
+def random_chars(number_of_chars: int, alphabet: str = DEFAULT_ALPHABET) -> str:
+    """Draws number_of_chars characters uniformly from the alphabet.
+
+    Random bytes come from the CSPRNG in bulk; bytes at or above the largest multiple of the alphabet size are
+    rejected so every character is equally likely, and the rest are mapped with bytes.translate."""
+    limit, table, rejected = _translation(resolve_alphabet(alphabet))
+    result = bytearray()
+    while len(result) < number_of_chars:
+        missing = number_of_chars - len(result)
+        result += secrets.token_bytes(missing * 256 // limit + 16).translate(table, rejected)
+    return result[:number_of_chars].decode("ascii")
+
+
+@functools.lru_cache(maxsize=64)
+def _translation(chars: str):
+    """(limit, byte to character table, rejected bytes) for the alphabet chars."""
+    limit = 256 - 256 % len(chars)
+    return limit, bytes(ord(chars[value % len(chars)]) for value in range(256)), bytes(range(limit, 256))
+
+
+def generate(number_of_chars: int, alphabet: str = DEFAULT_ALPHABET) -> str:
+    return random_chars(number_of_chars, alphabet)
+
+
+def generate_many(count: int, number_of_chars: int, alphabet: str = DEFAULT_ALPHABET) -> list:
+    """Generates count passwords from a single draw of random characters."""
+    chars = random_chars(count * number_of_chars, alphabet)
+    return [chars[i:i + number_of_chars] for i in range(0, count * number_of_chars, number_of_chars)]
+
+
+class PasswordPool:
+    """Hands out passwords of one length and alphabet, generated POOL_SIZE at a time, for bulk code paths that
+    fill many entries one by one (import). Keep it local to that operation: unused passwords stay in memory."""
+
+    def __init__(self, number_of_chars: int, alphabet: str = DEFAULT_ALPHABET, pool_size: int = POOL_SIZE):
+        self.number_of_chars = number_of_chars
+        self.alphabet = resolve_alphabet(alphabet)
+        self.pool_size = pool_size
+        self._passwords = []
+
+    def next(self) -> str:
+        if not self._passwords:
+            self._passwords = generate_many(self.pool_size, self.number_of_chars, self.alphabet)
+        return self._passwords.pop()
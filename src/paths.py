@@ -0,0 +1,14 @@
+import os
+
+
+def resolve_path(args, input_path):
+    if args.curdir:
+        return os.path.abspath(os.path.join(args.curdir, input_path))
+    return input_path
+
+
+def resolve_database_path(args, cache):
+    database_path = args.database_path or cache.get("last_database")
+    if not database_path:
+        raise Exception("Database filename not informed")
+    return os.path.abspath(resolve_path(args, database_path))
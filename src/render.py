@@ -0,0 +1,43 @@
+import re
+
+PLACEHOLDER = re.compile(r"\{\{\s*([^{}]*?)\s*\}\}")
+CHUNK_SIZE = 1 << 20
+MAX_PLACEHOLDER_SIZE = 4096
+
+
+def iter_chunks(stream, chunk_size: int = CHUNK_SIZE):
+    """Yields the text of stream in pieces of about chunk_size that never split a placeholder: an opening {{ near
+    the end of a read is held back until its closing }} arrives, or until it is too long to be a placeholder."""
+    pending = ""
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        pending += data
+        cut = pending.rfind("{{")
+        if cut == -1 or "}}" in pending[cut:] or len(pending) - cut > MAX_PLACEHOLDER_SIZE:
+            cut = len(pending) - 1 if pending.endswith("{") else len(pending)
+        if cut:
+            yield pending[:cut]
+            pending = pending[cut:]
+    if pending:
+        yield pending
+
+
+def render(chunks, resolve, out) -> bool:
+    """Writes the chunks to out with each {{ path }} placeholder replaced by its value.
+
+    The paths of a chunk that were not seen before are handed to resolve(paths) together, which returns a dict of
+    path to value, or None to stop rendering; values are kept, so each path is looked up once. Returns whether
+    the whole template was rendered."""
+    values = {}
+    for chunk in chunks:
+        pieces = PLACEHOLDER.split(chunk)
+        missing = [path for path in pieces[1::2] if path not in values]
+        if missing:
+            resolved = resolve(missing)
+            if resolved is None:
+                return False
+            values.update(resolved)
+        out.write("".join(values[piece] if index % 2 else piece for index, piece in enumerate(pieces)))
+    return True
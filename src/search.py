@@ -0,0 +1,44 @@
+import fnmatch
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def make_matcher(pattern: str, mode: str = "name"):
+    """Returns a function telling whether an entry (path, name) matches: a glob on the name or on the full path,
+    or a regular expression searched in the full path."""
+    if mode == "name":
+        return lambda path, name: fnmatch.fnmatchcase(name, pattern)
+    if mode == "path":
+        return lambda path, name: fnmatch.fnmatchcase(path, pattern.lstrip("/"))
+    if mode == "regex":
+        expression = re.compile(pattern)
+        return lambda path, name: expression.search(path) is not None
+    raise Exception("Invalid match mode: {}".format(mode))
+
+
+def search_database(database_path: str, password: str, keyfile: str, pattern: str, mode: str):
+    """Opens one database and returns (database_path, matching paths, seconds, error message).
+
+    Runs in a worker process: it only takes and returns plain values."""
+    from src import database
+
+    started = time.perf_counter()
+    try:
+        matches = make_matcher(pattern, mode)
+        db = database.open_database(database_path, password=password, keyfile=keyfile)
+        paths = [entry.path for entry in db.walk() if matches(entry.path, entry.name)]
+        return database_path, paths, time.perf_counter() - started, None
+    except Exception as ex:
+        return database_path, [], time.perf_counter() - started, ex.__str__()
+
+
+def search_databases(databases: dict, pattern: str, mode: str = "name", jobs: int = None):
+    """Searches every database of {database_path: (password, keyfile)} in a process pool, yielding the
+    search_database results in the order the databases finish."""
+    make_matcher(pattern, mode)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(search_database, database_path, password, keyfile, pattern, mode)
+                   for database_path, (password, keyfile) in databases.items()]
+        for future in as_completed(futures):
+            yield future.result()
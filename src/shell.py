@@ -0,0 +1,196 @@
+import cmd
+import contextlib
+import io
+import posixpath
+import shlex
+import sys
+
+from src import app_launcher, batch, config, password_generator
+from src.database import Folder
+from src.locking import DatabaseLock, file_stamp
+
+SHELL_COMMANDS = batch.BATCH_COMMANDS
+PATH_ARGS = {"ls": "source", "get": "entry_path", "set": "entry_path", "del": "entry_path", "get-file": "source",
+             "put-file": "destination", "put-dir": "destination", "get-dir": "source"}
+
+
+class Shell(cmd.Cmd):
+    """Interactive shell over one unlocked Database.
+
+    Commands run in memory against the open database, with paths relative to the current directory. Changes are
+    saved on `save` and on exit; if another process saved the file in the meantime, the database is reloaded and
+    the pending changes applied again before saving, as --optimistic does."""
+
+    def __init__(self, database_path: str, db, stamp, cache, base_args, out=sys.stdout, stdin=sys.stdin,
+                 after_save=None):
+        super().__init__(stdin=stdin, stdout=out)
+        self.use_rawinput = stdin is sys.stdin and stdin.isatty()
+        self.database_path = database_path
+        self.db = db
+        self.cache = cache
+        self.base_args = base_args
+        self.out = out
+        self.cwd = "/"
+        self.pending = []
+        self.after_save = after_save
+        self._stamp = stamp
+        self._update_prompt()
+
+    def run(self):
+        """Runs the command loop until exit or end of input, then saves any pending change."""
+        while True:
+            try:
+                self.cmdloop()
+                break
+            except KeyboardInterrupt:
+                self.out.write("^C\n")
+        if self.db.is_dirty:
+            self.save()
+
+    def preloop(self):
+        if self.use_rawinput:
+            try:
+                import readline
+
+                # complete whole paths, not the words between slashes and dashes
+                readline.set_completer_delims(" \t\n")
+            except ImportError:
+                pass
+
+    def emptyline(self):
+        return False
+
+    def default(self, line: str):
+        try:
+            argv = shlex.split(line)
+        except ValueError as ex:
+            sys.stderr.write("ERROR: {}\n".format(ex))
+            return False
+        self.run_command(argv)
+        return False
+
+    def do_cd(self, arg: str):
+        """cd [directory]: change the current directory (default: /)"""
+        target = self.resolve(arg.strip() or "/")
+        with DatabaseLock(self.database_path):
+            self._refresh()
+        if self.db.cd_dir(target) is None:
+            sys.stderr.write("ERROR: directory not found: {}\n".format(target))
+            return False
+        self.cwd = target
+        self._update_prompt()
+        return False
+
+    def do_pwd(self, arg: str):
+        """pwd: print the current directory"""
+        self.out.write("{}\n".format(self.cwd))
+        return False
+
+    def do_save(self, arg: str):
+        """save: write the pending changes to the database file"""
+        if self.save():
+            self.out.write("Database saved: {}\n".format(self.database_path))
+        else:
+            self.out.write("No changes to save\n")
+        return False
+
+    def do_exit(self, arg: str):
+        """exit: leave the shell, saving pending changes"""
+        return True
+
+    do_quit = do_exit
+
+    def do_EOF(self, arg: str):
+        self.out.write("\n")
+        return True
+
+    def run_command(self, argv) -> int:
+        """Runs one command line against the open database, under the shared lock. Returns the exit code."""
+        try:
+            args = app_launcher.parse_args(argv)
+        except SystemExit as ex:
+            return ex.code if isinstance(ex.code, int) else 2
+        if args.command not in SHELL_COMMANDS or (args.command == "put-file" and args.source == "-"):
+            sys.stderr.write("ERROR: command not allowed in shell: {}\n".format(args.command))
+            return 1
+        for name in batch.GLOBAL_ARGS:
+            if getattr(args, name) is None:
+                setattr(args, name, getattr(self.base_args, name))
+        path_arg = PATH_ARGS[args.command]
+        if args.command == "ls" and "/" not in argv[1:] and args.source == "/":
+            args.source = self.cwd
+        setattr(args, path_arg, self.resolve(getattr(args, path_arg)))
+        if args.command == "set" and args.generate:
+            # fix the generated value, so that replaying the change after a reload sets the same one
+            args.entry_value = password_generator.generate(args.length or config.CONFIG["generate_password_size"],
+                                                           args.alphabet)
+            args.generate = False
+        try:
+            with DatabaseLock(self.database_path):
+                self._refresh()
+                code = self._execute(args, self.out)
+        except Exception as ex:
+            sys.stderr.write("ERROR: {}\n".format(ex))
+            return 1
+        if code == 0 and args.command in batch.MUTATING_COMMANDS:
+            self.pending.append(args)
+        return code
+
+    def save(self) -> bool:
+        """Saves under the write lock, reloading and replaying the pending changes first when the file changed."""
+        with DatabaseLock(self.database_path, exclusive=True):
+            self._refresh()
+            saved = self.db.save()
+            if saved and self.after_save:
+                self.after_save(self.db)
+            self._stamp = file_stamp(self.database_path)
+        self.pending = []
+        return saved
+
+    def resolve(self, path: str) -> str:
+        """Absolute database path of path, relative to the current directory unless it starts with /."""
+        return posixpath.normpath(posixpath.join(self.cwd, path))
+
+    def completenames(self, text: str, *ignored):
+        names = [name[3:] for name in self.get_names() if name.startswith("do_") and name != "do_EOF"]
+        return sorted(name for name in set(names) | SHELL_COMMANDS if name.startswith(text))
+
+    def completedefault(self, text: str, line: str, begidx: int, endidx: int):
+        return self.complete_path(text)
+
+    def complete_cd(self, text: str, line: str, begidx: int, endidx: int):
+        return [path for path in self.complete_path(text) if path.endswith("/")]
+
+    def complete_path(self, text: str) -> list:
+        """Completions of a partial path from the entries in memory; directories end with /."""
+        directory, prefix = text.rpartition("/")[::2]
+        if "/" in text:
+            directory += "/"
+        folder = self.db.cd_dir(self.resolve(directory or "."))
+        if folder is None:
+            return []
+        completions = []
+        for entry in folder.entries():
+            if entry.name.startswith(prefix):
+                completions.append(directory + entry.name + ("/" if isinstance(entry, Folder) else ""))
+        return sorted(completions)
+
+    def _execute(self, args, out) -> int:
+        from src.app import App
+
+        return app_launcher.execute(App(args, self.cache, out, database=self.db, autosave=False), args.command)
+
+    def _refresh(self):
+        """Reloads the database if another process saved it, then applies the pending changes again. Must be
+        called with the database lock held."""
+        stamp = file_stamp(self.database_path)
+        if stamp == self._stamp:
+            return
+        self.db = self.db.reload()
+        self._stamp = stamp
+        with contextlib.redirect_stderr(io.StringIO()):
+            for args in self.pending:
+                self._execute(args, io.StringIO())
+
+    def _update_prompt(self):
+        self.prompt = "kdbx:{}> ".format(self.cwd) if self.use_rawinput else ""
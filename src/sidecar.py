@@ -0,0 +1,133 @@
+"""Encrypted sidecar index of a database, answering read-only lookups without decrypting and parsing the XML.
+
+The sidecar (.<name>.idx next to the database) maps every KeyValue path to its value and every directory path to
+the lines `ls` prints for it. It is encrypted with AES-GCM under a key derived from the master key of the database
+version it describes (sha256 of the header master seed and the transformed key), and carries the size, mtime and
+sha256 of that database file, authenticated with it: a sidecar left behind by another version is never used.
+"""
+import hashlib
+import hmac
+import json
+import os
+import struct
+import sys
+import tempfile
+import zlib
+
+from Cryptodome.Cipher import AES
+from pykeepass.kdbx_parsing import KDBX
+
+from src import timings
+from src.database import Database
+
+MAGIC = b"PKDBXIDX1"
+KEY_LABEL = b"pykdbx sidecar index"
+NONCE_SIZE = 12
+TAG_SIZE = 16
+_LENGTH = ">I"
+
+
+def get_sidecar_file_name(database_path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(database_path))
+    return os.path.join(directory, ".{}.idx".format(name))
+
+
+def file_identity(filename: str) -> dict:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        file_stat = os.fstat(f.fileno())
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns, "sha256": digest.hexdigest()}
+
+
+def _sidecar_key(database_path: str, transformed_key: bytes) -> bytes:
+    with open(database_path, "rb") as f:
+        master_seed = KDBX.header.parse_stream(f).value.dynamic_header.master_seed.data
+    master_key = hashlib.sha256(master_seed + transformed_key).digest()
+    return hmac.new(master_key, KEY_LABEL, hashlib.sha256).digest()
+
+
+def build_index(db: Database) -> dict:
+    values = dict(db.iter_values())
+    directories = {path: [str(entry) for entry in db.cd_dir(path).entries()] for path in db.directory_paths()}
+    return {"values": values, "directories": directories}
+
+
+def write(database_path: str, db: Database, transformed_key: bytes):
+    """Writes the sidecar of the database file just saved from db, whose transformed key is transformed_key."""
+    with timings.phase("sidecar write"):
+        sidecar_file_name = get_sidecar_file_name(database_path)
+        header = json.dumps(file_identity(database_path)).encode("utf-8")
+        associated_data = MAGIC + struct.pack(_LENGTH, len(header)) + header
+        cipher = AES.new(_sidecar_key(database_path, transformed_key), AES.MODE_GCM, nonce=os.urandom(NONCE_SIZE))
+        cipher.update(associated_data)
+        plaintext = zlib.compress(json.dumps(build_index(db), separators=(",", ":")).encode("utf-8"))
+        ciphertext, tag = cipher.encrypt_and_digest(plaintext)
+        temp_file_name = None
+        try:
+            fd, temp_file_name = tempfile.mkstemp(prefix=os.path.basename(sidecar_file_name) + ".", suffix=".tmp",
+                                                  dir=os.path.dirname(sidecar_file_name))
+            with os.fdopen(fd, "wb") as f:
+                f.write(associated_data + cipher.nonce + tag + ciphertext)
+            os.replace(temp_file_name, sidecar_file_name)
+        except OSError as ex:
+            sys.stderr.write("WARN: failed to save sidecar index [{}]: {}\n".format(sidecar_file_name, ex.__str__()))
+        finally:
+            if temp_file_name and os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+
+
+def remove(database_path: str):
+    sidecar_file_name = get_sidecar_file_name(database_path)
+    if os.path.exists(sidecar_file_name):
+        os.remove(sidecar_file_name)
+
+
+def read(database_path: str, transformed_key: bytes):
+    """Returns the SidecarIndex of the database, or None when there is none for the current file version or it does
+    not decrypt with transformed_key."""
+    sidecar_file_name = get_sidecar_file_name(database_path)
+    if not transformed_key or not os.path.exists(sidecar_file_name):
+        return None
+    with timings.phase("sidecar read"):
+        try:
+            with open(sidecar_file_name, "rb") as f:
+                data = f.read()
+            if not data.startswith(MAGIC):
+                return None
+            header_size, = struct.unpack_from(_LENGTH, data, len(MAGIC))
+            header_end = len(MAGIC) + struct.calcsize(_LENGTH) + header_size
+            identity = json.loads(data[header_end - header_size:header_end])
+            file_stat = os.stat(database_path)
+            if identity.get("size") != file_stat.st_size or identity.get("mtime_ns") != file_stat.st_mtime_ns:
+                return None
+            if identity != file_identity(database_path):
+                return None
+            nonce = data[header_end:header_end + NONCE_SIZE]
+            tag = data[header_end + NONCE_SIZE:header_end + NONCE_SIZE + TAG_SIZE]
+            cipher = AES.new(_sidecar_key(database_path, transformed_key), AES.MODE_GCM, nonce=nonce)
+            cipher.update(data[:header_end])
+            plaintext = cipher.decrypt_and_verify(data[header_end + NONCE_SIZE + TAG_SIZE:], tag)
+            return SidecarIndex(json.loads(zlib.decompress(plaintext)))
+        except (OSError, ValueError, KeyError, struct.error, zlib.error):
+            return None
+
+
+class SidecarIndex:
+    """Read-only view of a decrypted sidecar. Lookups return None when the sidecar cannot answer exactly, in which
+    case the caller opens the database."""
+
+    def __init__(self, data: dict):
+        self._values = data["values"]
+        self._directories = data["directories"]
+
+    def get_value(self, entry_path: str):
+        directory_name, name = os.path.split(entry_path)
+        if not name:
+            return None
+        directory_path = Database.normalize_path(directory_name)
+        return self._values.get("{}/{}".format(directory_path, name) if directory_path else name)
+
+    def list_directory(self, directory_path: str):
+        return self._directories.get(Database.normalize_path(directory_path))
@@ -0,0 +1,103 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src.database import BINARY_CHUNK_SIZE, File, read_binary
+
+ADDED = "A"
+UPDATED = "M"
+UNCHANGED = "="
+
+
+def file_digest(filename: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(BINARY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _local_files(local_dir: str):
+    """Yields (local path, relative path with / separators) for every regular file below local_dir. Symbolic links
+    are skipped, so nothing outside local_dir is stored; os.walk does not descend into linked directories."""
+    for directory, subdirectories, filenames in os.walk(local_dir):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            local_path = os.path.join(directory, filename)
+            if os.path.isfile(local_path) and not os.path.islink(local_path):
+                yield local_path, os.path.relpath(local_path, local_dir).replace(os.sep, "/")
+
+
+def plan_put(db, local_dir: str, target_path: str):
+    """Yields (action, local path, entry path) for every file of local_dir mirrored under target_path."""
+    target_path = db.normalize_path(target_path)
+    for local_path, relative_path in _local_files(local_dir):
+        entry_path = "{}/{}".format(target_path, relative_path) if target_path else relative_path
+        directory, filename = os.path.split(entry_path)
+        folder = db.cd_dir(directory)
+        entry = folder.get_file(filename) if folder is not None else None
+        if entry is None:
+            yield ADDED, local_path, entry_path
+        elif entry.size != os.path.getsize(local_path) or entry.digest != file_digest(local_path):
+            yield UPDATED, local_path, entry_path
+        else:
+            yield UNCHANGED, local_path, entry_path
+
+
+def apply_put(db, plan, max_size: int = None):
+    """Stores the added and updated files of a plan_put plan, yielding every step of the plan."""
+    for action, local_path, entry_path in plan:
+        if action != UNCHANGED:
+            directory, filename = os.path.split(entry_path)
+            folder = db.mk_dir(directory) if directory else db.root_directory
+            with open(local_path, "rb") as f:
+                folder.put_buffer(filename, read_binary(f, max_size))
+        yield action, local_path, entry_path
+
+
+def plan_get(db, source_path: str, local_dir: str):
+    """Yields (action, File, local path) for every file below source_path mirrored into local_dir."""
+    source_path = db.normalize_path(source_path)
+    prefix = source_path + "/" if source_path else ""
+    for entry in db.walk(source_path):
+        if not isinstance(entry, File):
+            continue
+        local_path = _local_path(local_dir, entry.path[len(prefix):])
+        if not os.path.isfile(local_path):
+            yield ADDED, entry, local_path
+        elif entry.size != os.path.getsize(local_path) or entry.digest != file_digest(local_path):
+            yield UPDATED, entry, local_path
+        else:
+            yield UNCHANGED, entry, local_path
+
+
+def _local_path(local_dir: str, relative_path: str) -> str:
+    """Path of relative_path below local_dir; raises if a part of it could lead the file outside local_dir."""
+    parts = relative_path.split("/")
+    for part in parts:
+        if part in ("", ".", "..") or os.path.isabs(part) or os.sep in part or (os.altsep and os.altsep in part):
+            raise Exception("Refusing to write entry outside of the destination: {}".format(relative_path))
+    local_path = os.path.join(local_dir, *parts)
+    root = os.path.realpath(local_dir)
+    if os.path.commonpath([root, os.path.realpath(local_path)]) != root:
+        raise Exception("Refusing to write entry outside of the destination: {}".format(relative_path))
+    return local_path
+
+
+def apply_get(plan, workers: int = None):
+    """Writes the added and updated files of a plan_get plan from a thread pool, yielding every step of the plan
+    once submitted. Directories are created in the calling thread."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for action, entry, local_path in plan:
+            if action != UNCHANGED:
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                futures.append(executor.submit(_write_file, local_path, entry.contents_view))
+            yield action, entry, local_path
+        for future in futures:
+            future.result()
+
+
+def _write_file(local_path: str, view: memoryview):
+    with open(local_path, "wb") as f:
+        f.write(view)
@@ -0,0 +1,103 @@
+import contextlib
+import json
+import time
+
+_active = []
+_nested = []
+
+
+class Timings:
+    """Accumulates the wall time of named phases while active:
+
+        with Timings() as timings:
+            db = database.open_database(filename, password)
+            db.save(force=True)
+        print(timings.to_dict())
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self._started = None
+        self.total = 0.0
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def __enter__(self):
+        _active.append(self)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.total = time.perf_counter() - self._started
+        _active.remove(self)
+
+    def to_dict(self) -> dict:
+        phases = {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()}
+        phases["other"] = round(max(self.total - sum(self.phases.values()), 0.0) * 1000, 3)
+        values = {"phases_ms": phases, "total_ms": round(self.total * 1000, 3)}
+        if self.counters:
+            values["counters"] = dict(self.counters)
+        return values
+
+    def format(self, output_format: str = "text") -> str:
+        values = self.to_dict()
+        if output_format == "json":
+            return json.dumps(values) + "\n"
+        lines = ["timings:"]
+        for name, milliseconds in values["phases_ms"].items():
+            lines.append("  {:<20} {:10.1f} ms".format(name, milliseconds))
+        lines.append("  {:<20} {:10.1f} ms".format("total", values["total_ms"]))
+        for name, value in values.get("counters", {}).items():
+            lines.append("  {:<20} {:10d}".format(name, value))
+        return "\n".join(lines) + "\n"
+
+
+def is_active() -> bool:
+    return bool(_active)
+
+
+@contextlib.contextmanager
+def phase(name: str):
+    """Adds the time spent in the block to the phase of every active Timings; free when none is active.
+
+    Time spent in a nested phase counts only for the nested one."""
+    if not _active:
+        yield
+        return
+    started = time.perf_counter()
+    _nested.append(0.0)
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        nested = _nested.pop()
+        if _nested:
+            _nested[-1] += elapsed
+        for timings in _active:
+            timings.add(name, elapsed - nested)
+
+
+def count(name: str, value: int):
+    """Adds value to a counter of every active Timings, such as bytes processed."""
+    for timings in _active:
+        timings.count(name, value)
+
+
+def timed_iter(name: str, iterator):
+    """Yields the items of iterator, adding the time spent producing them to a phase."""
+    if not _active:
+        yield from iterator
+        return
+    iterator = iter(iterator)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
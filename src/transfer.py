@@ -0,0 +1,72 @@
+import base64
+import datetime
+import json
+
+from src import config, password_generator
+from src.database import File, Folder, to_binary_buffer
+
+
+def export_records(db, source: str = ""):
+    """Yields one dict per entry below source, depth first: path, type, value or base64 data, and metadata.
+
+    Only one attachment is encoded at a time, so memory does not grow with the size of the vault."""
+    for entry in db.walk(source):
+        mtime = entry.mtime
+        record = {"path": entry.path, "mtime": mtime.isoformat() if mtime else None}
+        if isinstance(entry, Folder):
+            record["type"] = "directory"
+        elif isinstance(entry, File):
+            record["type"] = "file"
+            record["data"] = base64.b64encode(entry.contents_view).decode("ascii")
+        else:
+            record["type"] = "value"
+            record["value"] = entry.value
+            if entry.username:
+                record["title"] = entry.title
+                record["username"] = entry.username
+        yield record
+
+
+def import_records(db, lines) -> dict:
+    """Adds or updates the entries of NDJSON export lines, returning the number of records of each type.
+
+    A value record may have "generate" (true or a length) and "alphabet" instead of "value" to get a
+    generated password. Directories are found or created through the path index; the caller saves once at the end."""
+    counts = {"directory": 0, "value": 0, "file": 0}
+    pools = {}
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            entry_type = record["type"]
+            directory, _, name = record["path"].rpartition("/")
+            if entry_type == "directory":
+                entry = db.mk_dir(record["path"])
+            elif entry_type == "value":
+                folder = db.mk_dir(directory)
+                entry = folder.set_value(record.get("title", name), _value(record, pools), record.get("username", ""))
+            elif entry_type == "file":
+                folder = db.mk_dir(directory)
+                entry = folder.put_buffer(name, to_binary_buffer(base64.b64decode(record["data"])))
+            else:
+                raise Exception("unknown type: {}".format(entry_type))
+            if record.get("mtime"):
+                entry.mtime = datetime.datetime.fromisoformat(record["mtime"])
+        except (KeyError, ValueError) as ex:
+            raise Exception("invalid record at line {}: {}".format(line_number, ex))
+        counts[entry_type] += 1
+    return counts
+
+
+def _value(record: dict, pools: dict) -> str:
+    """The value of a record, generated from the import's pool of its length and alphabet when asked to."""
+    generate = record.get("generate")
+    if not generate:
+        return record["value"]
+    length = config.CONFIG["generate_password_size"] if generate is True else int(generate)
+    key = (length, record.get("alphabet", password_generator.DEFAULT_ALPHABET))
+    if key not in pools:
+        pools[key] = password_generator.PasswordPool(*key)
+    return pools[key].next()
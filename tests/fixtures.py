@@ -1,12 +1,21 @@
+import atexit
 import os.path
+import shutil
+import tempfile
 from unittest.mock import Mock
 
 import pykeepass
 from pykeepass import PyKeePass
 
 from src import database
+from src.cache import Cache
 
-TEST_KDBX = "test.kdbx"
+TEST_DIR = tempfile.mkdtemp(prefix="pykdbx-tests-")
+TEST_KDBX = os.path.join(TEST_DIR, "test.kdbx")
+TEST_CACHE = os.path.join(TEST_DIR, "test_cache.json")
+TEST_FILE = os.path.join(TEST_DIR, "test.txt")
+
+atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
 DEFAULT_PASS = "123"
 
 
@@ -16,6 +25,14 @@ def create_test_kdbx():
     return db
 
 
+def create_fast_database(filename: str, password: str = DEFAULT_PASS):
+    """Database with the cheapest argon2 parameters, for tests that open and save it many times."""
+    db = database.create_database(filename, password=password, kdf_parameters={
+        "kdf": "argon2d", "memory": 1 << 16, "iterations": 1, "parallelism": 1})
+    db.save()
+    return db
+
+
 def create_test_database():
     create_database = database.create_database(TEST_KDBX, password=DEFAULT_PASS)
     create_database.save()
@@ -39,13 +56,31 @@ def args_fixture(database_path=TEST_KDBX, password=DEFAULT_PASS, keyfile="", sou
     args.entry_value = entry_value
     args.output_file = output_file
     args.curdir = None
+    args.key_cache_ttl = None
+    args.max_size = None
+    args.optimistic = False
+    args.recursive = False
+    args.json = False
+    args.timings = False
+    args.timings_format = "text"
+    args.kdf = None
+    args.kdf_memory = None
+    args.kdf_iterations = None
+    args.kdf_parallelism = None
+    args.target_ms = None
+    args.compression = None
+    args.generate = False
+    args.length = None
+    args.alphabet = "printable"
+    args.count = 1
+    args.env = None
+    args.env_file = None
+    args.exec_args = []
     return args
 
 
 def cache_fixture():
-    cache = Mock()
-    cache.data = {}
-    return cache
+    return Cache(TEST_CACHE)
 
 
 def out_fixture():
@@ -55,9 +90,12 @@ def out_fixture():
 
 
 def remove_all():
-    files = ["test.txt", TEST_KDBX]
-    for file in files:
-        remove_file(file)
+    for file in os.listdir(TEST_DIR):
+        path = os.path.join(TEST_DIR, file)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            remove_file(path)
 
 
 def remove_file(file):
@@ -0,0 +1,155 @@
+import contextlib
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+import fixtures
+from src import agent, app_launcher
+
+
+class TestAgent(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+        self.runtime_dir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"XDG_RUNTIME_DIR": self.runtime_dir.name})
+        self.env.start()
+        self.database_path = os.path.abspath(fixtures.TEST_KDBX)
+        db = fixtures.create_test_database()
+        db.mk_dir("the_dir").set_value("entry_name", "entry_value")
+        db.save()
+        self.server = agent.Agent(self.database_path, fixtures.open_test_database(), fixtures.cache_fixture(), 30)
+        self.server.listen()
+        self.thread = threading.Thread(target=self.server.serve)
+        self.thread.start()
+
+    def tearDown(self) -> None:
+        agent.send_action(self.database_path, "stop")
+        self.thread.join(5)
+        self.env.stop()
+        self.runtime_dir.cleanup()
+        fixtures.remove_all()
+
+    def test_get_value_forwarded_to_agent(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), patch("src.database.open_database") as open_database:
+            result = app_launcher.run(["-f", fixtures.TEST_KDBX, "get", "the_dir/entry_name"])
+
+        self.assertEqual(result, 0)
+        self.assertEqual(out.getvalue(), "entry_value\n")
+        open_database.assert_not_called()
+
+    def test_set_value_is_saved_by_agent(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = app_launcher.run(["-f", fixtures.TEST_KDBX, "set", "the_dir/other", "other_value"])
+
+        self.assertEqual(result, 0)
+        db = fixtures.open_test_database()
+        self.assertEqual(db.cd_dir("the_dir").get_value("other").value, "other_value")
+
+    def test_invalid_requests_keep_agent_running(self):
+        socket_path = agent.get_socket_path(self.database_path)
+        for message in (b'{"action": "run"}', b'[1, 2]', b'not json'):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+                conn.connect(socket_path)
+                conn.sendall(message)
+                conn.shutdown(socket.SHUT_WR)
+                response = json.loads(conn.makefile("rb").read())
+            self.assertEqual(response["status"], "error")
+
+        self.assertFalse(agent.send_action(self.database_path, "status")["locked"])
+
+    def test_wrong_password_is_rejected_and_not_cached(self):
+        err = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()) as out, contextlib.redirect_stderr(err):
+            result = app_launcher.run(["-f", fixtures.TEST_KDBX, "-p", "WRONG", "get", "the_dir/entry_name"])
+
+        self.assertEqual(result, 1)
+        self.assertEqual(out.getvalue(), "")
+        self.assertIn("invalid credentials", err.getvalue())
+        self.assertNotEqual(fixtures.cache_fixture().get_database_entry(self.database_path, "password"), "WRONG")
+
+    def test_matching_password_is_accepted(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            result = app_launcher.run(["-f", fixtures.TEST_KDBX, "-p", fixtures.DEFAULT_PASS, "get",
+                                       "the_dir/entry_name"])
+
+        self.assertEqual(result, 0)
+        self.assertEqual(out.getvalue(), "entry_value\n")
+
+    def test_cache_changes_of_other_processes_are_kept(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            app_launcher.run(["-f", fixtures.TEST_KDBX, "get", "the_dir/entry_name"])
+        cache = fixtures.cache_fixture()
+        cache.set_database_entry("/other.kdbx", "password", "other")
+        cache.save()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(app_launcher.run(["-f", fixtures.TEST_KDBX, "--key-cache-ttl", "60", "get",
+                                               "the_dir/entry_name"]), 0)
+
+        cache = fixtures.cache_fixture()
+        self.assertEqual(cache.get_database_entry("/other.kdbx", "password"), "other")
+        self.assertEqual(cache.get_database_entry(self.database_path, "key_cache_ttl"), 60)
+
+    def test_lock_discards_database(self):
+        response = agent.send_action(self.database_path, "lock")
+
+        self.assertTrue(response["locked"])
+        self.assertTrue(agent.send_action(self.database_path, "status")["locked"])
+        self.assertIsNone(agent.forward(app_launcher.parse_args(["get", "the_dir/entry_name"]), self.database_path))
+
+    def test_stop_removes_socket(self):
+        socket_path = agent.get_socket_path(self.database_path)
+        self.assertTrue(os.path.exists(socket_path))
+
+        agent.send_action(self.database_path, "stop")
+        self.thread.join(5)
+
+        self.assertFalse(os.path.exists(socket_path))
+        self.assertIsNone(agent.send_action(self.database_path, "status"))
+
+    def test_idle_timeout_stops_agent(self):
+        agent.send_action(self.database_path, "stop")
+        self.thread.join(5)
+        server = agent.Agent(self.database_path, None, fixtures.cache_fixture(), 0.2)
+        started = time.monotonic()
+
+        server.serve()
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertFalse(os.path.exists(server.socket_path))
+
+    def test_agent_reloads_database_saved_by_another_process(self):
+        db = fixtures.open_test_database()
+        db.mk_dir("the_dir").set_value("external", "external_value")
+        db.save()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = app_launcher.run(["-f", fixtures.TEST_KDBX, "set", "the_dir/other", "other_value"])
+
+        self.assertEqual(result, 0)
+        db = fixtures.open_test_database()
+        self.assertEqual(db.get_entry("the_dir/external").value, "external_value")
+        self.assertEqual(db.get_entry("the_dir/other").value, "other_value")
+
+    def test_get_file_streams_binary_output(self):
+        contents = os.urandom(3 * 1024 * 1024 + 7)
+        with contextlib.redirect_stdout(io.StringIO()):
+            with open(fixtures.TEST_FILE, "wb") as f:
+                f.write(contents)
+            self.assertEqual(app_launcher.run(["-f", fixtures.TEST_KDBX, "put-file", fixtures.TEST_FILE, "files"]), 0)
+        out = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+
+        with patch("src.database.open_database") as open_database:
+            result = agent.forward(app_launcher.parse_args(["get-file", "files/test.txt"]), self.database_path, out)
+
+        self.assertEqual(result, 0)
+        self.assertEqual(out.buffer.getvalue(), contents)
+        open_database.assert_not_called()
@@ -1,9 +1,11 @@
+import io
+import json
 from unittest import TestCase
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import fixtures
 from fixtures import args_fixture, cache_fixture, out_fixture
-from src.app import App
+from src.app import App, read_env_mappings
 from src.database import KeyValue, Folder
 
 
@@ -16,8 +18,8 @@ class TestApp(TestCase):
         fixtures.remove_all()
 
     def test_create(self):
-        fixtures.remove_file("test.kdbx")
-        args = args_fixture(database_path="test.kdbx")
+        fixtures.remove_file(fixtures.TEST_KDBX)
+        args = args_fixture(database_path=fixtures.TEST_KDBX)
         cache = cache_fixture()
         app = App(args, cache)
 
@@ -54,9 +56,35 @@ class TestApp(TestCase):
         self.assertEqual(entry.name, "entry_name")
         self.assertEqual(entry.value, "entry_value")
 
+    def test_set_generated_value(self):
+        fixtures.create_test_database()
+        args = args_fixture(entry_path="the_dir/entry_name")
+        self.assertFalse(App(args, cache_fixture()).set_entry())
+
+        args.generate = True
+        args.length = 20
+        args.alphabet = "hex"
+        self.assertTrue(App(args, cache_fixture()).set_entry())
+
+        value = fixtures.open_test_database().get_entry("the_dir/entry_name").value
+        self.assertEqual(len(value), 20)
+        self.assertTrue(set(value) <= set("0123456789abcdef"))
+
+    def test_generate(self):
+        args = args_fixture()
+        args.count = 5000
+        args.length = 12
+        out = io.StringIO()
+
+        self.assertTrue(App(args, cache_fixture(), out).generate())
+
+        passwords = out.getvalue().splitlines()
+        self.assertEqual(len(passwords), 5000)
+        self.assertTrue(all(len(password) == 12 for password in passwords))
+
     def test_put_file(self):
-        self._create_file("test.txt", "File contents")
-        args = args_fixture(source="test.txt", destination="the_dir")
+        self._create_file(fixtures.TEST_FILE, "File contents")
+        args = args_fixture(source=fixtures.TEST_FILE, destination="the_dir")
         cache = cache_fixture()
         fixtures.create_test_kdbx()
         app = App(args, cache)
@@ -84,6 +112,29 @@ class TestApp(TestCase):
         self.assertEqual(result.filename, "file.txt")
         self.assertEqual(result.contents, "Content".encode("utf-8"))
 
+    def test_get_binary_file_to_stdout(self):
+        db = fixtures.create_test_database()
+        db.root_directory.put_file("file.bin", b"\xff\x00\xfe")
+        db.save()
+        args = args_fixture(source="file.bin")
+        out = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        app = App(args, cache_fixture(), out)
+
+        app.get_file()
+
+        self.assertEqual(out.buffer.getvalue(), b"\xff\x00\xfe")
+
+    def test_put_file_from_stdin(self):
+        fixtures.create_test_database()
+        args = args_fixture(source="-", destination="the_dir/from_stdin.txt")
+        stdin = io.TextIOWrapper(io.BytesIO(b"stdin contents"))
+        app = App(args, cache_fixture(), stdin=stdin)
+
+        app.put_file()
+
+        db = fixtures.open_test_database()
+        self.assertEqual(db.get_entry("the_dir/from_stdin.txt").contents, b"stdin contents")
+
     def test_ls(self):
         db = fixtures.create_test_database()
         db.mk_dir("/the_dir").set_value("item_name", "item_value")
@@ -102,6 +153,30 @@ class TestApp(TestCase):
         self.assertRegex(out.write.call_args_list[0].args[0], ".*item_name.*")
         self.assertRegex(out.write.call_args_list[1].args[0], "1 entries.*")
 
+    def test_ls_recursive_json_and_glob(self):
+        db = fixtures.create_test_database()
+        db.mk_dir("/prod/eu").set_value("db-password", "secret")
+        db.mk_dir("/prod/us").put_file("db-cert.pem", b"cert")
+        db.mk_dir("/dev").set_value("db-password", "dev")
+        db.save()
+        args = args_fixture(source="/prod")
+        args.recursive = True
+        args.json = True
+        out = io.StringIO()
+
+        self.assertTrue(App(args, cache_fixture(), out).ls_entries())
+
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(r["path"], r["type"], r["size"]) for r in records],
+                         [("prod/eu", "directory", None), ("prod/eu/db-password", "value", None),
+                          ("prod/us", "directory", None), ("prod/us/db-cert.pem", "file", 4)])
+        self.assertTrue(all(r["mtime"] for r in records))
+
+        args = args_fixture(source="/*/*/db-*")
+        out = io.StringIO()
+        self.assertTrue(App(args, cache_fixture(), out).ls_entries())
+        self.assertEqual(out.getvalue(), "prod/eu/db-password\nprod/us/db-cert.pem\n2 entries\n")
+
     def test_del_entry(self):
         db = fixtures.create_test_database()
         db.root_directory.set_value("the_value", "content")
@@ -116,6 +191,38 @@ class TestApp(TestCase):
         db = fixtures.open_test_database()
         self.assertIsNone(db.root_directory.get_value("the_value"))
 
+    def test_exec_command(self):
+        db = fixtures.create_test_database()
+        db.mk_dir("prod").set_value("db", "db secret")
+        db.mk_dir("prod").set_value("api", "api secret")
+        db.save()
+        self._create_file(fixtures.TEST_FILE, "# comment\n\nAPI=/prod/api\n")
+        args = args_fixture()
+        args.env = ["DB=/prod/db", "DB_AGAIN=prod/db"]
+        args.env_file = [fixtures.TEST_FILE]
+        args.exec_args = ["--", "program", "arg"]
+
+        with patch("os.execvpe") as execvpe, \
+                patch("src.database.open_database", side_effect=fixtures.database.open_database) as open_database:
+            App(args, cache_fixture()).exec_command()
+
+        self.assertEqual(open_database.call_count, 1)
+        file, argv, environment = execvpe.call_args.args
+        self.assertEqual((file, argv), ("program", ["program", "arg"]))
+        self.assertEqual((environment["DB"], environment["DB_AGAIN"], environment["API"]),
+                         ("db secret", "db secret", "api secret"))
+
+        args.env = ["DB=/prod/missing"]
+        with patch("os.execvpe") as execvpe:
+            self.assertFalse(App(args, cache_fixture()).exec_command())
+        execvpe.assert_not_called()
+
+    def test_read_env_mappings(self):
+        self.assertEqual(read_env_mappings(["A=/a/b\n", " # comment\n", "\n", "B=c=d\n"]),
+                         [("A", "/a/b"), ("B", "c=d")])
+        with self.assertRaises(Exception):
+            read_env_mappings(["/a/b\n"])
+
     @staticmethod
     def _create_file(filename, contents: str):
         with open(filename, "w") as f:
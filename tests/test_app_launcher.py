@@ -1,4 +1,6 @@
 import os.path
+import subprocess
+import sys
 from unittest import TestCase
 
 import fixtures
@@ -18,8 +20,19 @@ class TestAppLauncher(TestCase):
     def test_create_arg_parser(self):
         parser = app_launcher.create_arg_parser()
         assert parser.parse_args(args=["create"]).command == "create"
+        args = parser.parse_args(args=["rekdf", "--kdf", "argon2id", "--kdf-memory", "64M", "--kdf-parallelism", "4"])
+        assert (args.kdf, args.kdf_memory, args.kdf_parallelism) == ("argon2id", 64 << 20, 4)
 
     def test_run_create_command(self):
         result = app_launcher.run(args=["-f", fixtures.TEST_KDBX, "-p", fixtures.DEFAULT_PASS, "create"])
         assert result == 0
         assert os.path.exists(fixtures.TEST_KDBX)
+
+    def test_parse_args_does_not_load_database_modules(self):
+        script = "import sys; from src import app_launcher; app_launcher.parse_args(['get', 'x']); " \
+                 "print(sorted(m for m in sys.modules if m.split('.')[0] in ('pykeepass', 'lxml', 'construct')))"
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+        result = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True, check=True)
+
+        self.assertEqual(result.stdout.strip(), "[]")
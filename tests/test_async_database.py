@@ -0,0 +1,62 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from unittest import TestCase
+
+import fixtures
+from src import database
+from src.async_database import open_database_async
+
+
+class TestAsyncDatabase(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+        self.database_paths = [os.path.join(fixtures.TEST_DIR, "async{}.kdbx".format(i)) for i in range(3)]
+        for i, database_path in enumerate(self.database_paths):
+            db = fixtures.create_fast_database(database_path)
+            db.mk_dir("the_dir").set_value("entry_name", "value{}".format(i))
+            db.save()
+
+    def tearDown(self) -> None:
+        fixtures.remove_all()
+
+    def test_open_concurrently_and_save(self):
+        async def scenario():
+            dbs = await asyncio.gather(*(open_database_async(path, fixtures.DEFAULT_PASS)
+                                         for path in self.database_paths))
+            values = [db.get_entry("the_dir/entry_name").value for db in dbs]
+            dbs[0].mk_dir("the_dir").set_value("other", "other_value")
+            saved = await dbs[0].save_async()
+            return values, saved
+
+        values, saved = asyncio.run(scenario())
+
+        self.assertEqual(values, ["value0", "value1", "value2"])
+        self.assertTrue(saved)
+        db = database.open_database(self.database_paths[0], password=fixtures.DEFAULT_PASS)
+        self.assertEqual(db.get_entry("the_dir/other").value, "other_value")
+
+    def test_process_pool_derives_key(self):
+        async def scenario(executor):
+            db = await open_database_async(self.database_paths[1], fixtures.DEFAULT_PASS, executor=executor)
+            return db.get_entry("the_dir/entry_name").value, db.database.transformed_key
+
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            value, transformed_key = asyncio.run(scenario(executor))
+
+        self.assertEqual(value, "value1")
+        self.assertEqual(transformed_key, database.derive_key(self.database_paths[1], fixtures.DEFAULT_PASS))
+
+    def test_async_entries(self):
+        async def scenario():
+            db = await open_database_async(self.database_paths[2], fixtures.DEFAULT_PASS)
+            folder = db.mk_dir("many")
+            for i in range(150):
+                folder.set_value("entry{}".format(i), "value")
+            return [str(entry) async for entry in db.entries("many")], [entry async for entry in db.entries("none")]
+
+        names, missing = asyncio.run(scenario())
+
+        self.assertEqual(len(names), 150)
+        self.assertEqual(missing, [])
@@ -0,0 +1,95 @@
+import io
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+import fixtures
+from fixtures import args_fixture, cache_fixture
+from src import batch
+from src.app import App
+from src.database import Database
+
+
+class TestBatch(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+        fixtures.create_test_database()
+
+    def tearDown(self) -> None:
+        fixtures.remove_all()
+
+    def test_parse_line(self):
+        self.assertEqual(batch.parse_line("set /a/b 'two words'\n"), ["set", "/a/b", "two words"])
+        self.assertEqual(batch.parse_line('["get", "/a/b"]'), ["get", "/a/b"])
+        self.assertEqual(batch.parse_line('{"args": ["del", "/a/b"]}'), ["del", "/a/b"])
+        self.assertIsNone(batch.parse_line("  # comment"))
+        self.assertIsNone(batch.parse_line(""))
+
+    def test_batch_saves_once(self):
+        commands = io.StringIO("set /the_dir/one 1\n"
+                               '["set", "/the_dir/two", "2"]\n'
+                               "get /the_dir/one\n"
+                               "get /the_dir/missing\n"
+                               "create\n"
+                               "put-file - /the_dir/file.bin\n"
+                               "get /the_dir/two\n")
+        args = args_fixture(source="-")
+        args.checkpoint = 0
+        out = io.StringIO()
+        app = App(args, cache_fixture(), out, stdin=commands)
+
+        with patch.object(Database, "save", autospec=True, side_effect=Database.save) as save:
+            result = app.batch()
+
+        self.assertFalse(result)
+        self.assertEqual(save.call_count, 1)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([r["line"] for r in results], [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual([r["code"] for r in results], [0, 0, 0, 1, 1, 1, 0])
+        self.assertEqual(results[2]["out"], "1\n")
+        self.assertRegex(results[4]["err"], "not allowed")
+        self.assertRegex(results[5]["err"], "not allowed")
+        self.assertEqual(results[6]["out"], "2\n")
+        db = fixtures.open_test_database()
+        self.assertEqual(db.get_entry("/the_dir/two").value, "2")
+
+    def test_batch_checkpoint(self):
+        commands = io.StringIO("".join("set /the_dir/entry{} value\n".format(i) for i in range(5)))
+        args = args_fixture(source="-")
+        args.checkpoint = 2
+        app = App(args, cache_fixture(), io.StringIO(), stdin=commands)
+
+        with patch.object(Database, "save", autospec=True, side_effect=Database.save) as save:
+            self.assertTrue(app.batch())
+
+        self.assertEqual(save.call_count, 3)
+
+    def test_batch_rejects_database_options_per_line(self):
+        commands = io.StringIO("-f /other.kdbx get /the_dir/one\n"
+                               "-p WRONG set /the_dir/one 1\n"
+                               "-k other.key get /the_dir/one\n")
+        args = args_fixture(source="-")
+        args.checkpoint = 0
+        out = io.StringIO()
+        cache = cache_fixture()
+
+        self.assertFalse(App(args, cache, out, stdin=commands).batch())
+
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([r["code"] for r in results], [1, 1, 1])
+        self.assertEqual([r["err"] for r in results], ["ERROR: option not allowed in batch line: {}\n".format(option)
+                                                        for option in ("-f", "-p", "-k")])
+        self.assertIsNone(cache.get_database_entry("/other.kdbx", "password"))
+        self.assertIsNone(fixtures.open_test_database().get_entry("/the_dir/one"))
+
+    def test_batch_save_writes_sidecar_with_key_cache(self):
+        args = args_fixture(source="-")
+        args.checkpoint = 0
+        args.key_cache_ttl = 60
+        app = App(args, cache_fixture(), io.StringIO(), stdin=io.StringIO("set /the_dir/one 1\n"))
+
+        with patch("src.sidecar.write") as write:
+            self.assertTrue(app.batch())
+
+        write.assert_called_once()
@@ -0,0 +1,54 @@
+import json
+import os
+import stat
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from src import config
+from src.cache import Cache
+
+
+class TestCache(TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "cache.json")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_save_only_when_changed(self):
+        cache = Cache(self.file_name)
+        cache.set_database_entry("/a.kdbx", "password", "123")
+        cache.set("last_database", "/a.kdbx")
+        self.assertTrue(cache.is_dirty)
+        cache.save()
+        self.assertFalse(cache.is_dirty)
+        self.assertEqual(stat.S_IMODE(os.stat(self.file_name).st_mode), 0o600)
+
+        cache = Cache(self.file_name)
+        cache.set("last_database", "/a.kdbx")
+        cache.set_database_entry("/a.kdbx", "password", "123")
+        self.assertFalse(cache.is_dirty)
+        self.assertEqual(cache.get_database_entry("/a.kdbx", "password"), "123")
+        with patch("json.dump", side_effect=AssertionError("saved")):
+            cache.save()
+
+    def test_failed_save_keeps_previous_file(self):
+        cache = Cache(self.file_name)
+        cache.set("last_database", "/a.kdbx")
+        cache.save()
+
+        cache.set("last_database", "/b.kdbx")
+        with patch("json.dump", side_effect=ValueError("boom")):
+            cache.save()
+
+        self.assertTrue(cache.is_dirty)
+        self.assertEqual(os.listdir(self.directory.name), ["cache.json"])
+        with open(self.file_name) as f:
+            self.assertEqual(json.load(f), {"last_database": "/a.kdbx"})
+
+    def test_default_file_name_is_in_runtime_dir(self):
+        with patch.dict(os.environ, {"XDG_RUNTIME_DIR": self.directory.name}):
+            self.assertEqual(Cache()._file_name, os.path.join(self.directory.name, config.CONFIG["cache_file_name"]))
@@ -0,0 +1,97 @@
+import io
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+import fixtures
+from pykeepass.kdbx_parsing.common import Decompressed
+
+from src import compression, database
+from src.app import App
+
+
+class TestCompression(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+        self.db = fixtures.create_fast_database(fixtures.TEST_KDBX)
+
+    def tearDown(self) -> None:
+        fixtures.remove_all()
+
+    def _open(self):
+        return database.open_database(fixtures.TEST_KDBX, password=fixtures.DEFAULT_PASS)
+
+    def test_is_incompressible(self):
+        self.assertTrue(compression.is_incompressible(os.urandom(100000)))
+        self.assertFalse(compression.is_incompressible(b"entry_value " * 10000))
+        self.assertFalse(compression.is_incompressible(os.urandom(100)))
+
+    def test_levels(self):
+        folder = self.db.mk_dir("the_dir")
+        for number in range(200):
+            folder.set_value("entry_{}".format(number), "value {}".format(number))
+        sizes = {}
+        for level in (0, 1, 9):
+            self.db.set_compression_level(level)
+            self.db.save(force=True)
+            self.assertEqual(self.db.save_stats["level"], level)
+            self.assertEqual(self._open().compression_level, min(level, 1) * compression.DEFAULT_LEVEL)
+            sizes[level] = os.path.getsize(fixtures.TEST_KDBX)
+
+        self.assertGreater(sizes[0], sizes[1])
+        self.assertGreaterEqual(sizes[1], sizes[9])
+        self.assertEqual(self._open().get_entry("the_dir/entry_7").value, "value 7")
+        with self.assertRaises(Exception):
+            self.db.set_compression_level(10)
+
+    def test_incompressible_attachments_are_stored(self):
+        contents = os.urandom(1 << 20)
+        self.db.mk_dir("the_dir").put_buffer("archive.tar.gz", bytearray(b"\0" + contents))
+        self.db.save()
+
+        self.assertEqual(self.db.save_stats["level"], 0)
+        self.assertGreater(self.db.save_stats["output_bytes"], len(contents))
+        self.assertEqual(self._open().get_entry("the_dir/archive.tar.gz").contents, contents)
+
+        self.db.mk_dir("the_dir").put_buffer("text", bytearray(b"\0" + b"entry_value " * 200000))
+        self.db.save()
+        self.assertEqual(self.db.save_stats["level"], compression.DEFAULT_LEVEL)
+
+    def test_app_compression_option(self):
+        fixtures.remove_all()
+        args = fixtures.args_fixture()
+        args.compression = 0
+        App(args, fixtures.cache_fixture(), io.StringIO()).create()
+        self.assertEqual(self._open().compression_level, 0)
+
+        args = fixtures.args_fixture(entry_path="the_dir/entry_name", entry_value="entry_value")
+        args.compression = 9
+        App(args, fixtures.cache_fixture(), io.StringIO()).set_entry()
+        self.assertEqual(self._open().compression_level, compression.DEFAULT_LEVEL)
+
+    def test_encoder_is_patched_only_while_saving(self):
+        original = Decompressed._encode
+        self.assertIsNot(original, compression._encode)
+        with compression.saving(0):
+            self.assertIs(Decompressed._encode, compression._encode)
+            with compression.saving(9):
+                self.assertIs(Decompressed._encode, compression._encode)
+            self.assertIs(Decompressed._encode, compression._encode)
+        self.assertIs(Decompressed._encode, original)
+
+    def test_incompressible_check_is_kept_per_binary(self):
+        folder = self.db.mk_dir("the_dir")
+        folder.put_buffer("first.gz", bytearray(b"\0" + os.urandom(100000)))
+        folder.put_buffer("second.gz", bytearray(b"\0" + os.urandom(100000)))
+        with patch("src.compression.is_incompressible", side_effect=compression.is_incompressible) as sampled:
+            self.db.save()
+            self.assertEqual(sampled.call_count, 2)
+            self.db.save(force=True)
+            self.assertEqual(sampled.call_count, 2)
+
+            folder.get_file("first.gz").delete()
+            folder.put_buffer("third.txt", bytearray(b"\0" + b"entry_value " * 10000))
+            self.db.save()
+            self.assertEqual(sampled.call_count, 3)
+        self.assertEqual(self.db._binaries.incompressible_bytes(), 100000)
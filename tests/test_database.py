@@ -1,6 +1,14 @@
+import io
+import os
+import subprocess
+import sys
+import textwrap
+import time
 from unittest import TestCase
+from unittest.mock import patch
 
 import fixtures
+from src import database
 from src.database import KeyValue, Folder, File
 
 
@@ -56,3 +64,212 @@ class TestDatabase(TestCase):
         self.assertIsNone(db.get_entry("/my_dir3/not-found"))
         self.assertIsNone(db.get_entry("/not-found/entry.txt"))
         self.assertIsNone(db.get_entry("/not-found"))
+
+    def test_index_follows_changes(self):
+        db = fixtures.open_test_database()
+        directory = db.mk_dir("my_dir4/sub_dir")
+        directory.set_value("my_entry4", "my_value4")
+        directory.put_file("file4.txt", "contents".encode("utf-8"))
+
+        self.assertEqual(db.get_entry("/my_dir4/sub_dir/MY_ENTRY4").value, "my_value4")
+        self.assertEqual(db.cd_dir("my_dir4/sub_dir").get_file("file4.txt").contents, "contents".encode("utf-8"))
+
+        db.get_entry("/my_dir4/sub_dir/file4.txt").delete()
+        db.get_entry("/my_dir4/sub_dir/my_entry4").delete()
+        self.assertIsNone(db.get_entry("/my_dir4/sub_dir/file4.txt"))
+        self.assertIsNone(db.get_entry("/my_dir4/sub_dir/my_entry4"))
+
+        db.get_entry("/my_dir4").delete()
+        self.assertIsNone(db.cd_dir("my_dir4/sub_dir"))
+        self.assertIsNone(db.cd_dir("my_dir4"))
+
+    def test_handles_are_reused(self):
+        db = fixtures.open_test_database()
+        directory = db.mk_dir("my_dir10")
+        directory.set_value("my_entry", "my_value")
+        directory.put_file("file.txt", b"contents")
+
+        first = list(db.cd_dir("my_dir10").entries())
+        second = list(db.cd_dir("my_dir10").entries())
+        self.assertEqual([id(entry) for entry in first], [id(entry) for entry in second])
+        self.assertIs(db.cd_dir("my_dir10"), directory)
+        self.assertIs(db.get_entry("my_dir10/my_entry"), directory.get_value("my_entry"))
+        self.assertIs(db.get_entry("my_dir10/file.txt"), directory.get_file("file.txt"))
+        self.assertFalse(any(hasattr(entry, "__dict__") for entry in first + [directory]))
+
+        directory.get_file("file.txt").delete()
+        self.assertEqual([str(entry) for entry in directory.entries()], ["KeyValue(name=my_entry)"])
+        directory.put_file("other.txt", b"contents")
+        directory.get_value("my_entry").delete()
+        self.assertEqual([str(entry) for entry in directory.entries()], ["File(filename=other.txt)"])
+
+    def test_index_is_built_lazily(self):
+        db = fixtures.open_test_database()
+        db.mk_dir("my_dir5").set_value("my_entry5", "my_value5")
+        db.mk_dir("other_dir5").set_value("other_entry5", "other_value5")
+        db.save()
+
+        db = fixtures.open_test_database()
+        db._kdb.find_groups = None
+        self.assertEqual(db._index.values, {})
+
+        self.assertEqual(db.mk_dir("my_dir5").get_value("my_entry5").value, "my_value5")
+        self.assertEqual(db.get_entry("my_dir5/MY_ENTRY5").value, "my_value5")
+        self.assertEqual(list(db._index.values), ["my_dir5/my_entry5"])
+        self.assertEqual(sorted(path for path, _ in db._index.value_items()),
+                         ["my_dir5/my_entry5", "other_dir5/other_entry5"])
+
+    def test_iter_values_and_directory_paths(self):
+        db = fixtures.open_test_database()
+        db.mk_dir("my_dir7/sub").set_value("my_entry7", "my_value7")
+        db.mk_dir("my_dir7").set_value("sub", "shadowed_by_directory")
+        db.root_directory.set_value("root_entry7", "root_value7")
+
+        values = dict(db.iter_values())
+        self.assertEqual(values["my_dir7/sub/my_entry7"], "my_value7")
+        self.assertEqual(values["root_entry7"], "root_value7")
+        self.assertNotIn("my_dir7/sub", values)
+        self.assertTrue({"", "my_dir7", "my_dir7/sub"} <= set(db.directory_paths()))
+        self.assertEqual(db.normalize_path("/my_dir7/sub/"), "my_dir7/sub")
+
+    def test_inserts_scale_linearly(self):
+        db = fixtures.open_test_database()
+
+        def insert(path, count):
+            folder = db.mk_dir(path)
+            started = time.perf_counter()
+            for i in range(count):
+                folder.set_value("entry{}".format(i), "value{}".format(i))
+                folder.put_file("file{}.txt".format(i), b"contents")
+            return time.perf_counter() - started
+
+        insert("warm_up", 200)
+        single = insert("scale_n", 1000)
+        double = insert("scale_2n", 2000)
+
+        self.assertLess(double, single * 3)
+        self.assertEqual(db.get_entry("scale_2n/entry1999").value, "value1999")
+        self.assertEqual(db.get_entry("scale_2n/file1999.txt").contents, b"contents")
+
+    def test_binary_file_round_trip(self):
+        contents = bytes(range(256)) * 1000
+        db = fixtures.open_test_database()
+        db.mk_dir("my_dir6").put_stream("binary.bin", io.BytesIO(contents))
+        db.mk_dir("my_dir6").put_file("binary.bin", contents[::-1])
+        db.save()
+
+        db = fixtures.open_test_database()
+        file_entry = db.get_entry("/my_dir6/binary.bin")
+        out = io.BytesIO()
+        file_entry.write_to(out)
+
+        self.assertEqual(file_entry.size, len(contents))
+        self.assertEqual(out.getvalue(), contents[::-1])
+        self.assertEqual(len(db._kdb.binaries), 1)
+
+    def test_max_size(self):
+        self.assertEqual(database.read_binary(io.BytesIO(b"12345"), max_size=5)[1:], b"12345")
+        self.assertRaises(Exception, database.read_binary, io.BytesIO(b"123456"), 5)
+
+    def test_large_file_memory(self):
+        size = 256 * 1024 * 1024
+        script = textwrap.dedent("""
+            import io, os, resource, sys
+            sys.path.insert(0, {root!r})
+            from src import database
+
+            def peak():
+                return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+            with open({large!r}, "wb") as f:
+                f.truncate({size})
+            db = database.open_database({kdbx!r}, password={password!r})
+            before = peak()
+            with open({large!r}, "rb") as f:
+                db.root_directory.put_stream("large.bin", f)
+            after_put = peak()
+            with open(os.devnull, "wb") as f:
+                db.get_entry("/large.bin").write_to(f)
+            after_get = peak()
+            os.remove({large!r})
+            print(after_put - before, after_get - after_put)
+        """).format(root=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), size=size,
+                    large=os.path.join(fixtures.TEST_DIR, "large.bin"), kdbx=fixtures.TEST_KDBX,
+                    password=fixtures.DEFAULT_PASS)
+
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+
+        put_growth, get_growth = (int(value) for value in result.stdout.split())
+        self.assertLess(put_growth, size * 1.1)
+        self.assertLess(get_growth, size * 0.1)
+
+    def test_identical_files_share_binary(self):
+        db = fixtures.create_test_database()
+        for name in ("dir_a", "dir_b", "dir_c"):
+            db.mk_dir(name).put_file("bundle.pem", b"certificate")
+        db.mk_dir("dir_c").put_file("other.pem", b"other")
+
+        self.assertEqual(len(db._kdb.binaries), 2)
+        self.assertEqual(db.deduplicated_bytes, 2 * len(b"certificate"))
+
+        db.get_entry("/dir_a/bundle.pem").delete()
+        db.mk_dir("dir_b").put_file("bundle.pem", b"changed")
+        self.assertEqual(db.get_entry("/dir_c/bundle.pem").contents, b"certificate")
+        self.assertEqual(db.get_entry("/dir_b/bundle.pem").contents, b"changed")
+
+        db.get_entry("/dir_c").delete()
+        db.save()
+
+        db = fixtures.open_test_database()
+        self.assertEqual(db._kdb.binaries, [b"changed"])
+        self.assertEqual(db.get_entry("/dir_b/bundle.pem").contents, b"changed")
+
+    def test_gc_merges_duplicates_and_drops_orphans(self):
+        kdb = fixtures.create_test_kdbx()
+        for title in ("one", "two"):
+            entry = kdb.add_entry(kdb.root_group, title=title, username="", password="")
+            entry.add_attachment(kdb.add_binary(b"same contents"), filename=title)
+        kdb.add_binary(b"orphan")
+        kdb.save()
+
+        db = fixtures.open_test_database()
+        removed, saved_bytes = db.gc()
+
+        self.assertEqual(removed, 2)
+        self.assertEqual(saved_bytes, len(b"same contents") + len(b"orphan"))
+        self.assertEqual(db._kdb.binaries, [b"same contents"])
+        self.assertEqual(db.get_entry("/one").contents, b"same contents")
+        self.assertEqual(db.get_entry("/two").contents, b"same contents")
+
+    def test_dirty_tracking(self):
+        db = fixtures.open_test_database()
+        self.assertFalse(db.is_dirty)
+        self.assertFalse(db.save())
+
+        db.mk_dir("my_dir7").set_value("my_entry7", "my_value7")
+        self.assertTrue(db.is_dirty)
+        self.assertTrue(db.save())
+        self.assertFalse(db.is_dirty)
+
+        db.mk_dir("my_dir7").set_value("my_entry7", "my_value7")
+        db.mk_dir("my_dir7").put_file("file7.txt", b"contents")
+        db.save()
+        db.mk_dir("my_dir7").put_file("file7.txt", b"contents")
+        self.assertFalse(db.is_dirty)
+
+        db.get_entry("my_dir7/my_entry7").value = "changed"
+        self.assertTrue(db.is_dirty)
+
+    def test_interrupted_save_keeps_database(self):
+        db = fixtures.open_test_database()
+        db.mk_dir("my_dir8").set_value("my_entry8", "my_value8")
+        with open(fixtures.TEST_KDBX, "rb") as f:
+            original = f.read()
+
+        with patch.object(db._kdb, "save", side_effect=KeyboardInterrupt):
+            self.assertRaises(KeyboardInterrupt, db.save)
+
+        with open(fixtures.TEST_KDBX, "rb") as f:
+            self.assertEqual(f.read(), original)
+        self.assertEqual([name for name in os.listdir(fixtures.TEST_DIR) if name.endswith(".tmp")], [])
+        self.assertTrue(db.is_dirty)
@@ -0,0 +1,66 @@
+import io
+from unittest import TestCase
+
+import fixtures
+from src import config, database, kdf
+from src.app import App
+
+
+class TestKdf(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+
+    def tearDown(self) -> None:
+        fixtures.remove_all()
+
+    def test_parameters_survive_save(self):
+        parameters = {"kdf": "argon2id", "memory": 1 << 20, "iterations": 2, "parallelism": 2}
+        db = database.create_database(fixtures.TEST_KDBX, password=fixtures.DEFAULT_PASS, kdf_parameters=parameters)
+        db.mk_dir("the_dir").set_value("entry_name", "entry_value")
+        db.save()
+
+        db = fixtures.open_test_database()
+        self.assertEqual(db.kdf_parameters, parameters)
+        db.set_kdf_parameters(kdf.resolve_parameters(db.kdf_parameters, "aes", iterations=1000))
+        db.save()
+
+        db = fixtures.open_test_database()
+        self.assertEqual(db.kdf_parameters, {"kdf": "aes", "iterations": 1000})
+        self.assertEqual(db.get_entry("the_dir/entry_name").value, "entry_value")
+
+    def test_resolve_parameters(self):
+        current = {"kdf": "aes", "iterations": 1000}
+        parameters = kdf.resolve_parameters(current, "argon2id", memory=1 << 20, parallelism=4)
+        self.assertEqual(parameters["iterations"], config.CONFIG["kdf_argon2_iterations"])
+        self.assertEqual(kdf.resolve_parameters(parameters, iterations=3)["memory"], 1 << 20)
+        with self.assertRaises(Exception):
+            kdf.resolve_parameters(parameters, memory=1 << 10)
+        with self.assertRaises(Exception):
+            kdf.resolve_parameters(parameters, "scrypt")
+
+    def test_app_create_and_rekdf(self):
+        args = fixtures.args_fixture()
+        args.kdf = "argon2id"
+        args.kdf_memory = 1 << 20
+        args.kdf_iterations = 1
+        self.assertTrue(App(args, fixtures.cache_fixture(), io.StringIO()).create())
+        self.assertEqual(fixtures.open_test_database().kdf_parameters,
+                         {"kdf": "argon2id", "memory": 1 << 20, "iterations": 1,
+                          "parallelism": kdf.default_parallelism()})
+
+        args = fixtures.args_fixture()
+        args.kdf_iterations = 3
+        args.kdf_parallelism = 2
+        out = io.StringIO()
+        self.assertTrue(App(args, fixtures.cache_fixture(), out).rekdf())
+
+        self.assertEqual(fixtures.open_test_database().kdf_parameters,
+                         {"kdf": "argon2id", "memory": 1 << 20, "iterations": 3, "parallelism": 2})
+        self.assertEqual(out.getvalue(), "KDF changed: argon2id memory=1024K iterations=3 parallelism=2\n")
+
+    def test_calibrate_reaches_target(self):
+        parameters = kdf.calibrate(50, "argon2id", memory=1 << 20, parallelism=1)
+
+        self.assertGreater(parameters["iterations"], 1)
+        self.assertLess(kdf.measure(parameters), 0.5)
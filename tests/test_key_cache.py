@@ -0,0 +1,78 @@
+import io
+import os
+import stat
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import argon2
+
+import fixtures
+from src import database
+from src.app import App
+from src.key_cache import KeyCache
+
+
+class TestKeyCache(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+        self.runtime_dir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"XDG_RUNTIME_DIR": self.runtime_dir.name})
+        self.env.start()
+        fixtures.create_test_database()
+        self.database_path = os.path.abspath(fixtures.TEST_KDBX)
+
+    def tearDown(self) -> None:
+        self.env.stop()
+        self.runtime_dir.cleanup()
+        fixtures.remove_all()
+
+    def test_cached_key_skips_kdf(self):
+        key_cache = KeyCache(self.database_path, 60)
+        db = database.open_database(self.database_path, password=fixtures.DEFAULT_PASS, keep_kdf_salt=True)
+        key_cache.store(db.transformed_key, fixtures.DEFAULT_PASS)
+        db.mk_dir("the_dir").set_value("entry_name", "entry_value")
+        db.save()
+
+        self.assertEqual(stat.S_IMODE(os.stat(key_cache._file_name).st_mode), 0o600)
+        transformed_key = key_cache.load(fixtures.DEFAULT_PASS)
+        with patch.object(argon2.low_level, "hash_secret_raw", side_effect=AssertionError("KDF called")):
+            db = database.open_database(self.database_path, password=fixtures.DEFAULT_PASS,
+                                        transformed_key=transformed_key)
+        self.assertEqual(db.get_entry("the_dir/entry_name").value, "entry_value")
+
+    def test_header_change_invalidates_key(self):
+        key_cache = KeyCache(self.database_path, 60)
+        db = fixtures.open_test_database()
+        key_cache.store(db.transformed_key, fixtures.DEFAULT_PASS)
+
+        db.save(force=True)
+
+        self.assertIsNone(key_cache.load(fixtures.DEFAULT_PASS))
+        self.assertFalse(os.path.exists(key_cache._file_name))
+
+    def test_wrong_password_and_expired_key_are_ignored(self):
+        db = fixtures.open_test_database()
+        KeyCache(self.database_path, 60).store(db.transformed_key, fixtures.DEFAULT_PASS)
+        self.assertIsNone(KeyCache(self.database_path, 60).load("wrong"))
+
+        KeyCache(self.database_path, -1).store(db.transformed_key, fixtures.DEFAULT_PASS)
+        self.assertIsNone(KeyCache(self.database_path, 60).load(fixtures.DEFAULT_PASS))
+
+    def test_app_stores_and_clears_cached_key(self):
+        db = fixtures.open_test_database()
+        db.mk_dir("the_dir").set_value("entry_name", "entry_value")
+        db.save()
+        cache = fixtures.cache_fixture()
+        args = fixtures.args_fixture(database_path=self.database_path, entry_path="the_dir/entry_name")
+        args.key_cache_ttl = 60
+        App(args, cache, io.StringIO()).get_entry()
+        key_cache = KeyCache(self.database_path, 60)
+        self.assertIsNotNone(key_cache.load(fixtures.DEFAULT_PASS))
+
+        args.key_cache_ttl = 0
+        App(args, cache, io.StringIO()).get_entry()
+
+        self.assertFalse(os.path.exists(key_cache._file_name))
+        self.assertEqual(cache.get_database_entry(self.database_path, "key_cache_ttl"), 0)
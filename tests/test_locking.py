@@ -0,0 +1,118 @@
+import argparse
+import fcntl
+import io
+import multiprocessing
+import os
+import tempfile
+from unittest import TestCase
+
+import fixtures
+from src import database
+from src.app import App
+from src.cache import Cache
+from src.locking import DatabaseLock, get_lock_file_name
+
+WRITERS = 8
+READERS = 2
+VALUES_PER_WRITER = 20
+
+
+def _app_args(database_path: str, optimistic: bool, **kwargs):
+    return argparse.Namespace(database_path=database_path, password=fixtures.DEFAULT_PASS, keyfile=None, curdir=None,
+                              key_cache_ttl=None, optimistic=optimistic, compression=None, generate=False,
+                              **kwargs)
+
+
+def _set_values(database_path: str, worker: int, optimistic: bool):
+    cache = Cache(os.path.join(os.path.dirname(database_path), "cache{}.json".format(worker)))
+    for i in range(VALUES_PER_WRITER):
+        args = _app_args(database_path, optimistic, entry_path="w{}/k{}".format(worker, i),
+                         entry_value="value{}".format(i))
+        App(args, cache).set_entry()
+
+
+def _get_values(database_path: str, worker: int, optimistic: bool):
+    cache = Cache(os.path.join(os.path.dirname(database_path), "reader{}.json".format(worker)))
+    for _ in range(VALUES_PER_WRITER):
+        out = io.StringIO()
+        if not App(_app_args(database_path, optimistic, entry_path="seed/key"), cache, out).get_entry():
+            raise Exception("seed/key not readable")
+        if out.getvalue() != "seed\n":
+            raise Exception("unexpected value: {}".format(out.getvalue()))
+
+
+class TestLocking(TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.database_path = os.path.join(self.directory.name, os.path.basename(fixtures.TEST_KDBX))
+        db = fixtures.create_fast_database(self.database_path)
+        db.mk_dir("seed").set_value("key", "seed")
+        db.save()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _run_writers(self, optimistic: bool):
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=_set_values, args=(self.database_path, worker, optimistic))
+                     for worker in range(WRITERS)]
+        processes += [context.Process(target=_get_values, args=(self.database_path, worker, optimistic))
+                      for worker in range(READERS)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(300)
+            self.assertEqual(process.exitcode, 0)
+
+        db = database.open_database(self.database_path, password=fixtures.DEFAULT_PASS)
+        for worker in range(WRITERS):
+            for i in range(VALUES_PER_WRITER):
+                self.assertEqual(db.get_entry("w{}/k{}".format(worker, i)).value, "value{}".format(i))
+
+    def test_concurrent_writers_keep_all_changes(self):
+        self._run_writers(optimistic=False)
+
+    def test_concurrent_optimistic_writers_keep_all_changes(self):
+        self._run_writers(optimistic=True)
+
+    def test_optimistic_write_reapplies_changes_after_concurrent_save(self):
+        calls = []
+
+        def operation(db):
+            if not calls:
+                other = database.open_database(self.database_path, password=fixtures.DEFAULT_PASS)
+                other.mk_dir("other").set_value("key", "other_value")
+                other.save()
+            calls.append(db)
+            db.mk_dir("mine").set_value("key", "my_value")
+
+        app = App(_app_args(self.database_path, True), Cache(os.path.join(self.directory.name, "cache.json")))
+        app._modify_database(operation)
+
+        self.assertEqual(len(calls), 2)
+        db = database.open_database(self.database_path, password=fixtures.DEFAULT_PASS)
+        self.assertEqual(db.get_entry("other/key").value, "other_value")
+        self.assertEqual(db.get_entry("mine/key").value, "my_value")
+
+    def test_shared_locks_do_not_block_each_other(self):
+        with DatabaseLock(self.database_path), DatabaseLock(self.database_path):
+            pass
+        self.assertTrue(os.path.exists(get_lock_file_name(self.database_path)))
+
+    def test_password_prompt_does_not_hold_the_lock(self):
+        lock_file_name = get_lock_file_name(self.database_path)
+
+        class Stdin:
+            def readline(self):
+                with open(lock_file_name, "a") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fixtures.DEFAULT_PASS + "\n"
+
+        args = _app_args(self.database_path, False, entry_path="mine/key", entry_value="my_value")
+        args.password = None
+        cache = Cache(os.path.join(self.directory.name, "cache.json"))
+        self.assertTrue(App(args, cache, io.StringIO(), Stdin()).set_entry())
+
+        db = database.open_database(self.database_path, password=fixtures.DEFAULT_PASS)
+        self.assertEqual(db.get_entry("mine/key").value, "my_value")
@@ -1,3 +1,7 @@
+import collections
+
+import pytest
+
 from src import password_generator
 
 
@@ -6,3 +10,30 @@ def test_generate():
     pass2 = password_generator.generate(10)
     assert pass1 != pass2
     assert pass1.__len__() == 10
+
+
+def test_alphabets():
+    assert set(password_generator.generate(200, "hex")) <= set("0123456789abcdef")
+    assert set(password_generator.generate(200, "ab")) == {"a", "b"}
+    with pytest.raises(Exception):
+        password_generator.generate(10, "aa")
+    with pytest.raises(Exception):
+        password_generator.generate(10, "é€")
+
+
+def test_random_chars_are_uniform():
+    alphabet = password_generator.resolve_alphabet("printable")
+    counts = collections.Counter(password_generator.random_chars(len(alphabet) * 2000, alphabet))
+
+    assert set(counts) == set(alphabet)
+    assert min(counts.values()) > 1700 and max(counts.values()) < 2300
+
+
+def test_generate_many_and_pool():
+    passwords = password_generator.generate_many(1000, 16, "alphanumeric")
+    assert len(passwords) == 1000 and len(set(passwords)) == 1000
+    assert all(len(password) == 16 and password.isalnum() for password in passwords)
+
+    pool = password_generator.PasswordPool(8, "digits", pool_size=4)
+    pooled = [pool.next() for _ in range(10)]
+    assert len(set(pooled)) == 10 and all(password.isdigit() for password in pooled)
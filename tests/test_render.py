@@ -0,0 +1,69 @@
+import io
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+import fixtures
+from fixtures import args_fixture, cache_fixture
+from src import render
+from src.app import App
+
+
+class TestRender(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+
+    def tearDown(self) -> None:
+        fixtures.remove_all()
+
+    def test_iter_chunks_keeps_placeholders_whole(self):
+        template = "user={{ /a/user }} pass={{/a/pass}} {not} {{ /a/user }}{"
+        for chunk_size in range(1, len(template) + 1):
+            chunks = list(render.iter_chunks(io.StringIO(template), chunk_size))
+            self.assertEqual("".join(chunks), template)
+            self.assertEqual(sum(len(render.PLACEHOLDER.findall(chunk)) for chunk in chunks), 3)
+
+    def test_render_resolves_each_path_once(self):
+        requested = []
+
+        def resolve(paths):
+            requested.append(paths)
+            return {path: path.upper() for path in paths}
+
+        out = io.StringIO()
+        chunks = ["a={{ /a }} b={{/b}}", " again={{ /a }} c={{ /c }}"]
+        self.assertTrue(render.render(chunks, resolve, out))
+        self.assertEqual(out.getvalue(), "a=/A b=/B again=/A c=/C")
+        self.assertEqual(requested, [["/a", "/b"], ["/c"]])
+
+        self.assertFalse(render.render(["{{ /missing }}"], lambda paths: None, io.StringIO()))
+
+    def test_app_render(self):
+        db = fixtures.create_test_database()
+        db.mk_dir("prod").set_value("db", "db secret")
+        db.mk_dir("prod").put_file("cert.pem", b"-----BEGIN CERTIFICATE-----\n")
+        db.save()
+        template = "password: {{ /prod/db }}\ncert: |\n  {{ prod/cert.pem }}\nagain: {{/prod/db}}\n"
+        expected = "password: db secret\ncert: |\n  -----BEGIN CERTIFICATE-----\n\nagain: db secret\n"
+
+        out = io.StringIO()
+        with patch("src.database.open_database", side_effect=fixtures.database.open_database) as open_database:
+            self.assertTrue(App(args_fixture(source="-"), cache_fixture(), out, stdin=io.StringIO(template)).render())
+        self.assertEqual(open_database.call_count, 1)
+        self.assertEqual(out.getvalue(), expected)
+
+        with open(fixtures.TEST_FILE, "w") as f:
+            f.write(template)
+        output_file = os.path.join(fixtures.TEST_DIR, "rendered.yaml")
+        args = args_fixture(source=fixtures.TEST_FILE, output_file=output_file)
+        self.assertTrue(App(args, cache_fixture(), io.StringIO()).render())
+        with open(output_file) as f:
+            self.assertEqual(f.read(), expected)
+
+        with open(fixtures.TEST_FILE, "w") as f:
+            f.write(template + "{{ /prod/missing }}\n")
+        self.assertFalse(App(args, cache_fixture(), io.StringIO()).render())
+        with open(output_file) as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual([name for name in os.listdir(fixtures.TEST_DIR) if name.endswith(".tmp")], [])
@@ -0,0 +1,55 @@
+import argparse
+import io
+import os
+from unittest import TestCase
+
+import fixtures
+from src import search
+from src.app import App
+
+
+class TestSearch(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+        self.cache = fixtures.cache_fixture()
+        self.database_paths = [os.path.join(fixtures.TEST_DIR, name) for name in ("one.kdbx", "two.kdbx")]
+        for i, database_path in enumerate(self.database_paths):
+            db = fixtures.create_fast_database(database_path)
+            db.mk_dir("prod/db").set_value("db-password", "secret{}".format(i))
+            db.mk_dir("dev").set_value("api-key", "key{}".format(i))
+            db.mk_dir("dev").put_file("db-cert.pem", b"cert")
+            db.save()
+            self.cache.set_database_entry(database_path, "password", fixtures.DEFAULT_PASS)
+
+    def tearDown(self) -> None:
+        fixtures.remove_all()
+
+    def _find(self, pattern, match="name", databases=None, password=None):
+        args = argparse.Namespace(pattern=pattern, match=match, databases=databases, jobs=2, timings=False,
+                                  password=password, keyfile=None, curdir=None)
+        out = io.StringIO()
+        result = App(args, self.cache, out).find()
+        return result, sorted(out.getvalue().splitlines())
+
+    def test_find_by_name_in_all_databases(self):
+        result, lines = self._find("db-*")
+
+        self.assertTrue(result)
+        self.assertEqual(lines, sorted("{}:{}".format(path, entry) for path in self.database_paths
+                                       for entry in ("prod/db/db-password", "dev/db-cert.pem")))
+
+    def test_find_by_path_and_regex_in_selected_database(self):
+        self.assertEqual(self._find("/prod/*/*", "path", [self.database_paths[1]])[1],
+                         ["{}:prod/db/db-password".format(self.database_paths[1])])
+        self.assertEqual(self._find(r"^dev/.*key$", "regex", [self.database_paths[0]])[1],
+                         ["{}:dev/api-key".format(self.database_paths[0])])
+
+    def test_wrong_password_is_reported(self):
+        self.cache.set_database_entry(self.database_paths[0], "password", "wrong")
+
+        results = {path: error for path, _, _, error in search.search_databases(
+            {path: (self.cache.get_database_entry(path, "password"), None) for path in self.database_paths}, "*")}
+
+        self.assertIsNotNone(results[self.database_paths[0]])
+        self.assertIsNone(results[self.database_paths[1]])
@@ -0,0 +1,90 @@
+import io
+from unittest import TestCase
+from unittest.mock import patch
+
+import fixtures
+from fixtures import args_fixture, cache_fixture
+from src import shell
+from src.app import App
+from src.database import Database
+from src.locking import file_stamp
+
+
+class TestShell(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+        db = fixtures.create_fast_database(fixtures.TEST_KDBX)
+        db.mk_dir("the_dir/sub").set_value("one", "1")
+        db.mk_dir("the_dir").set_value("two", "2")
+        db.save()
+
+    def tearDown(self) -> None:
+        fixtures.remove_all()
+
+    def _shell(self, out=None):
+        db = fixtures.open_test_database()
+        return shell.Shell(fixtures.TEST_KDBX, db, file_stamp(fixtures.TEST_KDBX), cache_fixture(), args_fixture(),
+                           out or io.StringIO(), io.StringIO())
+
+    def test_commands_share_one_database(self):
+        commands = io.StringIO("cd the_dir\n"
+                               "pwd\n"
+                               "get sub/one\n"
+                               "set three 3\n"
+                               "get /the_dir/three\n"
+                               "cd sub\n"
+                               "ls\n"
+                               "cd ..\n"
+                               "cd missing\n"
+                               "create\n")
+        out = io.StringIO()
+        app = App(args_fixture(), cache_fixture(), out, stdin=commands)
+
+        with patch.object(Database, "save", autospec=True, side_effect=Database.save) as save, \
+                patch("src.database.open_database", side_effect=fixtures.database.open_database) as open_database:
+            self.assertTrue(app.shell())
+
+        self.assertEqual(open_database.call_count, 1)
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(out.getvalue().splitlines(), ["/the_dir", "1", "3", "KeyValue(name=one)", "1 entries", ""])
+        self.assertEqual(fixtures.open_test_database().get_entry("/the_dir/three").value, "3")
+
+    def test_save_only_when_asked_or_dirty(self):
+        out = io.StringIO()
+        subject = self._shell(out)
+        subject.onecmd("get the_dir/two")
+        subject.onecmd("save")
+        subject.onecmd("del the_dir/two")
+        self.assertIsNotNone(fixtures.open_test_database().get_entry("the_dir/two"))
+        subject.onecmd("save")
+
+        self.assertEqual(out.getvalue().splitlines(),
+                         ["2", "No changes to save", "Removing entry: KeyValue(name=two)",
+                          "Database saved: " + fixtures.TEST_KDBX])
+        self.assertIsNone(fixtures.open_test_database().get_entry("the_dir/two"))
+
+    def test_pending_changes_are_replayed_after_another_save(self):
+        subject = self._shell()
+        subject.onecmd("set -g the_dir/generated")
+        generated = subject.db.get_entry("the_dir/generated").value
+
+        other = fixtures.open_test_database()
+        other.mk_dir("other").set_value("value", "x")
+        other.save(force=True)
+
+        self.assertTrue(subject.save())
+        db = fixtures.open_test_database()
+        self.assertEqual(db.get_entry("other/value").value, "x")
+        self.assertEqual(db.get_entry("the_dir/generated").value, generated)
+
+    def test_complete_path(self):
+        subject = self._shell()
+        self.assertEqual(subject.complete_path("the"), ["the_dir/"])
+        self.assertEqual(subject.complete_path("/the_dir/"), ["/the_dir/sub/", "/the_dir/two"])
+        self.assertEqual(subject.complete_path("the_dir/s"), ["the_dir/sub/"])
+        subject.onecmd("cd the_dir")
+        self.assertEqual(subject.complete_path("t"), ["two"])
+        self.assertEqual(subject.complete_cd("", "cd ", 3, 3), ["sub/"])
+        self.assertEqual(subject.complete_path("missing/"), [])
+        self.assertEqual(subject.completenames("ge"), ["get", "get-dir", "get-file"])
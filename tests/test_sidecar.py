@@ -0,0 +1,116 @@
+import io
+import os
+import stat
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import fixtures
+from src import database, sidecar
+from src.app import App
+from src.database import Database
+
+
+class TestSidecar(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+        self.runtime_dir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"XDG_RUNTIME_DIR": self.runtime_dir.name})
+        self.env.start()
+        self.database_path = os.path.abspath(fixtures.TEST_KDBX)
+        fixtures.create_fast_database(self.database_path)
+
+    def tearDown(self) -> None:
+        self.env.stop()
+        self.runtime_dir.cleanup()
+        fixtures.remove_all()
+
+    def _open(self):
+        return database.open_database(self.database_path, password=fixtures.DEFAULT_PASS, keep_kdf_salt=True)
+
+    def _save(self, db):
+        db.save()
+        sidecar.write(self.database_path, db, db.transformed_key)
+
+    def _args(self, key_cache_ttl, **kwargs):
+        args = fixtures.args_fixture(database_path=self.database_path, **kwargs)
+        args.key_cache_ttl = key_cache_ttl
+        return args
+
+    def test_save_writes_sidecar_read_with_transformed_key(self):
+        db = self._open()
+        folder = db.mk_dir("the_dir")
+        folder.set_value("entry_name", "entry_value")
+        folder.set_value("user_entry", "user_value", username="john")
+        folder.put_buffer("the_file", bytearray(b"\0contents"))
+        self._save(db)
+
+        sidecar_file_name = sidecar.get_sidecar_file_name(self.database_path)
+        self.assertEqual(stat.S_IMODE(os.stat(sidecar_file_name).st_mode), 0o600)
+        with open(sidecar_file_name, "rb") as f:
+            self.assertNotIn(b"entry_value", f.read())
+        index = sidecar.read(self.database_path, db.transformed_key)
+        self.assertEqual(index.get_value("/the_dir/entry_name"), "entry_value")
+        self.assertEqual(index.get_value("the_dir/user_entry(john)"), "user_value")
+        self.assertIsNone(index.get_value("the_dir/missing"))
+        self.assertEqual(index.list_directory("/"), ["Directory(name=the_dir)"])
+        self.assertEqual(index.list_directory("the_dir/"), [str(entry) for entry in db.cd_dir("the_dir").entries()])
+        self.assertIsNone(sidecar.read(self.database_path, b"\0" * 32))
+
+    def test_stale_sidecar_is_ignored(self):
+        db = self._open()
+        db.mk_dir("the_dir").set_value("entry_name", "entry_value")
+        self._save(db)
+        with open(sidecar.get_sidecar_file_name(self.database_path), "rb") as f:
+            stale = f.read()
+
+        db.cd_dir("the_dir").set_value("entry_name", "new_value")
+        self._save(db)
+        with open(sidecar.get_sidecar_file_name(self.database_path), "wb") as f:
+            f.write(stale)
+
+        self.assertIsNone(sidecar.read(self.database_path, db.transformed_key))
+
+    def test_read_hashes_only_files_with_the_same_size_and_mtime(self):
+        db = self._open()
+        db.mk_dir("the_dir").set_value("entry_name", "entry_value")
+        self._save(db)
+
+        with patch("src.sidecar.file_identity", side_effect=sidecar.file_identity) as identity:
+            self.assertIsNotNone(sidecar.read(self.database_path, db.transformed_key))
+            self.assertEqual(identity.call_count, 1)
+            file_stat = os.stat(self.database_path)
+            os.utime(self.database_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1))
+            self.assertIsNone(sidecar.read(self.database_path, db.transformed_key))
+            self.assertEqual(identity.call_count, 1)
+
+    def test_app_save_writes_sidecar_only_with_key_cache(self):
+        cache = fixtures.cache_fixture()
+        sidecar_file_name = sidecar.get_sidecar_file_name(self.database_path)
+        args = self._args(60, entry_path="the_dir/entry_name", entry_value="entry_value")
+        self.assertTrue(App(args, cache, io.StringIO()).set_entry())
+        self.assertEqual(sidecar.read(self.database_path, self._open().transformed_key).get_value(
+            "the_dir/entry_name"), "entry_value")
+
+        args = self._args(0, entry_path="the_dir/entry_name", entry_value="new_value")
+        self.assertTrue(App(args, cache, io.StringIO()).set_entry())
+
+        self.assertFalse(os.path.exists(sidecar_file_name))
+
+    def test_app_answers_from_sidecar_without_parsing(self):
+        db = self._open()
+        db.mk_dir("the_dir").set_value("entry_name", "entry_value")
+        db.save()
+        cache = fixtures.cache_fixture()
+        args = self._args(60, entry_path="the_dir/entry_name")
+        out = io.StringIO()
+        self.assertTrue(App(args, cache, out).get_entry())
+        self.assertTrue(os.path.exists(sidecar.get_sidecar_file_name(self.database_path)))
+
+        with patch.object(Database, "__init__", side_effect=AssertionError("database parsed")):
+            self.assertTrue(App(args, cache, out).get_entry())
+            args.source = "/the_dir"
+            self.assertTrue(App(args, cache, out).ls_entries())
+
+        self.assertEqual(out.getvalue(), "entry_value\nentry_value\nKeyValue(name=entry_name)\n1 entries\n")
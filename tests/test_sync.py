@@ -0,0 +1,94 @@
+import io
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+import fixtures
+from fixtures import args_fixture, cache_fixture
+from src.app import App
+from src.database import Database
+
+
+class TestSync(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+        fixtures.create_test_database()
+        self.local_dir = os.path.join(fixtures.TEST_DIR, "local")
+        self.files = {"app.conf": b"port=80", "conf.d/a.conf": b"a", "conf.d/b.conf": b"b"}
+        for relative_path, contents in self.files.items():
+            self._write(os.path.join(self.local_dir, relative_path), contents)
+
+    def tearDown(self) -> None:
+        fixtures.remove_all()
+
+    @staticmethod
+    def _write(filename, contents):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "wb") as f:
+            f.write(contents)
+
+    def _run(self, command, source, destination, dry_run=False):
+        args = args_fixture(source=source, destination=destination)
+        args.dry_run = dry_run
+        args.jobs = 2
+        out = io.StringIO()
+        app = App(args, cache_fixture(), out)
+        with patch.object(Database, "save", autospec=True, side_effect=Database.save) as save:
+            self.assertTrue(app.put_dir() if command == "put" else app.get_dir())
+        return out.getvalue().splitlines(), save.call_count
+
+    def test_put_dir_skips_unchanged_files(self):
+        lines, saves = self._run("put", self.local_dir, "/etc")
+        self.assertEqual(lines[-1], "3 added, 0 updated, 0 unchanged")
+        self.assertEqual(saves, 1)
+
+        self._write(os.path.join(self.local_dir, "conf.d/b.conf"), b"changed")
+        lines, saves = self._run("put", self.local_dir, "/etc", dry_run=True)
+        self.assertEqual(lines, ["M etc/conf.d/b.conf", "0 added, 1 updated, 2 unchanged (dry run)"])
+        self.assertEqual(saves, 0)
+
+        self._run("put", self.local_dir, "/etc")
+        db = fixtures.open_test_database()
+        self.assertEqual(db.get_entry("/etc/conf.d/b.conf").contents, b"changed")
+        self.assertEqual(db.get_entry("/etc/app.conf").contents, b"port=80")
+
+    def test_put_dir_skips_symbolic_links(self):
+        outside = os.path.join(fixtures.TEST_DIR, "outside")
+        self._write(os.path.join(outside, "secret"), b"secret")
+        os.symlink(os.path.join(outside, "secret"), os.path.join(self.local_dir, "linked_file"))
+        os.symlink(outside, os.path.join(self.local_dir, "linked_dir"))
+
+        lines, _ = self._run("put", self.local_dir, "/etc")
+
+        self.assertEqual(lines[-1], "3 added, 0 updated, 0 unchanged")
+        db = fixtures.open_test_database()
+        self.assertEqual([entry.path for entry in db.walk("etc") if entry.name.startswith("linked")], [])
+
+    def test_get_dir_writes_changed_files(self):
+        self._run("put", self.local_dir, "/etc")
+        target_dir = os.path.join(fixtures.TEST_DIR, "target")
+        self._write(os.path.join(target_dir, "app.conf"), b"port=80")
+        self._write(os.path.join(target_dir, "conf.d/a.conf"), b"old")
+
+        lines, _ = self._run("get", "/etc", target_dir)
+
+        self.assertEqual(lines[-1], "1 added, 1 updated, 1 unchanged")
+        for relative_path, contents in self.files.items():
+            with open(os.path.join(target_dir, relative_path), "rb") as f:
+                self.assertEqual(f.read(), contents)
+
+    def test_get_dir_refuses_paths_outside_the_destination(self):
+        db = fixtures.open_test_database()
+        db.mk_dir("etc/sub").put_file("good.conf", b"good")
+        db.mk_dir("etc/sub").put_file("../../escaped.txt", b"escaped")
+        db.save()
+        target_dir = os.path.join(fixtures.TEST_DIR, "target")
+        args = args_fixture(source="/etc", destination=target_dir)
+        args.dry_run = False
+        args.jobs = 1
+
+        self.assertFalse(App(args, cache_fixture(), io.StringIO()).get_dir())
+
+        self.assertFalse(os.path.exists(os.path.join(fixtures.TEST_DIR, "escaped.txt")))
+        self.assertFalse(os.path.exists(os.path.join(target_dir, "sub", "good.conf")))
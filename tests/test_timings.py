@@ -0,0 +1,56 @@
+import contextlib
+import io
+import json
+import os
+import pstats
+from unittest import TestCase
+
+import fixtures
+from src import app_launcher, database
+from src.timings import Timings
+
+
+class TestTimings(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+        db = fixtures.create_test_database()
+        db.mk_dir("the_dir").set_value("entry_name", "entry_value")
+        db.save()
+
+    def tearDown(self) -> None:
+        fixtures.remove_all()
+
+    def test_database_phases(self):
+        with Timings() as timings:
+            db = database.open_database(fixtures.TEST_KDBX, password=fixtures.DEFAULT_PASS)
+            db.save(force=True)
+
+        self.assertEqual(list(timings.phases), ["kdf", "decrypt and parse", "index", "compress", "kdf and encrypt",
+                                                "write"])
+        self.assertGreater(timings.phases["kdf"], 0)
+        self.assertGreaterEqual(timings.total, sum(timings.phases.values()))
+
+    def test_timings_and_profile_options(self):
+        profile = os.path.join(fixtures.TEST_DIR, "out.prof")
+        out, err = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            result = app_launcher.run(["-f", fixtures.TEST_KDBX, "-p", fixtures.DEFAULT_PASS, "--timings",
+                                       "--timings-format", "json", "--profile", profile, "ls", "-R", "/"])
+
+        self.assertEqual(result, 0)
+        report = json.loads(err.getvalue().splitlines()[-1])
+        self.assertIn("kdf", report["phases_ms"])
+        self.assertIn("entries", report["phases_ms"])
+        self.assertGreater(pstats.Stats(profile).total_calls, 0)
+
+    def test_timings_flag_before_command(self):
+        out, err = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            result = app_launcher.run(["-f", fixtures.TEST_KDBX, "-p", fixtures.DEFAULT_PASS, "--timings", "get",
+                                       "the_dir/entry_name"])
+
+        self.assertEqual(result, 0)
+        self.assertEqual(out.getvalue(), "entry_value\n")
+        self.assertIn("timings:", err.getvalue())
+        self.assertIn("kdf", err.getvalue())
@@ -0,0 +1,94 @@
+import io
+import json
+import os
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+import fixtures
+from fixtures import args_fixture, cache_fixture
+from src import transfer
+from src.app import App
+from src.database import Database
+
+
+class TestTransfer(TestCase):
+
+    def setUp(self) -> None:
+        fixtures.remove_all()
+        db = fixtures.create_test_database()
+        db.mk_dir("prod/db").set_value("password", "secret")
+        db.mk_dir("prod/db").set_value("admin", "admin_secret", username="root")
+        db.mk_dir("prod/tls").put_file("cert.pem", bytes(range(256)))
+        db.mk_dir("empty")
+        db.root_directory.set_value("top", "level")
+        db.save()
+
+    def tearDown(self) -> None:
+        fixtures.remove_all()
+
+    def _export(self, database_path=fixtures.TEST_KDBX):
+        args = args_fixture(database_path=database_path, source="/")
+        args.output_file = None
+        out = io.StringIO()
+        self.assertTrue(App(args, cache_fixture(), out).export_entries())
+        return out.getvalue()
+
+    def test_export_import_round_trip(self):
+        exported = self._export()
+        target = os.path.join(fixtures.TEST_DIR, "target.kdbx")
+        fixtures.create_fast_database(target)
+        args = args_fixture(database_path=target, source="-")
+        out = io.StringIO()
+        app = App(args, cache_fixture(), out, stdin=io.StringIO(exported))
+
+        with patch.object(Database, "save", autospec=True, side_effect=Database.save) as save:
+            self.assertTrue(app.import_entries())
+
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(out.getvalue(), "Imported 4 directories, 3 values and 1 files\n")
+        self.assertEqual(sorted(self._export(target).splitlines()), sorted(exported.splitlines()))
+
+    def test_import_generates_values(self):
+        records = "".join('{{"path": "svc/s{}", "type": "value", "generate": 24, "alphabet": "alphanumeric"}}\n'
+                          .format(number) for number in range(50))
+        args = args_fixture(source="-")
+        self.assertTrue(App(args, cache_fixture(), io.StringIO(), stdin=io.StringIO(records)).import_entries())
+
+        db = fixtures.open_test_database()
+        values = [db.get_entry("svc/s{}".format(number)).value for number in range(50)]
+        self.assertEqual(len(set(values)), 50)
+        self.assertTrue(all(len(value) == 24 and value.isalnum() for value in values))
+
+    def test_invalid_record_is_reported(self):
+        args = args_fixture(source="-")
+        app = App(args, cache_fixture(), io.StringIO(), stdin=io.StringIO('{"path": "a", "type": "value"}\n'))
+
+        with self.assertRaisesRegex(Exception, "line 1"):
+            app.import_entries()
+
+    def test_invalid_mtime_is_reported(self):
+        record = {"path": "a", "type": "value", "value": "v", "mtime": "yesterday"}
+        args = args_fixture(source="-")
+        app = App(args, cache_fixture(), io.StringIO(), stdin=io.StringIO(json.dumps(record) + "\n"))
+
+        with self.assertRaisesRegex(Exception, "line 1"):
+            app.import_entries()
+
+    def test_import_scales_linearly(self):
+        db = fixtures.open_test_database()
+
+        def import_values(path, count):
+            lines = [json.dumps({"path": "{}/k{}".format(path, i), "type": "value", "value": "v{}".format(i),
+                                 "mtime": "2024-01-01T00:00:00+00:00"}) for i in range(count)]
+            started = time.perf_counter()
+            counts = transfer.import_records(db, lines)
+            elapsed = time.perf_counter() - started
+            self.assertEqual(counts["value"], count)
+            return elapsed
+
+        import_values("warm_up", 200)
+        single = import_values("scale_n", 1500)
+        double = import_values("scale_2n", 3000)
+
+        self.assertLess(double, single * 3)